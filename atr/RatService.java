@@ -0,0 +1,96 @@
+/*
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.PrintWriter;
+import java.io.StringWriter;
+import java.nio.charset.StandardCharsets;
+
+/**
+ * Run Apache RAT reports on request, so that the JVM starts once rather than once per report.
+ *
+ * <p>This is started by atr/ratservice.py, which sends requests on standard input and reads responses on standard
+ * output. A request is the number of arguments followed by the arguments, and an empty request is a health check. A
+ * response is a status, zero for success, followed by a message. Integers are big endian and four bytes long, and
+ * strings are their UTF-8 length followed by their UTF-8 bytes.
+ */
+public final class RatService {
+    private RatService() {}
+
+    public static void main(String[] args) throws IOException {
+        DataInputStream requests = new DataInputStream(new BufferedInputStream(System.in));
+        DataOutputStream responses =
+                new DataOutputStream(new BufferedOutputStream(new FileOutputStream(FileDescriptor.out)));
+        // RAT writes its log to standard output, which carries the responses, so send the log to standard error
+        System.setOut(System.err);
+
+        while (true) {
+            int count;
+            try {
+                count = requests.readInt();
+            } catch (EOFException e) {
+                // The service closed our standard input, so it no longer needs us
+                return;
+            }
+            String[] arguments = new String[count];
+            for (int i = 0; i < count; i++) {
+                arguments[i] = readString(requests);
+            }
+
+            int status = 0;
+            String message = "";
+            if (count > 0) {
+                try {
+                    org.apache.rat.Report.main(arguments);
+                } catch (Exception e) {
+                    status = 1;
+                    message = stackTrace(e);
+                }
+            }
+            responses.writeInt(status);
+            writeString(responses, message);
+            responses.flush();
+        }
+    }
+
+    private static String readString(DataInputStream input) throws IOException {
+        byte[] data = new byte[input.readInt()];
+        input.readFully(data);
+        return new String(data, StandardCharsets.UTF_8);
+    }
+
+    private static String stackTrace(Exception e) {
+        StringWriter writer = new StringWriter();
+        e.printStackTrace(new PrintWriter(writer));
+        return writer.toString();
+    }
+
+    private static void writeString(DataOutputStream output, String value) throws IOException {
+        byte[] data = value.getBytes(StandardCharsets.UTF_8);
+        output.writeInt(data.length);
+        output.write(data);
+    }
+}
@@ -771,6 +771,7 @@ async def tasks_recent(session: web.Committer, minutes: int) -> str:
                 sql.TaskStatus.ACTIVE: ".table-info",
                 sql.TaskStatus.COMPLETED: ".table-success",
                 sql.TaskStatus.FAILED: ".table-danger",
+                sql.TaskStatus.SUPERSEDED: ".table-warning",
             }.get(task.status, "")
             if (task.started is not None) and (task.completed is not None):
                 took_seconds = (task.completed - task.started).total_seconds()
@@ -828,6 +829,77 @@ async def tasks_recent(session: web.Committer, minutes: int) -> str:
     return await template.blank(f"Recent Tasks ({minutes}m)", content=page.collect())
 
 
+@admin.get("/tasks/resources/<int:days>")
+async def tasks_resources(session: web.Committer, days: int) -> str:
+    """Display the resources used by finished tasks from the last N days, by task type."""
+    days = min(max(days, 1), 365)
+    via = sql.validate_instrumented_attribute
+    cutoff = datetime.datetime.now(datetime.UTC) - datetime.timedelta(days=days)
+    wall_seconds = (
+        sqlalchemy.func.julianday(via(sql.Task.completed)) - sqlalchemy.func.julianday(via(sql.Task.started))
+    ) * 86400
+    cpu_seconds = via(sql.Task.cpu_user_seconds) + via(sql.Task.cpu_system_seconds)
+
+    async with db.session() as data:
+        statement = (
+            sqlalchemy.select(
+                via(sql.Task.task_type),
+                sqlalchemy.func.count(),
+                sqlalchemy.func.avg(wall_seconds),
+                sqlalchemy.func.max(wall_seconds),
+                sqlalchemy.func.avg(cpu_seconds),
+                sqlalchemy.func.max(cpu_seconds),
+                sqlalchemy.func.avg(via(sql.Task.child_cpu_seconds)),
+                sqlalchemy.func.max(via(sql.Task.child_cpu_seconds)),
+                sqlalchemy.func.max(via(sql.Task.peak_rss_bytes)),
+                sqlalchemy.func.avg(via(sql.Task.queue_wait_seconds)),
+                sqlalchemy.func.max(via(sql.Task.queue_wait_seconds)),
+                sqlalchemy.func.sum(via(sql.Task.read_bytes)),
+                sqlalchemy.func.sum(via(sql.Task.written_bytes)),
+            )
+            .where(
+                via(sql.Task.completed) >= cutoff,
+                via(sql.Task.started).is_not(None),
+                via(sql.Task.cpu_user_seconds).is_not(None),
+                # The usage of a task which ran concurrently with others includes theirs
+                via(sql.Task.usage_overlapped).is_(False),
+            )
+            .group_by(via(sql.Task.task_type))
+            .order_by(sqlalchemy.func.sum(cpu_seconds).desc())
+        )
+        rows = (await data.execute(statement)).all()
+
+    page = htm.Block()
+    page.h1[f"Task resources from the last {util.plural(days, 'day')}"]
+    page.p[
+        "Workers limit each process to 300s of CPU time and 3GB of address space. "
+        "Usage is measured per worker process, so it is only recorded for tasks which ran alone in their worker, "
+        "and only those tasks are included."
+    ]
+
+    table = htm.Block(htpy.table, classes=".table.table-sm")
+    table.thead(".table-dark")[
+        htpy.tr[
+            htpy.th["Type"],
+            htpy.th["Tasks"],
+            htpy.th["Wall avg / max"],
+            htpy.th["Worker CPU avg / max"],
+            htpy.th["Worker child CPU avg / max"],
+            htpy.th["Worker peak RSS max"],
+            htpy.th["Queue wait avg / max"],
+            htpy.th["Worker read"],
+            htpy.th["Worker written"],
+        ]
+    ]
+    tbody = htm.Block(htpy.tbody)
+    for row in rows:
+        tbody.append(_task_resources_row(tuple(row)))
+    table.append(tbody.collect())
+    page.append(table.collect())
+
+    return await template.blank(f"Task Resources ({days}d)", content=page.collect())
+
+
 @admin.get("/test")
 async def test(session: web.Committer) -> web.QuartResponse:
     """Test the storage layer."""
@@ -1176,6 +1248,41 @@ def _session_data_common(
     )
 
 
+def _task_resources_row(row: tuple[Any, ...]) -> htpy.Element:
+    (
+        task_type,
+        count,
+        wall_avg,
+        wall_max,
+        cpu_avg,
+        cpu_max,
+        child_cpu_avg,
+        child_cpu_max,
+        peak_rss,
+        wait_avg,
+        wait_max,
+        read_bytes,
+        written_bytes,
+    ) = row
+
+    def seconds(average: float | None, maximum: float | None) -> str:
+        if (average is None) or (maximum is None):
+            return ""
+        return f"{average:.1f}s / {maximum:.1f}s"
+
+    return htpy.tr[
+        htpy.td[sql.TaskType(task_type).value],
+        htpy.td[str(count)],
+        htpy.td[seconds(wall_avg, wall_max)],
+        htpy.td[seconds(cpu_avg, cpu_max)],
+        htpy.td[seconds(child_cpu_avg, child_cpu_max)],
+        htpy.td[util.format_file_size(peak_rss) if (peak_rss is not None) else ""],
+        htpy.td[seconds(wait_avg, wait_max)],
+        htpy.td[util.format_file_size(read_bytes) if (read_bytes is not None) else ""],
+        htpy.td[util.format_file_size(written_bytes) if (written_bytes is not None) else ""],
+    ]
+
+
 async def _update_keys(asf_uid: str) -> int:
     async def _log_process(process: asyncio.subprocess.Process) -> None:
         try:
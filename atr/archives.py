@@ -15,19 +15,66 @@
 # specific language governing permissions and limitations
 # under the License.
 
+import concurrent.futures
+import concurrent.futures.process
+import multiprocessing
 import os
 import os.path
 import tarfile
 import zipfile
+from collections.abc import Sequence
+from typing import Any, Final, Protocol, Self, runtime_checkable
 
+import atr.config as config
 import atr.log as log
 import atr.tarzip as tarzip
 
+# Returned by ScanVisitor.content_limit to receive the whole content of a member
+SCAN_CONTENT_ALL: Final[int] = -1
+
+# Roughly what processing a zip member costs beyond reading its compressed data, in bytes
+# This spreads archives of many small members evenly across the shards too
+_ZIP_MEMBER_COST: Final[int] = 1024
+_POOLS: Final[dict[int, concurrent.futures.ProcessPoolExecutor]] = {}
+
 
 class ExtractionError(Exception):
     pass
 
 
+class ScanVisitor(Protocol):
+    """A checker which inspects the members of an archive while it is scanned."""
+
+    # Whether the metadata of the members is all that is needed, so that a manifest can be visited instead
+    metadata_only: bool
+    # Whether the content of every file member must be read to its end, even when it is not needed
+    read_all: bool
+
+    def content_limit(self, member: tarzip.MemberInfo) -> int:
+        """Return how many leading bytes of the content of a member to pass to visit."""
+        ...
+
+    def finish(self, error: Exception | None) -> None:
+        """Finish the scan, with the error which ended it early if any."""
+        ...
+
+    def visit(self, member: tarzip.MemberInfo, content: bytes | None) -> None:
+        """Inspect a member and the leading bytes of its content that were requested."""
+        ...
+
+
+@runtime_checkable
+class ShardVisitor(ScanVisitor, Protocol):
+    """A visitor which can scan the members of a large zip archive in shards, in parallel.
+
+    Each shard is scanned in a worker process by a copy of the visitor, and the copies are merged in member order.
+    """
+
+    def merge(self, shard: Self) -> None:
+        """Add what a copy of this visitor found in the shard of members which follows those already merged."""
+        ...
+
+
 def extract(
     archive_path: str,
     extract_dir: str,
@@ -41,6 +88,11 @@ def extract(
     extracted_paths = []
 
     try:
+        if (
+            parallel := _zip_extract_parallel(archive_path, extract_dir, max_size, chunk_size, track_files)
+        ) is not None:
+            return parallel
+
         with tarzip.open_archive(archive_path) as archive:
             match archive.specific():
                 case tarfile.TarFile():
@@ -79,16 +131,78 @@ def extract(
     return total_extracted, extracted_paths
 
 
-def total_size(tgz_path: str, chunk_size: int = 4096) -> int:
-    with tarzip.open_archive(tgz_path) as archive:
-        match archive.specific():
-            case tarfile.TarFile():
-                total_size = _size_tar(archive, chunk_size)
+def pool_pids() -> list[int]:
+    """Return the process IDs of the worker processes of the pool of this process, if it has started them."""
+    pool = _POOLS.get(os.getpid())
+    if pool is None:
+        return []
+    # The executor does not expose its processes, so this reads its private mapping of them
+    processes: dict[int, Any] | None = getattr(pool, "_processes", None)
+    return list(processes or {})
 
-            case zipfile.ZipFile():
-                total_size = _size_zip(archive, chunk_size)
 
-    return total_size
+def pool_shutdown() -> None:
+    """Stop the worker processes of the pool of this process, if it has started them."""
+    pool = _POOLS.pop(os.getpid(), None)
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def scan(archive_path: str, visitors: Sequence[ScanVisitor], chunk_size: int = 4096) -> None:
+    """Read an archive once, passing each member and the content which they request to all of the visitors."""
+    read_all = any(visitor.read_all for visitor in visitors)
+    if _zip_scan_parallel(archive_path, visitors, read_all, chunk_size):
+        return
+
+    active = list(visitors)
+    try:
+        with tarzip.open_archive(archive_path) as archive:
+            for member in archive:
+                active, failures = _scan_member(archive, member, active, read_all, chunk_size)
+                for visitor, error in failures:
+                    visitor.finish(error)
+    except Exception as e:
+        for visitor in active:
+            visitor.finish(e)
+        return
+
+    for visitor in active:
+        visitor.finish(None)
+
+
+def _scan_member(
+    archive: tarzip.Archive,
+    member: tarzip.Member,
+    visitors: list[ScanVisitor],
+    read_all: bool,
+    chunk_size: int,
+) -> tuple[list[ScanVisitor], list[tuple[ScanVisitor, Exception]]]:
+    limits = [visitor.content_limit(member) for visitor in visitors]
+    wanted = SCAN_CONTENT_ALL if (SCAN_CONTENT_ALL in limits) else max(limits, default=0)
+
+    content: bytes | None = None
+    if member.isfile() and ((wanted != 0) or read_all):
+        fileobj = archive.extractfile(member)
+        if fileobj is not None:
+            content = fileobj.read() if (wanted == SCAN_CONTENT_ALL) else fileobj.read(wanted)
+            # Reading each member to its end is what verifies the archive, even if no visitor needs the content
+            while read_all and fileobj.read(chunk_size):
+                pass
+
+    # A visitor which fails is returned with its error, and the other visitors continue
+    remaining: list[ScanVisitor] = []
+    failures: list[tuple[ScanVisitor, Exception]] = []
+    for visitor, limit in zip(visitors, limits):
+        visitor_content: bytes | None = None
+        if (content is not None) and (limit != 0):
+            visitor_content = content if (limit == SCAN_CONTENT_ALL) else content[:limit]
+        try:
+            visitor.visit(member, visitor_content)
+        except Exception as e:
+            failures.append((visitor, e))
+            continue
+        remaining.append(visitor)
+    return remaining, failures
 
 
 def _tar_archive_extract_member(  # noqa: C901
@@ -242,6 +356,20 @@ def _tar_archive_extract_safe_process_symlink(member: tarzip.TarMember, extract_
         log.warning(f"Failed to create symlink {target_path} -> {link_target}: {e}")
 
 
+def _pool() -> concurrent.futures.ProcessPoolExecutor:
+    pid = os.getpid()
+    if pid not in _POOLS:
+        _POOLS.clear()
+        # The worker processes are started by a fork server, because forking a process which runs threads is unsafe
+        # The server imports this module once, so that the worker processes which it forks start quickly
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        _POOLS[pid] = concurrent.futures.ProcessPoolExecutor(
+            max_workers=config.get().ZIP_PARALLEL_PROCESSES, mp_context=context
+        )
+    return _POOLS[pid]
+
+
 def _safe_path(base_dir: str, *paths: str) -> str | None:
     """Return an absolute path within the base_dir built from the given paths, or None if it escapes."""
     target = os.path.abspath(os.path.join(base_dir, *paths))
@@ -251,32 +379,20 @@ def _safe_path(base_dir: str, *paths: str) -> str | None:
     return None
 
 
-def _size_tar(archive: tarzip.Archive, chunk_size: int) -> int:
-    total_size = 0
-    for member in archive:
-        if not isinstance(member, tarzip.TarMember):
-            continue
-        total_size += member.size
-        if member.isfile():
-            fileobj = archive.extractfile(member)
-            if fileobj is not None:
-                while fileobj.read(chunk_size):
-                    pass
-    return total_size
-
-
-def _size_zip(archive: tarzip.Archive, chunk_size: int) -> int:
-    total_size = 0
-    for member in archive:
-        if not isinstance(member, tarzip.ZipMember):
-            continue
-        total_size += member.size
-        if member.isfile():
-            fileobj = archive.extractfile(member)
-            if fileobj is not None:
-                while fileobj.read(chunk_size):
-                    pass
-    return total_size
+def _shards(weights: list[int], count: int) -> list[range]:
+    """Divide a sequence of weighted items into at most count contiguous ranges of similar weight."""
+    total = sum(weights)
+    shards: list[range] = []
+    start = 0
+    cumulative = 0
+    for index, weight in enumerate(weights):
+        cumulative += weight
+        if (cumulative * count) >= (total * (len(shards) + 1)):
+            shards.append(range(start, index + 1))
+            start = index + 1
+    if start < len(weights):
+        shards.append(range(start, len(weights)))
+    return shards
 
 
 def _zip_archive_extract_member(
@@ -288,6 +404,7 @@ def _zip_archive_extract_member(
     chunk_size: int,
     track_files: bool | set[str] = False,
     extracted_paths: list[str] = [],
+    deferred: list[tarzip.ZipMember] | None = None,
 ) -> tuple[int, list[str]]:
     member_basename = os.path.basename(member.name)
 
@@ -313,6 +430,14 @@ def _zip_archive_extract_member(
         os.makedirs(target_path, exist_ok=True)
         return total_extracted, extracted_paths
 
+    if member.isfile() and (deferred is not None):
+        # The file is extracted later by a worker process, which extracts no more than its declared size
+        if _safe_path(extract_dir, member.name) is None:
+            log.warning(f"Skipping potentially unsafe path: {member.name}")
+            return total_extracted, extracted_paths
+        deferred.append(member)
+        return total_extracted + member.size, extracted_paths
+
     if member.isfile():
         extracted_size = _zip_extract_safe_process_file(
             archive, member, extract_dir, total_extracted, max_size, chunk_size
@@ -322,6 +447,61 @@ def _zip_archive_extract_member(
     return total_extracted, extracted_paths
 
 
+def _zip_extract_parallel(
+    archive_path: str,
+    extract_dir: str,
+    max_size: int,
+    chunk_size: int,
+    track_files: bool | set[str],
+) -> tuple[int, list[str]] | None:
+    """Extract the files of a large zip archive in shards across the process pool.
+
+    Return None when the archive is not to be extracted in parallel.
+    """
+    if (infos := _zip_parallel_infos(archive_path)) is None:
+        return None
+
+    # Every member is checked here in order, so that the size limit applies to the archive as a whole
+    total_extracted = 0
+    extracted_paths: list[str] = []
+    deferred: list[tarzip.ZipMember] = []
+    with tarzip.open_archive(archive_path) as archive:
+        for member in archive:
+            if not isinstance(member, tarzip.ZipMember):
+                continue
+            total_extracted, extracted_paths = _zip_archive_extract_member(
+                archive,
+                member,
+                extract_dir,
+                total_extracted,
+                max_size,
+                chunk_size,
+                track_files,
+                extracted_paths,
+                deferred,
+            )
+
+    compressed_sizes = {info.header_offset: info.compress_size for info in infos}
+    weights = [compressed_sizes[member.header_offset] + _ZIP_MEMBER_COST for member in deferred]
+    futures: list[concurrent.futures.Future[None]] = []
+    try:
+        pool = _pool()
+        for shard in _shards(weights, config.get().ZIP_PARALLEL_PROCESSES):
+            offsets = [deferred[index].header_offset for index in shard]
+            futures.append(pool.submit(_zip_extract_shard, archive_path, extract_dir, offsets, chunk_size))
+        for future in futures:
+            future.result()
+    except concurrent.futures.process.BrokenProcessPool as e:
+        _POOLS.pop(os.getpid(), None)
+        log.warning(f"Extracting {archive_path} in one process, as the process pool failed: {e}")
+        return None
+    finally:
+        for future in futures:
+            future.cancel()
+    log.info(f"Extracted {len(deferred)} files from {archive_path} in {len(futures)} shards")
+    return total_extracted, extracted_paths
+
+
 def _zip_extract_safe_process_file(
     archive: tarzip.Archive,
     member: tarzip.ZipMember,
@@ -360,3 +540,100 @@ def _zip_extract_safe_process_file(
         source.close()
 
     return extracted_file_size
+
+
+def _zip_extract_shard(archive_path: str, extract_dir: str, header_offsets: list[int], chunk_size: int) -> None:
+    """Extract the file members of a zip archive with the given header offsets, in a worker process."""
+    with tarzip.open_archive(archive_path, max_members=0) as archive:
+        zf = archive.specific()
+        if not isinstance(zf, zipfile.ZipFile):
+            raise ValueError(f"Not a zip archive: {archive_path}")
+        infos = {info.header_offset: info for info in zf.infolist()}
+        for header_offset in header_offsets:
+            member = tarzip.ZipMember(infos[header_offset])
+            # The declared size of the member was counted towards the size limit of the whole archive
+            _zip_extract_safe_process_file(archive, member, extract_dir, 0, member.size, chunk_size)
+
+
+def _zip_parallel_infos(archive_path: str) -> list[zipfile.ZipInfo] | None:
+    """Return the members of a zip archive which is large enough to process in parallel, or None."""
+    processes = config.get().ZIP_PARALLEL_PROCESSES
+    if (processes < 2) or (not zipfile.is_zipfile(archive_path)):
+        return None
+    try:
+        with zipfile.ZipFile(archive_path) as zf:
+            infos = zf.infolist()
+    except (OSError, zipfile.BadZipFile):
+        # Errors are left for the sequential path to report
+        return None
+    # So is exceeding the member limit, which is reported when the limit is reached
+    if (len(infos) < config.get().ZIP_PARALLEL_MIN_MEMBERS) or (len(infos) > tarzip.MAX_ARCHIVE_MEMBERS):
+        return None
+    return infos
+
+
+def _zip_scan_parallel(archive_path: str, visitors: Sequence[ScanVisitor], read_all: bool, chunk_size: int) -> bool:
+    """Scan a large zip archive in shards across the process pool, returning whether it was scanned."""
+    shard_visitors = [visitor for visitor in visitors if isinstance(visitor, ShardVisitor)]
+    if len(shard_visitors) != len(visitors):
+        return False
+    if (infos := _zip_parallel_infos(archive_path)) is None:
+        return False
+
+    weights = [info.compress_size + _ZIP_MEMBER_COST for info in infos]
+    futures: list[concurrent.futures.Future[list[tuple[ShardVisitor, Exception | None]]]] = []
+    try:
+        pool = _pool()
+        for shard in _shards(weights, config.get().ZIP_PARALLEL_PROCESSES):
+            futures.append(
+                pool.submit(
+                    _zip_scan_shard, archive_path, shard_visitors, shard.start, shard.stop, read_all, chunk_size
+                )
+            )
+        shard_results = [future.result() for future in futures]
+    except Exception as e:
+        # The workers report the errors of the archive and the visitors, so this is an error of the pool itself
+        if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+            _POOLS.pop(os.getpid(), None)
+        log.warning(f"Scanning {archive_path} in one process, as the process pool failed: {e}")
+        return False
+    finally:
+        for future in futures:
+            future.cancel()
+
+    # A visitor is finished with the first error that it met, after merging the shards which preceded it
+    for i, visitor in enumerate(shard_visitors):
+        error: Exception | None = None
+        for results in shard_results:
+            shard_visitor, error = results[i]
+            if error is not None:
+                break
+            visitor.merge(shard_visitor)
+        visitor.finish(error)
+    return True
+
+
+def _zip_scan_shard(
+    archive_path: str,
+    visitors: list[ShardVisitor],
+    start: int,
+    stop: int,
+    read_all: bool,
+    chunk_size: int,
+) -> list[tuple[ShardVisitor, Exception | None]]:
+    """Scan a range of the members of a zip archive with copies of the visitors, in a worker process."""
+    errors: dict[int, Exception] = {}
+    active: list[ScanVisitor] = list(visitors)
+    try:
+        with tarzip.open_archive(archive_path, max_members=0) as archive:
+            zf = archive.specific()
+            if not isinstance(zf, zipfile.ZipFile):
+                raise ValueError(f"Not a zip archive: {archive_path}")
+            for info in zf.infolist()[start:stop]:
+                active, failures = _scan_member(archive, tarzip.ZipMember(info), active, read_all, chunk_size)
+                for visitor, error in failures:
+                    errors[id(visitor)] = error
+    except Exception as e:
+        for visitor in active:
+            errors[id(visitor)] = e
+    return [(visitor, errors.get(id(visitor))) for visitor in visitors]
@@ -17,34 +17,105 @@
 
 from __future__ import annotations
 
+import asyncio
+import collections
+import concurrent.futures
+import dataclasses
 import json
-from typing import TYPE_CHECKING, Final
+import os
+import pathlib
+import threading
+from typing import Final
 
 import aiofiles
 import aiofiles.os
-import blake3
 import pydantic
 
+import atr.hashes as hashes
 import atr.log as log
 import atr.models.attestable as models
 import atr.util as util
 
-if TYPE_CHECKING:
-    import pathlib
+# New files are hashed in parallel, as BLAKE3 releases the GIL while it hashes
+_HASH_THREADS: Final = min(8, os.cpu_count() or 1)
+_INDEX_MEMO_MAX_ENTRIES: Final = 64
 
-_HASH_CHUNK_SIZE: Final[int] = 4 * 1024 * 1024
+# Keyed by the path of an attestable file, with the identity of that file when it was read
+_index_memo: collections.OrderedDict[str, tuple[tuple[int, int, int, int], Index]] = collections.OrderedDict()
+_index_memo_lock = threading.Lock()
+
+
+@dataclasses.dataclass(frozen=True)
+class Index:
+    """The content hashes of the files of one revision by path, and the size of the content of each hash."""
+
+    paths: dict[str, str]
+    sizes: dict[str, int]
+
+    def hash(self, rel_path: str) -> str | None:
+        return self.paths.get(rel_path)
+
+
+async def async_file_blake3(path: str | pathlib.Path) -> str:
+    """Return the BLAKE3 hex digest of a file like file_blake3, but without blocking the event loop."""
+    return await asyncio.to_thread(file_blake3, path)
+
+
+async def async_index(project_name: str, version_name: str, revision_number: str) -> Index | None:
+    """Return the content index of a revision like index, but without blocking the event loop."""
+    return await asyncio.to_thread(index, project_name, version_name, revision_number)
 
 
 def attestable_path(project_name: str, version_name: str, revision_number: str) -> pathlib.Path:
     return util.get_attestable_dir() / project_name / version_name / f"{revision_number}.json"
 
 
-async def compute_file_hash(path: pathlib.Path) -> str:
-    hasher = blake3.blake3()
-    async with aiofiles.open(path, "rb") as f:
-        while chunk := await f.read(_HASH_CHUNK_SIZE):
-            hasher.update(chunk)
-    return f"blake3:{hasher.hexdigest()}"
+def file_blake3(path: str | pathlib.Path) -> str:
+    """Return the BLAKE3 hex digest of a file, from the attestable data of its revision if it is in one.
+
+    Files in a revision are never modified, so their hashes are only computed once, when the revision is created.
+    Other files are hashed as usual.
+    """
+    if (hash_ref := _indexed_hash(pathlib.Path(path))) is not None:
+        return hash_ref
+    return hashes.digest(path, "blake3")
+
+
+def index(project_name: str, version_name: str, revision_number: str) -> Index | None:
+    """Return the content index of a revision from its attestable data, or None if there is none yet.
+
+    An index is read once per process and then remembered until its attestable file changes. Only the parts of the
+    file which the index needs are read, without validating the rest of the attestable data.
+    """
+    file_path = attestable_path(project_name, version_name, revision_number)
+    try:
+        with open(file_path, "rb") as f:
+            key = _file_key(os.fstat(f.fileno()))
+            with _index_memo_lock:
+                remembered = _index_memo.get(str(file_path))
+                if (remembered is not None) and (remembered[0] == key):
+                    _index_memo.move_to_end(str(file_path))
+                    return remembered[1]
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not read the index of {file_path}: {e}")
+        return None
+
+    try:
+        paths = {str(path): str(hash_ref) for path, hash_ref in data["paths"].items()}
+        sizes = {str(hash_ref): int(entry["size"]) for hash_ref, entry in data["hashes"].items()}
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        log.warning(f"Could not parse the index of {file_path}: {e}")
+        return None
+    revision_index = Index(paths, sizes)
+    with _index_memo_lock:
+        _index_memo[str(file_path)] = (key, revision_index)
+        _index_memo.move_to_end(str(file_path))
+        while len(_index_memo) > _INDEX_MEMO_MAX_ENTRIES:
+            _index_memo.popitem(last=False)
+    return revision_index
 
 
 async def load(
@@ -73,9 +144,11 @@ async def write(
     parent_revision_number: str | None,
 ) -> None:
     previous: models.AttestableV1 | None = None
+    parent_directory: pathlib.Path | None = None
     if parent_revision_number is not None:
         previous = await load(project_name, version_name, parent_revision_number)
-    result = await _generate(release_directory, revision_number, uploader_uid, previous)
+        parent_directory = util.get_unfinished_dir() / project_name / version_name / parent_revision_number
+    result = await _generate(release_directory, revision_number, uploader_uid, previous, parent_directory)
     file_path = attestable_path(project_name, version_name, revision_number)
     await util.atomic_write_file(file_path, result.model_dump_json(indent=2))
 
@@ -115,27 +188,30 @@ def _compute_hashes_with_attribution(
     return new_hashes
 
 
+def _file_key(stat_result: os.stat_result) -> tuple[int, int, int, int]:
+    return stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns
+
+
 async def _generate(
     directory: pathlib.Path,
     revision_number: str,
     uploader_uid: str,
     previous: models.AttestableV1 | None,
+    parent_directory: pathlib.Path | None = None,
 ) -> models.AttestableV1:
-    current_path_to_hash: dict[str, str] = {}
-    current_hash_to_paths: dict[str, set[str]] = {}
-    path_to_size: dict[str, int] = {}
-
+    rel_paths: list[str] = []
     async for rel_path in util.paths_recursive(directory):
-        full_path = directory / rel_path
         path_key = str(rel_path)
         if "\\" in path_key:
             # TODO: We should centralise this, and forbid some other characters too
             raise ValueError(f"Backslash in path is forbidden: {path_key}")
-        hash_ref = await compute_file_hash(full_path)
-        file_size = (await aiofiles.os.stat(full_path)).st_size
+        rel_paths.append(path_key)
 
-        current_path_to_hash[path_key] = hash_ref
-        path_to_size[path_key] = file_size
+    current_path_to_hash, path_to_size = await asyncio.to_thread(
+        _hash_files, directory, rel_paths, previous, parent_directory
+    )
+    current_hash_to_paths: dict[str, set[str]] = {}
+    for path_key, hash_ref in current_path_to_hash.items():
         current_hash_to_paths.setdefault(hash_ref, set()).add(path_key)
 
     new_hashes = _compute_hashes_with_attribution(
@@ -146,3 +222,75 @@ async def _generate(
         paths=dict(current_path_to_hash),
         hashes=dict(new_hashes),
     )
+
+
+def _hash_files(
+    directory: pathlib.Path,
+    rel_paths: list[str],
+    previous: models.AttestableV1 | None,
+    parent_directory: pathlib.Path | None,
+) -> tuple[dict[str, str], dict[str, int]]:
+    """Return the hash and size of each file, only hashing files which are not hard links to files of the parent."""
+    known = _parent_hashes(previous, parent_directory)
+    path_to_hash: dict[str, str] = {}
+    path_to_size: dict[str, int] = {}
+    new_paths: list[str] = []
+    for rel_path in rel_paths:
+        stat_result = os.stat(directory / rel_path)
+        path_to_size[rel_path] = stat_result.st_size
+        if (hash_ref := known.get(_file_key(stat_result))) is not None:
+            path_to_hash[rel_path] = hash_ref
+        else:
+            new_paths.append(rel_path)
+
+    if new_paths:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(_HASH_THREADS, len(new_paths))) as executor:
+            digests = executor.map(lambda rel_path: hashes.digest(directory / rel_path, "blake3"), new_paths)
+            for rel_path, digest in zip(new_paths, digests, strict=True):
+                path_to_hash[rel_path] = f"blake3:{digest}"
+    log.info(
+        f"Hashed {util.plural(len(new_paths), 'new file')} of {util.plural(len(rel_paths), 'file')} in {directory}"
+    )
+    return path_to_hash, path_to_size
+
+
+def _indexed_hash(path: pathlib.Path) -> str | None:
+    # Only files of unfinished revisions have attestable data, at <project>/<version>/<revision>/<rel_path>
+    try:
+        parts = pathlib.Path(os.path.abspath(path)).relative_to(os.path.abspath(util.get_unfinished_dir())).parts
+    except ValueError:
+        return None
+    if len(parts) < 4:
+        return None
+    revision_index = index(parts[0], parts[1], parts[2])
+    if revision_index is None:
+        return None
+    hash_ref = revision_index.hash("/".join(parts[3:]))
+    if (hash_ref is None) or (not hash_ref.startswith("blake3:")):
+        return None
+    # The size is compared as a precaution against a file which has been replaced since it was hashed
+    try:
+        if os.stat(path).st_size != revision_index.sizes.get(hash_ref):
+            return None
+    except OSError:
+        return None
+    return hash_ref.removeprefix("blake3:")
+
+
+def _parent_hashes(
+    previous: models.AttestableV1 | None, parent_directory: pathlib.Path | None
+) -> dict[tuple[int, int, int, int], str]:
+    # New revisions are hard linked from their parent, so a file with the same inode, size, and modification time as
+    # a file of the parent has the content which was hashed for the parent
+    known: dict[tuple[int, int, int, int], str] = {}
+    if (previous is None) or (parent_directory is None):
+        return known
+    for path_key, hash_ref in previous.paths.items():
+        try:
+            stat_result = os.stat(parent_directory / path_key)
+        except OSError:
+            continue
+        hash_entry = previous.hashes.get(hash_ref)
+        if (hash_entry is not None) and (hash_entry.size == stat_result.st_size):
+            known[_file_key(stat_result)] = hash_ref
+    return known
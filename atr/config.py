@@ -103,6 +103,12 @@ class AppConfig:
     # TODO: We need to get Puppet to check SVN out initially, or do it manually
     SVN_STORAGE_DIR = os.path.join(STATE_DIR, "subversion")
     ATTESTABLE_STORAGE_DIR = os.path.join(STATE_DIR, "attestable")
+    EXTRACTS_STORAGE_DIR = os.path.join(STATE_DIR, "extracts")
+    MANIFESTS_STORAGE_DIR = os.path.join(STATE_DIR, "manifests")
+    KEYRINGS_STORAGE_DIR = os.path.join(STATE_DIR, "keyrings")
+    WORKER_WAKEUP_DIR = os.path.join(STATE_DIR, "run", "wakeup")
+    WORKER_ZYGOTE_SOCKET = os.path.join(STATE_DIR, "run", "zygote.sock")
+    APACHE_RAT_SERVICE_SOCKET = os.path.join(STATE_DIR, "run", "rat.sock")
     SQLITE_DB_PATH = decouple.config("SQLITE_DB_PATH", default="database/atr.db")
     STORAGE_AUDIT_LOG_FILE = os.path.join(STATE_DIR, "audit", "storage-audit.log")
     PERFORMANCE_LOG_FILE = os.path.join(STATE_DIR, "logs", "route-performance.log")
@@ -110,12 +116,44 @@ class AppConfig:
 
     # Apache RAT configuration
     APACHE_RAT_JAR_PATH = decouple.config("APACHE_RAT_JAR_PATH", default=f"/opt/tools/apache-rat-{_RAT_VERSION}.jar")
+    # Whether RAT checks use long lived JVMs in a service started by the worker manager, rather than a JVM each
+    APACHE_RAT_SERVICE: bool = decouple.config("APACHE_RAT_SERVICE", default=False, cast=bool)
+    # Number of JVMs in the RAT service, which is how many reports it runs concurrently
+    APACHE_RAT_SERVICE_PROCESSES: int = decouple.config("APACHE_RAT_SERVICE_PROCESSES", default=2, cast=int)
+    # Maximum heap size of each JVM in the RAT service
+    APACHE_RAT_SERVICE_HEAP_MB: int = decouple.config("APACHE_RAT_SERVICE_HEAP_MB", default=512, cast=int)
     # Maximum content length for requests
     MAX_CONTENT_LENGTH: int = decouple.config("MAX_CONTENT_LENGTH", default=512 * _MB, cast=int)
     # Maximum size limit for archive extraction
     MAX_EXTRACT_SIZE: int = decouple.config("MAX_EXTRACT_SIZE", default=2 * _GB, cast=int)
     # Chunk size for reading files during extraction
     EXTRACT_CHUNK_SIZE: int = decouple.config("EXTRACT_CHUNK_SIZE", default=4 * _MB, cast=int)
+    # Number of threads which inflate the spans of an indexed gzip file in parallel
+    GZIP_INFLATE_THREADS: int = decouple.config("GZIP_INFLATE_THREADS", default=4, cast=int)
+    # Total size of the cached archive extractions, beyond which the least recently used are removed
+    EXTRACTS_MAX_BYTES: int = decouple.config("EXTRACTS_MAX_BYTES", default=10 * _GB, cast=int)
+    # Number of processes which check and extract the members of a large zip archive in parallel
+    ZIP_PARALLEL_PROCESSES: int = decouple.config("ZIP_PARALLEL_PROCESSES", default=4, cast=int)
+    # Number of members from which a zip archive is processed in parallel rather than in one process
+    ZIP_PARALLEL_MIN_MEMBERS: int = decouple.config("ZIP_PARALLEL_MIN_MEMBERS", default=5000, cast=int)
+    # Maximum number of check results which a task buffers before writing them in one transaction
+    CHECK_RESULT_BATCH_SIZE: int = decouple.config("CHECK_RESULT_BATCH_SIZE", default=500, cast=int)
+    # Maximum number of tasks that a single worker process runs concurrently
+    WORKER_TASK_CONCURRENCY: int = decouple.config("WORKER_TASK_CONCURRENCY", default=1, cast=int)
+    # Of those, the maximum number of CPU bound tasks
+    WORKER_CPU_TASK_CONCURRENCY: int = decouple.config("WORKER_CPU_TASK_CONCURRENCY", default=1, cast=int)
+    # Of those, the maximum number of tasks mostly waiting on subprocesses or the network
+    WORKER_SUBPROCESS_TASK_CONCURRENCY: int = decouple.config("WORKER_SUBPROCESS_TASK_CONCURRENCY", default=4, cast=int)
+    # Seconds between fallback polls of the task queue when workers are woken by socket
+    WORKER_POLL_INTERVAL_SECONDS: float = decouple.config("WORKER_POLL_INTERVAL_SECONDS", default=5.0, cast=float)
+    # Maximum number of tasks that a worker claims in one transaction
+    WORKER_CLAIM_BATCH_SIZE: int = decouple.config("WORKER_CLAIM_BATCH_SIZE", default=4, cast=int)
+    # Seconds before an active task without a worker heartbeat is requeued
+    WORKER_LEASE_SECONDS: int = decouple.config("WORKER_LEASE_SECONDS", default=120, cast=int)
+    # Whether to fork workers from a preloaded zygote process instead of starting new interpreters
+    WORKER_ZYGOTE: bool = decouple.config("WORKER_ZYGOTE", default=False, cast=bool)
+    # Whether running checks of a superseded draft revision are cancelled, as well as queued ones
+    WORKER_CANCEL_SUPERSEDED: bool = decouple.config("WORKER_CANCEL_SUPERSEDED", default=False, cast=bool)
 
     # Session cookie security
     SESSION_COOKIE_SECURE = True
@@ -176,6 +214,12 @@ def get() -> type[AppConfig]:
         (config.UNFINISHED_STORAGE_DIR, "UNFINISHED_STORAGE_DIR"),
         (config.SVN_STORAGE_DIR, "SVN_STORAGE_DIR"),
         (config.ATTESTABLE_STORAGE_DIR, "ATTESTABLE_STORAGE_DIR"),
+        (config.EXTRACTS_STORAGE_DIR, "EXTRACTS_STORAGE_DIR"),
+        (config.MANIFESTS_STORAGE_DIR, "MANIFESTS_STORAGE_DIR"),
+        (config.KEYRINGS_STORAGE_DIR, "KEYRINGS_STORAGE_DIR"),
+        (config.WORKER_WAKEUP_DIR, "WORKER_WAKEUP_DIR"),
+        (config.WORKER_ZYGOTE_SOCKET, "WORKER_ZYGOTE_SOCKET"),
+        (config.APACHE_RAT_SERVICE_SOCKET, "APACHE_RAT_SERVICE_SOCKET"),
         (config.STORAGE_AUDIT_LOG_FILE, "STORAGE_AUDIT_LOG_FILE"),
         (config.PERFORMANCE_LOG_FILE, "PERFORMANCE_LOG_FILE"),
     ]
@@ -26,6 +26,7 @@ import alembic.command as command
 import alembic.config as alembic_config
 import sqlalchemy
 import sqlalchemy.dialects.sqlite
+import sqlalchemy.event as event
 import sqlalchemy.ext.asyncio
 import sqlalchemy.orm as orm
 import sqlalchemy.sql
@@ -37,6 +38,7 @@ import atr.log as log
 import atr.models.schema as schema
 import atr.models.sql as sql
 import atr.util as util
+import atr.wakeup as wakeup
 
 if TYPE_CHECKING:
     import datetime
@@ -147,6 +149,11 @@ class Session(sqlalchemy.ext.asyncio.AsyncSession):
         if explicit_value_passed_by_sessionmaker is not None:
             self.log_queries = explicit_value_passed_by_sessionmaker
 
+        # Wake the task workers whenever a commit adds queued tasks
+        event.listen(self.sync_session, "after_flush", _tasks_queued_flag)
+        event.listen(self.sync_session, "after_commit", _tasks_queued_notify)
+        event.listen(self.sync_session, "after_rollback", _tasks_queued_clear)
+
     # TODO: Need to type all of these arguments correctly
 
     async def begin_immediate(self) -> None:
@@ -665,9 +672,11 @@ class Session(sqlalchemy.ext.asyncio.AsyncSession):
         task_type: Opt[str] = NOT_SET,
         task_args: Opt[Any] = NOT_SET,
         asf_uid: Opt[str] = NOT_SET,
+        priority: Opt[sql.TaskPriority] = NOT_SET,
         added: Opt[datetime.datetime] = NOT_SET,
         started: Opt[datetime.datetime | None] = NOT_SET,
         pid: Opt[int | None] = NOT_SET,
+        lease_expires: Opt[datetime.datetime | None] = NOT_SET,
         completed: Opt[datetime.datetime | None] = NOT_SET,
         result: Opt[Any | None] = NOT_SET,
         error: Opt[str | None] = NOT_SET,
@@ -675,6 +684,8 @@ class Session(sqlalchemy.ext.asyncio.AsyncSession):
         version_name: Opt[str | None] = NOT_SET,
         revision_number: Opt[str | None] = NOT_SET,
         primary_rel_path: Opt[str | None] = NOT_SET,
+        depends_on: Opt[int | None] = NOT_SET,
+        dedup_key: Opt[str | None] = NOT_SET,
         _workflow: bool = False,
     ) -> Query[sql.Task]:
         query = sqlmodel.select(sql.Task)
@@ -689,12 +700,16 @@ class Session(sqlalchemy.ext.asyncio.AsyncSession):
             query = query.where(sql.Task.task_args == task_args)
         if is_defined(asf_uid):
             query = query.where(sql.Task.asf_uid == asf_uid)
+        if is_defined(priority):
+            query = query.where(sql.Task.priority == priority)
         if is_defined(added):
             query = query.where(sql.Task.added == added)
         if is_defined(started):
             query = query.where(sql.Task.started == started)
         if is_defined(pid):
             query = query.where(sql.Task.pid == pid)
+        if is_defined(lease_expires):
+            query = query.where(sql.Task.lease_expires == lease_expires)
         if is_defined(completed):
             query = query.where(sql.Task.completed == completed)
         if is_defined(result):
@@ -709,6 +724,10 @@ class Session(sqlalchemy.ext.asyncio.AsyncSession):
             query = query.where(sql.Task.revision_number == revision_number)
         if is_defined(primary_rel_path):
             query = query.where(sql.Task.primary_rel_path == primary_rel_path)
+        if is_defined(depends_on):
+            query = query.where(sql.Task.depends_on == depends_on)
+        if is_defined(dedup_key):
+            query = query.where(sql.Task.dedup_key == dedup_key)
 
         if _workflow:
             query = query.options(joined_load(sql.Task.workflow))
@@ -1031,3 +1050,17 @@ async def shutdown_database() -> None:
         await _global_atr_engine.dispose()
     else:
         log.info("No database to close")
+
+
+def _tasks_queued_clear(session: orm.Session) -> None:
+    session.info.pop("tasks_queued", None)
+
+
+def _tasks_queued_flag(session: orm.Session, flush_context: orm.UOWTransaction) -> None:
+    if any(isinstance(obj, sql.Task) and (obj.status == sql.TaskStatus.QUEUED) for obj in session.new):
+        session.info["tasks_queued"] = True
+
+
+def _tasks_queued_notify(session: orm.Session) -> None:
+    if session.info.pop("tasks_queued", False):
+        wakeup.notify()
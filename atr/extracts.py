@@ -0,0 +1,188 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Share one read-only extraction of each archive between all of the checkers which need it."""
+
+import asyncio
+import contextlib
+import fcntl
+import json
+import os
+import pathlib
+import shutil
+from collections.abc import AsyncGenerator, Generator
+from typing import Final
+
+import atr.archives as archives
+import atr.attestable as attestable
+import atr.config as config
+import atr.log as log
+import atr.util as util
+
+_EVICTED_PREFIX: Final = ".evicted-"
+_EVICTION_LOCK: Final = ".eviction.lock"
+_LOCK_SUFFIX: Final = ".lock"
+_META_FILENAME: Final = "meta.json"
+_STAGING_PREFIX: Final = ".staging-"
+_TREE_DIRNAME: Final = "tree"
+
+
+@contextlib.asynccontextmanager
+async def async_extracted(archive_path: str, max_size: int, chunk_size: int) -> AsyncGenerator[pathlib.Path]:
+    """Yield the extracted tree of an archive like extracted, but without blocking the event loop."""
+    lock_fd, tree_dir = await asyncio.to_thread(_acquire, archive_path, max_size, chunk_size)
+    try:
+        yield tree_dir
+    finally:
+        os.close(lock_fd)
+
+
+@contextlib.contextmanager
+def extracted(archive_path: str, max_size: int, chunk_size: int) -> Generator[pathlib.Path]:
+    """Yield the extracted tree of an archive, extracting it only if no tree of the same content is cached.
+
+    The tree is shared with every other user of the same archive content, so it is read only.
+    """
+    lock_fd, tree_dir = _acquire(archive_path, max_size, chunk_size)
+    try:
+        yield tree_dir
+    finally:
+        os.close(lock_fd)
+
+
+def _acquire(archive_path: str, max_size: int, chunk_size: int) -> tuple[int, pathlib.Path]:
+    cache_dir = util.get_extracts_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = attestable.file_blake3(archive_path)
+    entry_dir = cache_dir / key
+
+    # A shared lock on the entry is a reference to it, and eviction skips entries with references
+    # The kernel releases the lock if the process dies, so references are never leaked
+    lock_fd = os.open(cache_dir / (key + _LOCK_SUFFIX), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_SH)
+        size = _entry_size(entry_dir)
+        if size is None:
+            size = _entry_build(cache_dir, key, archive_path, max_size, chunk_size)
+            _evict(cache_dir)
+        else:
+            log.info(f"Using cached extraction of {archive_path} at {entry_dir}")
+            # The modification time of the metadata records when the entry was last used
+            os.utime(entry_dir / _META_FILENAME)
+        if size > max_size:
+            raise archives.ExtractionError(
+                f"Extraction exceeded maximum size limit of {max_size} bytes",
+                {"max_size": max_size, "current_size": size},
+            )
+    except BaseException:
+        os.close(lock_fd)
+        raise
+    return lock_fd, entry_dir / _TREE_DIRNAME
+
+
+def _entry_build(cache_dir: pathlib.Path, key: str, archive_path: str, max_size: int, chunk_size: int) -> int:
+    entry_dir = cache_dir / key
+    build_fd = os.open(cache_dir / (key + ".build" + _LOCK_SUFFIX), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(build_fd, fcntl.LOCK_EX)
+        # Another process may have built the entry while this one was waiting
+        if (size := _entry_size(entry_dir)) is not None:
+            return size
+
+        staging_dir = cache_dir / (_STAGING_PREFIX + key)
+        if staging_dir.exists():
+            # Left behind by a process which stopped while extracting
+            _tree_remove(staging_dir)
+        tree_dir = staging_dir / _TREE_DIRNAME
+        tree_dir.mkdir(parents=True)
+        try:
+            log.info(f"Extracting {archive_path} to the extraction cache")
+            size, _extracted_paths = archives.extract(
+                archive_path, str(tree_dir), max_size=max_size, chunk_size=chunk_size
+            )
+            _tree_read_only(tree_dir)
+            with open(staging_dir / _META_FILENAME, "w", encoding="utf-8") as f:
+                json.dump({"archive_path": archive_path, "size": size}, f)
+            os.rename(staging_dir, entry_dir)
+        except BaseException:
+            _tree_remove(staging_dir)
+            raise
+        return size
+    finally:
+        os.close(build_fd)
+
+
+def _entry_remove(cache_dir: pathlib.Path, key: str) -> bool:
+    # Lock files are never removed, because a process may be about to lock the file that would be removed
+    lock_fd = os.open(cache_dir / (key + _LOCK_SUFFIX), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # The entry is in use
+            return False
+        evicted_dir = cache_dir / (_EVICTED_PREFIX + key)
+        os.rename(cache_dir / key, evicted_dir)
+        _tree_remove(evicted_dir)
+        return True
+    finally:
+        os.close(lock_fd)
+
+
+def _entry_size(entry_dir: pathlib.Path) -> int | None:
+    try:
+        with open(entry_dir / _META_FILENAME, encoding="utf-8") as f:
+            return int(json.load(f)["size"])
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+def _evict(cache_dir: pathlib.Path) -> None:
+    """Remove the least recently used entries which are not in use until the cache fits within its size limit."""
+    max_bytes = config.get().EXTRACTS_MAX_BYTES
+    eviction_fd = os.open(cache_dir / _EVICTION_LOCK, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(eviction_fd, fcntl.LOCK_EX)
+        entries: list[tuple[float, str, int]] = []
+        for name in os.listdir(cache_dir):
+            if name.startswith(".") or name.endswith(_LOCK_SUFFIX):
+                continue
+            entry_dir = cache_dir / name
+            if (size := _entry_size(entry_dir)) is None:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                entries.append((os.stat(entry_dir / _META_FILENAME).st_mtime, name, size))
+
+        total = sum(size for _mtime, _name, size in entries)
+        for _mtime, name, size in sorted(entries):
+            if total <= max_bytes:
+                break
+            if _entry_remove(cache_dir, name):
+                log.info(f"Evicted cached extraction {name} ({size} bytes)")
+                total -= size
+    finally:
+        os.close(eviction_fd)
+
+
+def _tree_read_only(tree_dir: pathlib.Path) -> None:
+    util.chmod_files(tree_dir, 0o444)
+    util.chmod_directories(tree_dir, 0o555)
+
+
+def _tree_remove(path: pathlib.Path) -> None:
+    # Read only directories must be made writable again before their contents can be removed
+    util.chmod_directories(path, 0o755)
+    shutil.rmtree(path)
@@ -0,0 +1,562 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Read gzip files with random access and parallel inflation, using a persistent index of seek points.
+
+This follows zran.c from the zlib distribution. While a gzip file is inflated from its start, a seek point is
+recorded at a deflate block boundary after about every _SPAN bytes of output. A seek point holds the bit position
+of the block in the compressed data and the 32 KiB of output before it, which is all that inflate needs to resume
+from there. Once the whole file has been inflated, its seek points are stored by the content hash of the file, and
+later readers of the same content inflate the spans between seek points in parallel threads.
+
+The zlib module cannot resume inflation at a bit position, so zlib is called through ctypes instead.
+"""
+
+import array
+import bisect
+import concurrent.futures
+import contextlib
+import ctypes
+import ctypes.util
+import dataclasses
+import functools
+import os
+import pathlib
+import struct
+import sys
+import tempfile
+import zlib
+from typing import BinaryIO, Final, Self
+
+import atr.attestable as attestable
+import atr.config as config
+import atr.log as log
+import atr.util as util
+
+_BUFFER_SIZE: Final[int] = 256 * 1024
+_GZIP_MAGIC: Final = b"\x1f\x8b"
+_HEADER: Final = struct.Struct("<4sHIq")
+_INPUT_SIZE: Final[int] = 256 * 1024
+_MAGIC: Final = b"ATRZ"
+_SPAN: Final[int] = 4 * 1024 * 1024
+_SUFFIX: Final = ".gzindex"
+_TRAILER_SIZE: Final[int] = 8
+_TRUNCATED_MESSAGE: Final = "Compressed file ended before the end-of-stream marker was reached"
+# Increment this when the format changes, and older indexes will be rebuilt
+_VERSION: Final[int] = 1
+_WBITS_GZIP: Final[int] = 31
+_WBITS_RAW: Final[int] = -15
+_WINDOW_SIZE: Final[int] = 32 * 1024
+
+# Constants from zlib.h
+_Z_BLOCK: Final[int] = 5
+_Z_BUF_ERROR: Final[int] = -5
+_Z_NO_FLUSH: Final[int] = 0
+_Z_OK: Final[int] = 0
+_Z_STREAM_END: Final[int] = 1
+
+# Thread pools do not survive a fork, so each process has its own
+_EXECUTORS: Final[dict[int, concurrent.futures.ThreadPoolExecutor]] = {}
+
+
+class GzipIndex:
+    """The seek points of a gzip file, which divide its uncompressed content into spans."""
+
+    def __init__(self, points: list["SeekPoint"], size: int) -> None:
+        self.points = points
+        self.size = size
+        self._offsets = [point.out_offset for point in points]
+
+    @property
+    def span_count(self) -> int:
+        return len(self.points) + 1
+
+    def span(self, number: int) -> tuple["SeekPoint | None", int, int]:
+        """Return the seek point at which a span starts, or None for the first span, and its bounds."""
+        start = self.points[number - 1].out_offset if (number > 0) else 0
+        end = self.points[number].out_offset if (number < len(self.points)) else self.size
+        point = self.points[number - 1] if (number > 0) else None
+        return point, start, end
+
+    def span_number(self, position: int) -> int:
+        return bisect.bisect_right(self._offsets, position)
+
+
+class IndexedGzipFile:
+    """A seekable file object for the uncompressed content of a gzip file.
+
+    Until the index of the file has been built, content is inflated as a stream, which builds the index as it goes.
+    Seeking backwards resumes from the nearest seek point recorded so far. Once the index exists, spans of content
+    are inflated in parallel threads, reading ahead of a reader which reads sequentially.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._fd = os.open(path, os.O_RDONLY)
+        try:
+            self._key = attestable.file_blake3(path)
+            self._index = _load(self._key)
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._position = 0
+        # State of a file which has no index yet
+        self._points: list[SeekPoint] = []
+        self._inflater: Inflater | None = None
+        self._buffer = b""
+        self._buffer_start = 0
+        # State of a file which has an index
+        self._spans: dict[int, concurrent.futures.Future[bytes]] = {}
+        self._last_span = -1
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for future in self._spans.values():
+            future.cancel()
+        self._spans.clear()
+        if self._inflater is not None:
+            self._inflater.close()
+            self._inflater = None
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def finish(self) -> None:
+        """Inflate the rest of the file if it has no index yet, so that the index is completed and stored."""
+        if (self._index is not None) or (self._inflater is None):
+            return
+        while not self._inflater.ended:
+            self._inflater.read(_SPAN)
+        self._complete()
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = sys.maxsize
+        if self._index is not None:
+            data = self._read_indexed(self._position, size)
+        else:
+            data = self._read_streaming(self._position, size)
+        self._position += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        match whence:
+            case os.SEEK_SET:
+                position = offset
+            case os.SEEK_CUR:
+                position = self._position + offset
+            case os.SEEK_END if self._index is not None:
+                position = self._index.size + offset
+            case _:
+                raise OSError(f"Unsupported seek whence {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def tell(self) -> int:
+        return self._position
+
+    def _complete(self) -> None:
+        if self._inflater is None:
+            return
+        self._index = GzipIndex(self._points, self._inflater.out)
+        # Only an inflation from the start checks the CRC of every member, so only that is trusted to be stored
+        # Any later reader of the same content can then skip that check, since the content hash is the same
+        if self._inflater.from_start:
+            _save(self._key, self._index)
+        self._inflater.close()
+        self._inflater = None
+
+    def _inflater_at(self, position: int) -> "Inflater":
+        if self._inflater is not None:
+            self._inflater.close()
+        offsets = [point.out_offset for point in self._points]
+        number = bisect.bisect_right(offsets, position)
+        point = self._points[number - 1] if (number > 0) else None
+        self._inflater = Inflater(self._fd, point, self._points)
+        return self._inflater
+
+    def _read_indexed(self, position: int, size: int) -> bytes:
+        index = self._index
+        if index is None:
+            return b""
+        end = min(position + size, index.size)
+        chunks: list[bytes] = []
+        while position < end:
+            start, data = self._span(index, index.span_number(position))
+            chunk = data[position - start : end - start]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            position += len(chunk)
+        return b"".join(chunks)
+
+    def _read_streaming(self, position: int, size: int) -> bytes:
+        end = position + size
+        chunks: list[bytes] = []
+        while position < end:
+            buffer_offset = position - self._buffer_start
+            if 0 <= buffer_offset < len(self._buffer):
+                chunk = self._buffer[buffer_offset : buffer_offset + (end - position)]
+                chunks.append(chunk)
+                position += len(chunk)
+                continue
+            if self._index is not None:
+                # The index was completed by this read
+                chunks.append(self._read_indexed(position, end - position))
+                break
+
+            inflater = self._inflater
+            if (inflater is None) or (inflater.out > position):
+                inflater = self._inflater_at(position)
+            # Seeking forwards, which tarfile does to pass over the content of members, inflates and discards
+            while (inflater.out < position) and (not inflater.ended):
+                inflater.read(min(position - inflater.out, _SPAN))
+            if inflater.ended:
+                self._complete()
+                break
+            self._buffer_start = inflater.out
+            self._buffer = inflater.read(_BUFFER_SIZE)
+            if inflater.ended:
+                self._complete()
+            if not self._buffer:
+                break
+        return b"".join(chunks)
+
+    def _span(self, index: GzipIndex, number: int) -> tuple[int, bytes]:
+        # Read ahead only for a sequential reader, since tarfile seeks over the content of members it skips
+        sequential = number in {self._last_span, self._last_span + 1}
+        self._last_span = number
+        read_ahead = max(1, config.get().GZIP_INFLATE_THREADS) if sequential else 0
+        wanted = range(number, min(number + read_ahead + 1, index.span_count))
+
+        for other in list(self._spans):
+            if other not in wanted:
+                self._spans.pop(other).cancel()
+        for wanted_number in wanted:
+            if wanted_number not in self._spans:
+                point, start, end = index.span(wanted_number)
+                self._spans[wanted_number] = _executor().submit(_span_inflate, self._path, point, end - start)
+
+        _point, start, _end = index.span(number)
+        return start, self._spans[number].result()
+
+
+class Inflater:
+    """Inflate a gzip file from its start or from a seek point, recording seek points if given a list for them."""
+
+    def __init__(self, fd: int, point: "SeekPoint | None", points: list["SeekPoint"] | None) -> None:
+        library = _library()
+        if library is None:
+            raise OSError("The zlib library is not available")
+        self._library = library
+        self._fd = fd
+        self._points = points
+        self._stream = ZStream()
+        self._input = ctypes.create_string_buffer(_INPUT_SIZE)
+        self._output = ctypes.create_string_buffer(_BUFFER_SIZE)
+        self._window = bytearray()
+        self.ended = False
+        self.from_start = point is None
+
+        version = library.zlibVersion()
+        if point is None:
+            self._check(library.inflateInit2_(ctypes.byref(self._stream), _WBITS_GZIP, version, ctypes.sizeof(ZStream)))
+            self._gzip = True
+            self._offset = 0
+            self.out = 0
+            return
+
+        self._check(library.inflateInit2_(ctypes.byref(self._stream), _WBITS_RAW, version, ctypes.sizeof(ZStream)))
+        # Inflating from a seek point skips the gzip wrapper of the member which contains it
+        self._gzip = False
+        self._offset = point.in_offset
+        self.out = point.out_offset
+        if point.bits:
+            byte = os.pread(fd, 1, point.in_offset - 1)[0]
+            self._check(library.inflatePrime(ctypes.byref(self._stream), point.bits, byte >> (8 - point.bits)))
+        window = zlib.decompress(point.window)
+        self._check(library.inflateSetDictionary(ctypes.byref(self._stream), window, len(window)))
+        if points is not None:
+            self._window = bytearray(window)
+
+    def close(self) -> None:
+        if self._stream.state:
+            self._library.inflateEnd(ctypes.byref(self._stream))
+
+    def read(self, size: int) -> bytes:
+        """Inflate up to size bytes, returning fewer only at the end of the file or before an error."""
+        recording = self._points is not None
+        flush = _Z_BLOCK if recording else _Z_NO_FLUSH
+        chunks: list[bytes] = []
+        remaining = size
+        while (remaining > 0) and (not self.ended):
+            if (self._stream.avail_in == 0) and (not self._fill()):
+                # Return what was inflated before the file ended, like GzipFile, and raise on the next read
+                if chunks:
+                    break
+                raise EOFError(_TRUNCATED_MESSAGE)
+            wanted = min(remaining, _BUFFER_SIZE)
+            self._stream.next_out = ctypes.addressof(self._output)
+            self._stream.avail_out = wanted
+            result = self._library.inflate(ctypes.byref(self._stream), flush)
+
+            produced = wanted - self._stream.avail_out
+            if produced:
+                chunk = ctypes.string_at(self._output, produced)
+                chunks.append(chunk)
+                remaining -= produced
+                self.out += produced
+                if recording:
+                    self._window += chunk
+                    del self._window[:-_WINDOW_SIZE]
+
+            if result == _Z_STREAM_END:
+                self._member_end()
+            elif (result != _Z_OK) and (result != _Z_BUF_ERROR):
+                raise zlib.error(f"Error {result} while decompressing data: {self._message()}")
+            elif recording:
+                self._point_record()
+        return b"".join(chunks)
+
+    def _check(self, result: int) -> None:
+        if result != _Z_OK:
+            raise zlib.error(f"Error {result} while initialising decompression: {self._message()}")
+
+    def _fill(self) -> bool:
+        count = os.preadv(self._fd, [self._input], self._offset)
+        if count == 0:
+            return False
+        self._offset += count
+        self._stream.next_in = ctypes.addressof(self._input)
+        self._stream.avail_in = count
+        return True
+
+    def _member_end(self) -> None:
+        position = self._offset - self._stream.avail_in
+        if not self._gzip:
+            # Raw inflation leaves the trailer of the member unread
+            position += _TRAILER_SIZE
+            if position > os.fstat(self._fd).st_size:
+                raise EOFError(_TRUNCATED_MESSAGE)
+
+        # Another member may follow, and gzip files may be padded with zeroes after their last member
+        while True:
+            data = os.pread(self._fd, _INPUT_SIZE, position)
+            if not data:
+                self.ended = True
+                return
+            padding = len(data) - len(data.lstrip(b"\x00"))
+            position += padding
+            if padding < len(data):
+                break
+
+        self._offset = position
+        self._stream.avail_in = 0
+        self._check(self._library.inflateReset2(ctypes.byref(self._stream), _WBITS_GZIP))
+        self._gzip = True
+
+    def _message(self) -> str:
+        message = self._stream.msg
+        return message.decode("utf-8", "replace") if message else "unknown error"
+
+    def _point_record(self) -> None:
+        if self._points is None:
+            return
+        data_type = self._stream.data_type
+        # Bit 128 is set at the end of a deflate block, and bit 64 while inflating the last block of a member
+        if (not (data_type & 128)) or (data_type & 64):
+            return
+        last = self._points[-1].out_offset if self._points else 0
+        if (self.out - last) < _SPAN:
+            return
+        self._points.append(
+            SeekPoint(
+                in_offset=self._offset - self._stream.avail_in,
+                bits=data_type & 7,
+                out_offset=self.out,
+                window=zlib.compress(bytes(self._window), 1),
+            )
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class SeekPoint:
+    """A position in a gzip file at which inflation can resume."""
+
+    # The offset of the first whole byte of the deflate block in the compressed data
+    in_offset: int
+    # The number of bits of the deflate block in the byte before in_offset
+    bits: int
+    # The offset of the deflate block in the uncompressed data
+    out_offset: int
+    # The compressed 32 KiB of uncompressed data before out_offset, or all of it if there is less
+    window: bytes
+
+
+class ZStream(ctypes.Structure):
+    """The z_stream structure from zlib.h."""
+
+    _fields_ = [
+        ("next_in", ctypes.c_void_p),
+        ("avail_in", ctypes.c_uint),
+        ("total_in", ctypes.c_ulong),
+        ("next_out", ctypes.c_void_p),
+        ("avail_out", ctypes.c_uint),
+        ("total_out", ctypes.c_ulong),
+        ("msg", ctypes.c_char_p),
+        ("state", ctypes.c_void_p),
+        ("zalloc", ctypes.c_void_p),
+        ("zfree", ctypes.c_void_p),
+        ("opaque", ctypes.c_void_p),
+        ("data_type", ctypes.c_int),
+        ("adler", ctypes.c_ulong),
+        ("reserved", ctypes.c_ulong),
+    ]
+
+
+def available() -> bool:
+    """Return whether indexed gzip files can be read, which needs the zlib library."""
+    return _library() is not None
+
+
+def is_gzip(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(_GZIP_MAGIC)) == _GZIP_MAGIC
+
+
+def _executor() -> concurrent.futures.ThreadPoolExecutor:
+    pid = os.getpid()
+    if pid not in _EXECUTORS:
+        _EXECUTORS.clear()
+        _EXECUTORS[pid] = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, config.get().GZIP_INFLATE_THREADS), thread_name_prefix="gzindex"
+        )
+    return _EXECUTORS[pid]
+
+
+@functools.cache
+def _library() -> ctypes.CDLL | None:
+    name = ctypes.util.find_library("z")
+    if name is None:
+        return None
+    try:
+        library = ctypes.CDLL(name)
+    except OSError:
+        return None
+
+    stream = ctypes.POINTER(ZStream)
+    library.inflate.argtypes = [stream, ctypes.c_int]
+    library.inflateEnd.argtypes = [stream]
+    library.inflateInit2_.argtypes = [stream, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+    library.inflatePrime.argtypes = [stream, ctypes.c_int, ctypes.c_int]
+    library.inflateReset2.argtypes = [stream, ctypes.c_int]
+    library.inflateSetDictionary.argtypes = [stream, ctypes.c_char_p, ctypes.c_uint]
+    library.zlibVersion.restype = ctypes.c_char_p
+    return library
+
+
+def _load(key: str) -> GzipIndex | None:
+    try:
+        with open(_path(key), "rb") as f:
+            return _read(f)
+    except FileNotFoundError:
+        return None
+    except (EOFError, ValueError, struct.error) as e:
+        log.warning(f"Ignoring unreadable gzip index {key}: {e}")
+        return None
+
+
+def _path(key: str) -> pathlib.Path:
+    # The indexes are stored beside the manifests of archive members, which have the same keys
+    return util.get_manifests_dir() / (key + _SUFFIX)
+
+
+def _read(f: BinaryIO) -> GzipIndex:
+    magic, version, count, size = _HEADER.unpack(f.read(_HEADER.size))
+    if (magic != _MAGIC) or (version != _VERSION):
+        raise ValueError(f"Unsupported gzip index format {magic!r} version {version}")
+
+    columns: list[array.array] = []
+    for typecode in ("q", "B", "q", "I"):
+        column = array.array(typecode)
+        column.fromfile(f, count)
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns.append(column)
+    in_offsets, bits, out_offsets, window_lengths = columns
+
+    windows = f.read()
+    if len(windows) != sum(window_lengths):
+        raise ValueError("Gzip index windows do not match their lengths")
+    points: list[SeekPoint] = []
+    window_start = 0
+    for i in range(count):
+        window_end = window_start + window_lengths[i]
+        points.append(SeekPoint(in_offsets[i], bits[i], out_offsets[i], windows[window_start:window_end]))
+        window_start = window_end
+    return GzipIndex(points, size)
+
+
+def _save(key: str, index: GzipIndex) -> None:
+    columns = [
+        array.array("q", [point.in_offset for point in index.points]),
+        array.array("B", [point.bits for point in index.points]),
+        array.array("q", [point.out_offset for point in index.points]),
+        array.array("I", [len(point.window) for point in index.points]),
+    ]
+
+    index_path = _path(key)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file and rename it, so that concurrent readers never see a partial index
+    fd, temp_path = tempfile.mkstemp(dir=index_path.parent, prefix=".", suffix=_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, len(index.points), index.size))
+            for column in columns:
+                if sys.byteorder == "big":
+                    column.byteswap()
+                column.tofile(f)
+            for point in index.points:
+                f.write(point.window)
+        os.replace(temp_path, index_path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_path)
+        raise
+    log.info(f"Stored the gzip index of {len(index.points)} seek points as {key}")
+
+
+def _span_inflate(path: str, point: SeekPoint | None, length: int) -> bytes:
+    # Each span has its own file descriptor, so that no span outlives the descriptor that it reads
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        inflater = Inflater(fd, point, None)
+        try:
+            data = inflater.read(length)
+        finally:
+            inflater.close()
+    finally:
+        os.close(fd)
+    if len(data) != length:
+        raise EOFError(_TRUNCATED_MESSAGE)
+    return data
@@ -0,0 +1,105 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Compute every digest of a file that is needed in one read, and remember them while the file is unchanged."""
+
+import asyncio
+import collections
+import hashlib
+import os
+import pathlib
+import threading
+from collections.abc import Callable, Iterable
+from typing import Any, Final
+
+import blake3
+
+ALGORITHMS: Final[dict[str, Callable[[], Any]]] = {
+    "blake3": blake3.blake3,
+    "sha256": hashlib.sha256,
+    "sha3_256": hashlib.sha3_256,
+    "sha512": hashlib.sha512,
+}
+
+# BLAKE3 is cheap, and is the content key used throughout, so it is always computed while a file is being read
+_ALWAYS: Final = frozenset({"blake3"})
+_CHUNK_SIZE: Final = 4 * 1024 * 1024
+_MEMO_MAX_ENTRIES: Final = 4096
+
+# Keyed by (device, inode, size, modification time), which changes whenever the content of a file is replaced
+_memo: collections.OrderedDict[tuple[int, int, int, int], dict[str, str]] = collections.OrderedDict()
+_memo_lock = threading.Lock()
+
+
+async def async_digest(path: str | pathlib.Path, algorithm: str) -> str:
+    """Return the hex digest of a file like digest, but without blocking the event loop."""
+    return (await async_digests(path, [algorithm]))[algorithm]
+
+
+async def async_digests(path: str | pathlib.Path, algorithms: Iterable[str]) -> dict[str, str]:
+    """Return hex digests of a file like digests, but without blocking the event loop."""
+    return await asyncio.to_thread(digests, path, algorithms)
+
+
+def digest(path: str | pathlib.Path, algorithm: str) -> str:
+    """Return the hex digest of a file using one of ALGORITHMS."""
+    return digests(path, [algorithm])[algorithm]
+
+
+def digests(path: str | pathlib.Path, algorithms: Iterable[str]) -> dict[str, str]:
+    """Return the hex digest of a file for each of the given ALGORITHMS.
+
+    Digests which are not remembered from an earlier call for the same unchanged file are all computed in a single
+    read of the file.
+    """
+    requested = set(algorithms)
+    if unknown := (requested - ALGORITHMS.keys()):
+        raise ValueError(f"Unsupported hash algorithms: {', '.join(sorted(unknown))}")
+
+    with open(path, "rb") as f:
+        key = _key(os.fstat(f.fileno()))
+        with _memo_lock:
+            known = dict(_memo.get(key, {}))
+        missing = requested - known.keys()
+        if missing:
+            known.update(_read(f, missing | _ALWAYS))
+            # The file may have been changed while it was being read, in which case the digests are not remembered
+            if _key(os.fstat(f.fileno())) == key:
+                _remember(key, known)
+    return {algorithm: known[algorithm] for algorithm in requested}
+
+
+def _key(stat_result: os.stat_result) -> tuple[int, int, int, int]:
+    return stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns
+
+
+def _read(f: Any, algorithms: set[str]) -> dict[str, str]:
+    hashers = [(algorithm, ALGORITHMS[algorithm]()) for algorithm in sorted(algorithms)]
+    buffer = bytearray(_CHUNK_SIZE)
+    view = memoryview(buffer)
+    while size := f.readinto(buffer):
+        chunk = view[:size]
+        for _algorithm, hasher in hashers:
+            hasher.update(chunk)
+    return {algorithm: hasher.hexdigest() for algorithm, hasher in hashers}
+
+
+def _remember(key: tuple[int, int, int, int], known: dict[str, str]) -> None:
+    with _memo_lock:
+        _memo.setdefault(key, {}).update(known)
+        _memo.move_to_end(key)
+        while len(_memo) > _MEMO_MAX_ENTRIES:
+            _memo.popitem(last=False)
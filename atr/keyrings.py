@@ -0,0 +1,130 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Share one read-only GnuPG keyring of the public signing keys of each committee between all signature checks."""
+
+import contextlib
+import os
+import pathlib
+import shutil
+import time
+from collections.abc import Sequence
+from typing import Final
+
+import blake3
+import gnupg
+
+import atr.log as log
+import atr.util as util
+
+_EVICTED_PREFIX: Final = ".evicted-"
+# Options which stop gpg from writing to a keyring, so that concurrent checks can share it
+_READ_ONLY_OPTIONS: Final = ["--lock-never", "--no-auto-check-trustdb"]
+_STAGING_PREFIX: Final = ".staging-"
+# Keyrings of a committee which have been replaced and unused for this long are removed
+_STALE_SECONDS: Final = 3600
+
+
+def gpg(keyring_dir: pathlib.Path) -> gnupg.GPG:
+    """Return a GPG instance which uses a keyring built by keyring without writing to it."""
+    return gnupg.GPG(gnupghome=str(keyring_dir), options=list(_READ_ONLY_OPTIONS))
+
+
+def keyring(committee_name: str, keys: Sequence[tuple[str, str]]) -> pathlib.Path:
+    """Return the GnuPG home directory of a keyring of the given (fingerprint, ASCII armored key) pairs.
+
+    The keyring is named by a hash of the keys, so that it is built once and then shared by every check until the keys
+    of the committee change. It is read only, and must only be used through gpg.
+    """
+    keyrings_dir = util.get_keyrings_dir()
+    keyrings_dir.mkdir(parents=True, exist_ok=True)
+    name = f"{committee_name}-{keys_hash(keys)}"
+    keyring_dir = keyrings_dir / name
+    if keyring_dir.is_dir():
+        # The modification time of the directory records when the keyring was last used
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(keyring_dir)
+        return keyring_dir
+
+    _build(keyrings_dir, name, [armored for _fingerprint, armored in keys])
+    _prune(keyrings_dir, committee_name, name)
+    return keyring_dir
+
+
+def keys_hash(keys: Sequence[tuple[str, str]]) -> str:
+    """Return a hash which changes whenever any of the given (fingerprint, ASCII armored key) pairs change."""
+    # The key material is included as well as the fingerprint, because a key can be updated with new subkeys or UIDs
+    hasher = blake3.blake3()
+    for fingerprint, armored in sorted(keys):
+        hasher.update(fingerprint.lower().encode())
+        hasher.update(b"\0")
+        hasher.update(armored.encode("utf-8", "replace"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+
+def _build(keyrings_dir: pathlib.Path, name: str, ascii_armored_keys: list[str]) -> None:
+    staging_dir = keyrings_dir / f"{_STAGING_PREFIX}{name}-{os.getpid()}"
+    if staging_dir.exists():
+        # Left behind by an earlier process with the same PID which stopped while building
+        _remove(staging_dir)
+    staging_dir.mkdir(mode=0o700)
+    try:
+        start = time.perf_counter_ns()
+        # TODO: Will this fail if one key doesn't work?
+        import_result = gnupg.GPG(gnupghome=str(staging_dir)).import_keys("\n\n".join(ascii_armored_keys))
+        if not import_result.fingerprints:
+            log.warning("No fingerprints found after importing keys")
+        end = time.perf_counter_ns()
+        log.info(f"Import of {util.plural(len(ascii_armored_keys), 'key')} took {(end - start) / 1000000} ms")
+
+        util.chmod_files(staging_dir, 0o400)
+        util.chmod_directories(staging_dir, 0o500)
+        try:
+            os.rename(staging_dir, keyrings_dir / name)
+        except OSError:
+            # Another process built the same keyring first
+            if not (keyrings_dir / name).is_dir():
+                raise
+            _remove(staging_dir)
+    except BaseException:
+        if staging_dir.exists():
+            _remove(staging_dir)
+        raise
+
+
+def _prune(keyrings_dir: pathlib.Path, committee_name: str, current: str) -> None:
+    """Remove the keyrings of a committee which have been replaced and have not been used recently."""
+    # A check which started with an older keyring may still be using it, so it is only removed when it is stale
+    cutoff = time.time() - _STALE_SECONDS
+    for path in keyrings_dir.iterdir():
+        if path.name.startswith(".") or (path.name == current):
+            continue
+        if path.name.rsplit("-", 1)[0] != committee_name:
+            continue
+        with contextlib.suppress(FileNotFoundError):
+            if path.stat().st_mtime >= cutoff:
+                continue
+            evicted_dir = keyrings_dir / f"{_EVICTED_PREFIX}{path.name}-{os.getpid()}"
+            os.rename(path, evicted_dir)
+            _remove(evicted_dir)
+            log.info(f"Removed stale keyring {path.name}")
+
+
+def _remove(path: pathlib.Path) -> None:
+    # Read only directories must be made writable again before their contents can be removed
+    util.chmod_directories(path, 0o700)
+    shutil.rmtree(path)
@@ -29,10 +29,13 @@ import sys
 import sqlalchemy.engine as engine
 import sqlmodel
 
+import atr.config as config
 import atr.db as db
 import atr.log as log
 import atr.models.sql as sql
+import atr.ratservice as ratservice
 import atr.util as util
+import atr.wakeup as wakeup
 
 # Global debug flag to control worker process output capturing
 global_worker_debug: bool = False
@@ -51,11 +54,26 @@ class WorkerManager:
         max_workers: int = 8,
         check_interval_seconds: float = 2.0,
         max_task_seconds: float = 300.0,
+        scale_up_queued_per_worker: int = 2,
+        scale_up_queued_age_seconds: float = 10.0,
+        scale_up_max_load_per_cpu: float = 1.5,
+        scale_down_idle_seconds: float = 60.0,
+        zygote: bool | None = None,
     ):
         self.min_workers = min_workers
         self.max_workers = max_workers
         self.check_interval_seconds = check_interval_seconds
         self.max_task_seconds = max_task_seconds
+        self.scale_up_queued_per_worker = scale_up_queued_per_worker
+        self.scale_up_queued_age_seconds = scale_up_queued_age_seconds
+        self.scale_up_max_load_per_cpu = scale_up_max_load_per_cpu
+        self.scale_down_idle_seconds = scale_down_idle_seconds
+        # Fork workers from a preloaded zygote process rather than starting new interpreters
+        self.zygote = config.get().WORKER_ZYGOTE if (zygote is None) else zygote
+        self.zygote_process: asyncio.subprocess.Process | None = None
+        # Run RAT reports in a service of long lived JVMs, which this manager keeps running
+        self.rat_service = config.get().APACHE_RAT_SERVICE
+        self.rat_service_process: asyncio.subprocess.Process | None = None
         self.workers: dict[int, WorkerProcess] = {}
         self.running = False
         self.check_task: asyncio.Task | None = None
@@ -68,6 +86,12 @@ class WorkerManager:
         self.running = True
         log.info(f"Starting worker manager in {os.getcwd()}")
 
+        # Workers bind their wakeup sockets in this directory
+        await asyncio.to_thread(wakeup.prepare)
+
+        if self.rat_service:
+            await self.rat_service_start()
+
         # Start initial workers
         for _ in range(self.min_workers):
             await self.spawn_worker()
@@ -94,6 +118,10 @@ class WorkerManager:
         # Stop all workers
         await self.stop_all_workers()
 
+        # Stop the zygote after its workers
+        await self.zygote_stop()
+        await self.rat_service_stop()
+
     async def stop_all_workers(self) -> None:
         """Stop all worker processes."""
         for worker in list(self.workers.values()):
@@ -109,7 +137,7 @@ class WorkerManager:
         # Wait for processes to exit
         for worker in list(self.workers.values()):
             try:
-                await asyncio.wait_for(worker.process.wait(), timeout=5.0)
+                await asyncio.wait_for(worker.wait(), timeout=5.0)
             except TimeoutError:
                 if worker.pid:
                     try:
@@ -128,14 +156,13 @@ class WorkerManager:
             return
 
         try:
-            # Get the absolute path to the project root (i.e. atr/..)
-            abs_path = await asyncio.to_thread(os.path.abspath, __file__)
-            project_root = os.path.dirname(os.path.dirname(abs_path))
+            # Debug output capture needs a separate interpreter per worker
+            if self.zygote and (not global_worker_debug):
+                if await self.spawn_worker_from_zygote():
+                    return
+                log.warning("Could not fork worker from zygote, starting a new interpreter instead")
 
-            # Ensure PYTHONPATH includes our project root
-            env = os.environ.copy()
-            python_path = env.get("PYTHONPATH", "")
-            env["PYTHONPATH"] = f"{project_root}:{python_path}" if python_path else project_root
+            project_root, env = await self._worker_environment()
 
             # Get absolute path to worker script
             worker_script = os.path.join(project_root, "atr", "worker.py")
@@ -181,6 +208,155 @@ class WorkerManager:
         except Exception as e:
             log.error(f"Error spawning worker: {e}")
 
+    async def spawn_worker_from_zygote(self) -> bool:
+        """Fork a new worker process from the zygote, starting the zygote if necessary."""
+        if (self.zygote_process is None) or (self.zygote_process.returncode is not None):
+            if not await self.zygote_start():
+                return False
+
+        socket_path = config.get().WORKER_ZYGOTE_SOCKET
+        try:
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            try:
+                writer.write(b"spawn\n")
+                await writer.drain()
+                response = await asyncio.wait_for(reader.readline(), timeout=10.0)
+            finally:
+                writer.close()
+                await writer.wait_closed()
+            pid = int(response.strip())
+        except (OSError, TimeoutError, ValueError) as e:
+            log.error(f"Error forking worker from zygote: {e}")
+            return False
+
+        worker = WorkerProcess(None, datetime.datetime.now(datetime.UTC), forked_pid=pid)
+        self.workers[pid] = worker
+        log.info(f"Forked worker process {pid} from zygote")
+        return True
+
+    async def zygote_start(self) -> bool:
+        """Start the zygote process, and wait until it accepts fork requests."""
+        await self.zygote_stop()
+
+        project_root, env = await self._worker_environment()
+        zygote_script = os.path.join(project_root, "atr", "zygote.py")
+        socket_path = config.get().WORKER_ZYGOTE_SOCKET
+        await asyncio.to_thread(os.makedirs, os.path.dirname(socket_path), exist_ok=True)
+        try:
+            self.zygote_process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                zygote_script,
+                socket_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                env=env,
+                preexec_fn=os.setsid,
+            )
+        except Exception as e:
+            log.error(f"Error starting zygote: {e}")
+            return False
+
+        # The zygote imports everything that a worker needs before it listens
+        for _ in range(300):
+            if self.zygote_process.returncode is not None:
+                break
+            try:
+                _reader, writer = await asyncio.open_unix_connection(socket_path)
+            except OSError:
+                await asyncio.sleep(0.1)
+                continue
+            writer.close()
+            await writer.wait_closed()
+            log.info(f"Started zygote process {self.zygote_process.pid}")
+            return True
+
+        log.error("Zygote process did not start listening")
+        await self.zygote_stop()
+        return False
+
+    async def zygote_stop(self) -> None:
+        """Stop the zygote process, if it is running."""
+        zygote_process = self.zygote_process
+        self.zygote_process = None
+        if (zygote_process is None) or (zygote_process.returncode is not None):
+            return
+        try:
+            zygote_process.terminate()
+            await asyncio.wait_for(zygote_process.wait(), timeout=5.0)
+        except ProcessLookupError:
+            ...
+        except TimeoutError:
+            zygote_process.kill()
+
+    async def rat_service_check(self) -> None:
+        """Restart the RAT service if it has exited or does not respond."""
+        if (self.rat_service_process is None) or (self.rat_service_process.returncode is not None):
+            log.warning("Apache RAT service is not running, starting it")
+            await self.rat_service_start()
+            return
+        try:
+            problem = await asyncio.to_thread(ratservice.health)
+        except (OSError, ValueError) as e:
+            log.warning(f"Apache RAT service did not respond, restarting it: {e}")
+            await self.rat_service_start()
+            return
+        # The service restarts its own JVMs when they fail
+        if problem is not None:
+            log.warning(f"Apache RAT service health check: {problem}")
+
+    async def rat_service_start(self) -> bool:
+        """Start the RAT service, and wait until it accepts requests."""
+        await self.rat_service_stop()
+
+        project_root, env = await self._worker_environment()
+        service_script = os.path.join(project_root, "atr", "ratservice.py")
+        socket_path = config.get().APACHE_RAT_SERVICE_SOCKET
+        await asyncio.to_thread(os.makedirs, os.path.dirname(socket_path), exist_ok=True)
+        try:
+            # Unlike workers, the service has no resource limits of its own, as its JVMs have a maximum heap size
+            self.rat_service_process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                service_script,
+                socket_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                env=env,
+                preexec_fn=os.setsid,
+            )
+        except Exception as e:
+            log.error(f"Error starting Apache RAT service: {e}")
+            return False
+
+        # The service compiles its Java class before it listens
+        for _ in range(600):
+            if self.rat_service_process.returncode is not None:
+                break
+            try:
+                await asyncio.to_thread(ratservice.health)
+            except (OSError, ValueError):
+                await asyncio.sleep(0.1)
+                continue
+            log.info(f"Started Apache RAT service process {self.rat_service_process.pid}")
+            return True
+
+        log.error("Apache RAT service did not start listening")
+        await self.rat_service_stop()
+        return False
+
+    async def rat_service_stop(self) -> None:
+        """Stop the RAT service, if it is running."""
+        rat_service_process = self.rat_service_process
+        self.rat_service_process = None
+        if (rat_service_process is None) or (rat_service_process.returncode is not None):
+            return
+        try:
+            rat_service_process.terminate()
+            await asyncio.wait_for(rat_service_process.wait(), timeout=5.0)
+        except ProcessLookupError:
+            ...
+        except TimeoutError:
+            rat_service_process.kill()
+
     async def monitor_workers(self) -> None:
         """Monitor worker processes and restart them if needed."""
         while self.running:
@@ -196,6 +372,9 @@ class WorkerManager:
 
     async def check_workers(self) -> None:
         """Check worker processes and restart if needed."""
+        if self.rat_service:
+            await self.rat_service_check()
+
         exited_workers = []
 
         async with db.session() as data:
@@ -215,21 +394,10 @@ class WorkerManager:
         # Remove exited workers
         for pid in exited_workers:
             self.workers.pop(pid, None)
+            wakeup.remove(pid)
 
-        # Check for active tasks
-        # try:
-        #     async with get_session() as session:
-        #         result = await session.execute(
-        #             text("""
-        #                 SELECT COUNT(*)
-        #                 FROM task
-        #                 WHERE status = 'QUEUED'
-        #             """)
-        #         )
-        #         queued_count = result.scalar()
-        #         log.info(f"Found {queued_count} queued tasks waiting for workers")
-        # except Exception as e:
-        #     log.error(f"Error checking queued tasks: {e}")
+        # Scale the pool to the task backlog
+        await self.autoscale_workers()
 
         # Spawn new workers if needed
         await self.maintain_worker_pool()
@@ -237,6 +405,33 @@ class WorkerManager:
         # Reset any tasks that were being processed by now inactive workers
         await self.reset_broken_tasks()
 
+        # Requeue any tasks whose workers have stopped sending heartbeats
+        await self.requeue_expired_leases()
+
+    async def autoscale_workers(self) -> None:
+        """Spawn workers when the task backlog grows, and retire workers which have been idle."""
+        now = datetime.datetime.now(datetime.UTC)
+        try:
+            async with db.session() as data:
+                queued_count, oldest_queued = await self._queued_task_statistics(data, now)
+                busy_pids = await self._busy_worker_pids(data)
+        except Exception as e:
+            log.error(f"Error checking the task backlog: {e}")
+            return
+
+        for pid, worker in self.workers.items():
+            if pid in busy_pids:
+                worker.last_busy = now
+
+        oldest_queued_seconds = (now - oldest_queued).total_seconds() if oldest_queued else 0.0
+        backlog = (queued_count > (len(self.workers) * self.scale_up_queued_per_worker)) or (
+            oldest_queued_seconds > self.scale_up_queued_age_seconds
+        )
+        if backlog:
+            await self._scale_up(queued_count, oldest_queued_seconds)
+        elif queued_count == 0:
+            await self._scale_down(now)
+
     async def terminate_long_running_task(self, task: sql.Task, worker: WorkerProcess, task_id: int, pid: int) -> None:
         """
         Terminate a task that has been running for too long.
@@ -263,14 +458,16 @@ class WorkerManager:
         """
         try:
             async with data.begin():
-                task = await data.task(pid=pid, status=sql.TaskStatus.ACTIVE).get()
-                if (not task) or (not task.started):
-                    return False
+                # A worker may be running several tasks concurrently
+                active_tasks = await data.task(pid=pid, status=sql.TaskStatus.ACTIVE).all()
+                for task in active_tasks:
+                    if not task.started:
+                        continue
 
-                task_duration = (datetime.datetime.now(datetime.UTC) - task.started).total_seconds()
-                if task_duration > self.max_task_seconds:
-                    await self.terminate_long_running_task(task, worker, task.id, pid)
-                    return True
+                    task_duration = (datetime.datetime.now(datetime.UTC) - task.started).total_seconds()
+                    if task_duration > self.max_task_seconds:
+                        await self.terminate_long_running_task(task, worker, task.id, pid)
+                        return True
 
                 return False
         except Exception as e:
@@ -287,6 +484,29 @@ class WorkerManager:
                 await self.spawn_worker()
             log.info(f"Worker pool restored to {len(self.workers)} workers")
 
+    async def _busy_worker_pids(self, data: db.Session) -> set[int]:
+        """Return the PIDs of processes which currently hold active tasks."""
+        busy_stmt = (
+            sqlmodel.select(sql.Task.pid)
+            .where(
+                sqlmodel.and_(
+                    sql.Task.status == sql.TaskStatus.ACTIVE,
+                    sql.validate_instrumented_attribute(sql.Task.pid).isnot(None),
+                )
+            )
+            .distinct()
+        )
+        busy_result = await data.execute(busy_stmt)
+        return {pid for pid in busy_result.scalars() if pid is not None}
+
+    def _host_overloaded(self) -> bool:
+        """Check whether the host load average is too high to add more workers."""
+        try:
+            load_average = os.getloadavg()[0]
+        except OSError:
+            return False
+        return load_average > ((os.cpu_count() or 1) * self.scale_up_max_load_per_cpu)
+
     async def _log_tasks_held_by_unmanaged_pids(self, data: db.Session, active_worker_pids: list[int]) -> None:
         """Log tasks that are active and held by PIDs not managed by this worker manager."""
         foreign_tasks_stmt = sqlmodel.select(sql.Task.pid, sql.Task.id).where(
@@ -314,6 +534,87 @@ class WorkerManager:
             except Exception as e:
                 log.error(f"Unexpected error: {foreign_pid} holding task {task_id_held}: {e}")
 
+    async def _queued_task_statistics(
+        self, data: db.Session, now: datetime.datetime
+    ) -> tuple[int, datetime.datetime | None]:
+        """Return the number of claimable queued tasks and when the oldest of them was added."""
+        via = sql.validate_instrumented_attribute
+        statistics_stmt = sqlmodel.select(
+            sqlmodel.func.count(via(sql.Task.id)), sqlmodel.func.min(via(sql.Task.added))
+        ).where(
+            sqlmodel.and_(
+                sql.Task.status == sql.TaskStatus.QUEUED,
+                sqlmodel.or_(via(sql.Task.scheduled).is_(None), via(sql.Task.scheduled) <= now),
+                # Workers cannot claim tasks which are waiting on a prerequisite, so they are not backlog
+                sql.task_prerequisite_completed(),
+            )
+        )
+        statistics_result = await data.execute(statistics_stmt)
+        queued_count, oldest_queued = statistics_result.one()
+        return queued_count, oldest_queued
+
+    async def _scale_up(self, queued_count: int, oldest_queued_seconds: float) -> None:
+        """Spawn workers for a task backlog, up to the maximum pool size."""
+        if len(self.workers) >= self.max_workers:
+            return
+        if self._host_overloaded():
+            log.info(f"Not adding workers for {util.plural(queued_count, 'queued task')} as the host is overloaded")
+            return
+
+        wanted = -(-queued_count // self.scale_up_queued_per_worker)
+        to_spawn = min(self.max_workers - len(self.workers), max(1, wanted - len(self.workers)))
+        log.info(
+            f"Adding {util.plural(to_spawn, 'worker')} for {util.plural(queued_count, 'queued task')},"
+            f" the oldest queued {oldest_queued_seconds:.1f}s ago"
+        )
+        for _ in range(to_spawn):
+            await self.spawn_worker()
+
+    async def _scale_down(self, now: datetime.datetime) -> None:
+        """Retire one idle worker, if the pool is above its minimum size."""
+        if len(self.workers) <= self.min_workers:
+            return
+
+        idle_workers = [
+            (pid, worker)
+            for pid, worker in self.workers.items()
+            if (now - worker.last_busy).total_seconds() > self.scale_down_idle_seconds
+        ]
+        # Retire the longest idle worker which holds no task
+        # Whether it is busy was last sampled on an earlier check, so it may have claimed a task since then
+        for pid, worker in sorted(idle_workers, key=lambda item: item[1].last_busy):
+            async with db.session() as data:
+                held_task = await data.task(pid=pid, status=sql.TaskStatus.ACTIVE).get()
+            if held_task is not None:
+                worker.last_busy = now
+                continue
+            self._worker_retire(pid)
+            return
+
+    async def _worker_environment(self) -> tuple[str, dict[str, str]]:
+        """Return the project root and the environment in which to start worker processes."""
+        # Get the absolute path to the project root (i.e. atr/..)
+        abs_path = await asyncio.to_thread(os.path.abspath, __file__)
+        project_root = os.path.dirname(os.path.dirname(abs_path))
+
+        # Ensure PYTHONPATH includes our project root
+        env = os.environ.copy()
+        python_path = env.get("PYTHONPATH", "")
+        env["PYTHONPATH"] = f"{project_root}:{python_path}" if python_path else project_root
+        return project_root, env
+
+    def _worker_retire(self, pid: int) -> None:
+        """Stop an idle worker and forget it."""
+        self.workers.pop(pid, None)
+        try:
+            os.kill(pid, signal.SIGTERM)
+            log.info(f"Retired worker {pid} after being idle for over {self.scale_down_idle_seconds}s")
+        except ProcessLookupError:
+            ...
+        except Exception as e:
+            log.error(f"Error retiring worker {pid}: {e}")
+        wakeup.remove(pid)
+
     async def reset_broken_tasks(self) -> None:
         """Reset any tasks that were being processed by exited or unmanaged workers."""
         try:
@@ -333,35 +634,78 @@ class WorkerManager:
                                 sql.Task.status == sql.TaskStatus.ACTIVE,
                             )
                         )
-                        .values(status=sql.TaskStatus.QUEUED, started=None, pid=None)
+                        .values(status=sql.TaskStatus.QUEUED, started=None, pid=None, lease_expires=None)
                     )
 
                     result = await data.execute(update_stmt)
                     if not isinstance(result, engine.CursorResult):
                         log.error(f"Expected cursor result, got {type(result)}")
                         return
-                    if result.rowcount > 0:
-                        log.info(f"Reset {util.plural(result.rowcount, 'task')} to state 'QUEUED' due to worker issues")
+                    reset_count = result.rowcount
+                    if reset_count > 0:
+                        log.info(f"Reset {util.plural(reset_count, 'task')} to state 'QUEUED' due to worker issues")
 
+            if reset_count > 0:
+                wakeup.notify()
         except Exception as e:
             log.error(f"Error resetting broken tasks: {e}")
 
+    async def requeue_expired_leases(self) -> None:
+        """Requeue active tasks whose leases have not been renewed by a worker heartbeat."""
+        try:
+            async with db.session() as data:
+                async with data.begin():
+                    update_stmt = (
+                        sqlmodel.update(sql.Task)
+                        .where(
+                            sqlmodel.and_(
+                                sql.Task.status == sql.TaskStatus.ACTIVE,
+                                sql.validate_instrumented_attribute(sql.Task.lease_expires)
+                                < datetime.datetime.now(datetime.UTC),
+                            )
+                        )
+                        .values(status=sql.TaskStatus.QUEUED, started=None, pid=None, lease_expires=None)
+                    )
+
+                    result = await data.execute(update_stmt)
+                    if not isinstance(result, engine.CursorResult):
+                        log.error(f"Expected cursor result, got {type(result)}")
+                        return
+                    requeued_count = result.rowcount
+                    if requeued_count > 0:
+                        log.warning(f"Requeued {util.plural(requeued_count, 'task')} with expired leases")
+
+            if requeued_count > 0:
+                wakeup.notify()
+        except Exception as e:
+            log.error(f"Error requeueing tasks with expired leases: {e}")
+
 
 class WorkerProcess:
     """Interface to control a worker process."""
 
-    def __init__(self, process: asyncio.subprocess.Process, started: datetime.datetime):
+    def __init__(
+        self,
+        process: asyncio.subprocess.Process | None,
+        started: datetime.datetime,
+        forked_pid: int | None = None,
+    ):
+        # Workers forked by the zygote are not our children, so we only know their PID
         self.process = process
+        self.forked_pid = forked_pid
         self.started = started
         self.last_checked = started
+        self.last_busy = started
 
     @property
     def pid(self) -> int | None:
+        if self.process is None:
+            return self.forked_pid
         return self.process.pid
 
     async def is_running(self) -> bool:
         """Check if the process is still running."""
-        if self.process.returncode is not None:
+        if (self.process is not None) and (self.process.returncode is not None):
             # Process has already exited
             return False
 
@@ -382,6 +726,18 @@ class WorkerProcess:
             log.warning(f"Permission error checking process {self.pid}")
             return False
 
+    async def wait(self) -> None:
+        """Wait for the process to exit."""
+        if self.process is not None:
+            await self.process.wait()
+            return
+
+        # The zygote reaps forked workers, so we can only poll for their exit
+        while True:
+            if not await self.is_running():
+                return
+            await asyncio.sleep(0.1)
+
 
 def get_worker_manager() -> WorkerManager:
     """Get the global worker manager instance."""
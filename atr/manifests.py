@@ -0,0 +1,263 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Record the members of each archive once, so that listing them does not need the archive to be decompressed."""
+
+import array
+import contextlib
+import dataclasses
+import enum
+import os
+import pathlib
+import struct
+import sys
+import tempfile
+from collections.abc import Sequence
+from typing import BinaryIO, Final, Self
+
+import atr.archives as archives
+import atr.attestable as attestable
+import atr.log as log
+import atr.tarzip as tarzip
+import atr.util as util
+
+# The typecodes of the arrays which follow the header
+# These hold the kinds, modes, sizes, header offsets, name lengths, and link target lengths of the members
+_ARRAY_TYPECODES: Final = ("B", "I", "q", "q", "I", "I")
+_HEADER: Final = struct.Struct("<4sHI")
+_MAGIC: Final = b"ATRM"
+_SUFFIX: Final = ".manifest"
+# Increment this when the format changes, and older manifests will be rebuilt
+_VERSION: Final[int] = 1
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Entry:
+    """The metadata of an archive member as recorded in a manifest."""
+
+    name: str
+    kind: "Kind"
+    size: int
+    mode: int
+    linkname: str | None
+    header_offset: int
+
+    @classmethod
+    def from_member(cls, member: tarzip.MemberInfo) -> Self:
+        if member.isdir():
+            kind = Kind.DIRECTORY
+        elif member.issym():
+            kind = Kind.SYMLINK
+        elif member.islnk():
+            kind = Kind.HARDLINK
+        elif member.isfile():
+            kind = Kind.FILE
+        else:
+            kind = Kind.OTHER
+        return cls(
+            name=member.name,
+            kind=kind,
+            size=member.size,
+            mode=member.mode,
+            linkname=member.linkname or None,
+            header_offset=member.header_offset,
+        )
+
+    def isdev(self) -> bool:
+        return self.kind == Kind.OTHER
+
+    def isdir(self) -> bool:
+        return self.kind == Kind.DIRECTORY
+
+    def isfile(self) -> bool:
+        return self.kind == Kind.FILE
+
+    def islnk(self) -> bool:
+        return self.kind == Kind.HARDLINK
+
+    def issym(self) -> bool:
+        return self.kind == Kind.SYMLINK
+
+
+class Kind(enum.IntEnum):
+    FILE = 0
+    DIRECTORY = 1
+    SYMLINK = 2
+    HARDLINK = 3
+    OTHER = 4
+
+
+class ManifestVisitor:
+    """Record the members of an archive while it is scanned, and store them as the manifest of its content."""
+
+    metadata_only = True
+    read_all = False
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.entries: list[Entry] = []
+        self.error: Exception | None = None
+
+    def content_limit(self, member: tarzip.MemberInfo) -> int:
+        return 0
+
+    def finish(self, error: Exception | None) -> None:
+        self.error = error
+        # An archive which could not be read completely has no manifest, so that it is read again when asked about
+        if error is None:
+            _save(self.key, self.entries)
+
+    def merge(self, shard: Self) -> None:
+        self.entries.extend(shard.entries)
+
+    def visit(self, member: tarzip.MemberInfo, content: bytes | None) -> None:
+        self.entries.append(Entry.from_member(member))
+
+
+def entries(archive_path: str) -> list[Entry]:
+    """Return the members of an archive from its manifest, scanning the archive to build the manifest if needed."""
+    key = attestable.file_blake3(archive_path)
+    if (manifest := _load(key)) is not None:
+        return manifest
+    visitor = ManifestVisitor(key)
+    archives.scan(archive_path, [visitor])
+    if visitor.error is not None:
+        raise visitor.error
+    return visitor.entries
+
+
+def listing(archive_path: str) -> list[str]:
+    """Return the sorted names of the members of an archive."""
+    return sorted(entry.name for entry in entries(archive_path))
+
+
+def scan(archive_path: str, visitors: Sequence[archives.ScanVisitor], chunk_size: int = 4096) -> None:
+    """Scan an archive like archives.scan, but visit its manifest instead when no visitor needs member content.
+
+    The manifest is built during the scan if it does not yet exist.
+    """
+    key = attestable.file_blake3(archive_path)
+    if all(visitor.metadata_only for visitor in visitors) and ((manifest := _load(key)) is not None):
+        _visit(manifest, visitors)
+        return
+    if not _path(key).is_file():
+        visitors = [*visitors, ManifestVisitor(key)]
+    archives.scan(archive_path, visitors, chunk_size)
+
+
+def _load(key: str) -> list[Entry] | None:
+    try:
+        with open(_path(key), "rb") as f:
+            return _read(f)
+    except FileNotFoundError:
+        return None
+    except (EOFError, UnicodeDecodeError, ValueError, struct.error) as e:
+        log.warning(f"Ignoring unreadable archive manifest {key}: {e}")
+        return None
+
+
+def _path(key: str) -> pathlib.Path:
+    return util.get_manifests_dir() / (key + _SUFFIX)
+
+
+def _read(f: BinaryIO) -> list[Entry]:
+    magic, version, count = _HEADER.unpack(f.read(_HEADER.size))
+    if (magic != _MAGIC) or (version != _VERSION):
+        raise ValueError(f"Unsupported manifest format {magic!r} version {version}")
+
+    columns: list[array.array] = []
+    for typecode in _ARRAY_TYPECODES:
+        column = array.array(typecode)
+        column.fromfile(f, count)
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns.append(column)
+    kinds, modes, sizes, offsets, name_lengths, link_lengths = columns
+
+    strings = f.read()
+    if len(strings) != (sum(name_lengths) + sum(link_lengths)):
+        raise ValueError("Manifest names do not match their lengths")
+
+    result: list[Entry] = []
+    name_start = 0
+    link_start = sum(name_lengths)
+    for i in range(count):
+        name_end = name_start + name_lengths[i]
+        link_end = link_start + link_lengths[i]
+        result.append(
+            Entry(
+                name=strings[name_start:name_end].decode("utf-8", "surrogateescape"),
+                kind=Kind(kinds[i]),
+                size=sizes[i],
+                mode=modes[i],
+                linkname=strings[link_start:link_end].decode("utf-8", "surrogateescape") or None,
+                header_offset=offsets[i],
+            )
+        )
+        name_start, link_start = name_end, link_end
+    return result
+
+
+def _save(key: str, manifest: list[Entry]) -> None:
+    names = [entry.name.encode("utf-8", "surrogateescape") for entry in manifest]
+    links = [(entry.linkname or "").encode("utf-8", "surrogateescape") for entry in manifest]
+    columns = [
+        array.array("B", [entry.kind for entry in manifest]),
+        array.array("I", [entry.mode for entry in manifest]),
+        array.array("q", [entry.size for entry in manifest]),
+        array.array("q", [entry.header_offset for entry in manifest]),
+        array.array("I", [len(name) for name in names]),
+        array.array("I", [len(link) for link in links]),
+    ]
+
+    manifests_dir = util.get_manifests_dir()
+    manifests_dir.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file and rename it, so that concurrent readers never see a partial manifest
+    fd, temp_path = tempfile.mkstemp(dir=manifests_dir, prefix=".", suffix=_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, len(manifest)))
+            for column in columns:
+                if sys.byteorder == "big":
+                    column.byteswap()
+                column.tofile(f)
+            f.write(b"".join(names))
+            f.write(b"".join(links))
+        os.replace(temp_path, _path(key))
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_path)
+        raise
+    log.info(f"Stored the manifest of {len(manifest)} archive members as {key}")
+
+
+def _visit(manifest: list[Entry], visitors: Sequence[archives.ScanVisitor]) -> None:
+    active = list(visitors)
+    for entry in manifest:
+        # A visitor which fails is finished with its error, and the other visitors continue
+        remaining: list[archives.ScanVisitor] = []
+        for visitor in active:
+            try:
+                visitor.content_limit(entry)
+                visitor.visit(entry, None)
+            except Exception as e:
+                visitor.finish(e)
+                continue
+            remaining.append(visitor)
+        active = remaining
+
+    for visitor in active:
+        visitor.finish(None)
@@ -180,6 +180,17 @@ class ReleasePhase(str, enum.Enum):
     RELEASE = "release"
 
 
+class TaskPriority(enum.IntEnum):
+    """Priority class of a task in the task queue, claimed in ascending order."""
+
+    # Checks and actions which a user is waiting on
+    INTERACTIVE = 0
+    # Recurring refreshes such as metadata and workflow status updates
+    BACKGROUND = 1
+    # Large batches of checks, such as for a revision with very many files
+    BULK = 2
+
+
 class TaskStatus(str, enum.Enum):
     """Status of a task in the task queue."""
 
@@ -187,9 +198,13 @@ class TaskStatus(str, enum.Enum):
     ACTIVE = "active"
     COMPLETED = "completed"
     FAILED = "failed"
+    SUPERSEDED = "superseded"
 
 
 class TaskType(str, enum.Enum):
+    # LICENSE_FILES, LICENSE_HEADERS, TARGZ_*, and ZIPFORMAT_* are no longer queued, as ARCHIVE_SCAN runs those checks
+    # They are kept so that tasks which were queued before, and the rows of past tasks, can still be loaded
+    ARCHIVE_SCAN = "archive_scan"
     DISTRIBUTION_STATUS = "distribution_status"
     DISTRIBUTION_WORKFLOW = "distribution_workflow"
     HASHING_CHECK = "hashing_check"
@@ -206,6 +221,7 @@ class TaskType(str, enum.Enum):
     SBOM_QS_SCORE = "sbom_qs_score"
     SBOM_TOOL_SCORE = "sbom_tool_score"
     SIGNATURE_CHECK = "signature_check"
+    SIGNATURE_CHECK_BATCH = "signature_check_batch"
     SVN_IMPORT_FILES = "svn_import_files"
     TARGZ_INTEGRITY = "targz_integrity"
     TARGZ_STRUCTURE = "targz_structure"
@@ -356,6 +372,10 @@ class Task(sqlmodel.SQLModel, table=True):
     task_type: TaskType
     task_args: Any = sqlmodel.Field(sa_column=sqlalchemy.Column(sqlalchemy.JSON))
     asf_uid: str
+    priority: TaskPriority = sqlmodel.Field(
+        default=TaskPriority.INTERACTIVE,
+        sa_column=sqlalchemy.Column(sqlalchemy.Integer, nullable=False, server_default="0"),
+    )
     added: datetime.datetime = sqlmodel.Field(
         default_factory=lambda: datetime.datetime.now(datetime.UTC),
         sa_column=sqlalchemy.Column(UTCDateTime, index=True),
@@ -369,6 +389,11 @@ class Task(sqlmodel.SQLModel, table=True):
         sa_column=sqlalchemy.Column(UTCDateTime),
     )
     pid: int | None = None
+    # Renewed by worker heartbeats while the task is active
+    lease_expires: datetime.datetime | None = sqlmodel.Field(
+        default=None,
+        sa_column=sqlalchemy.Column(UTCDateTime, index=True),
+    )
     completed: datetime.datetime | None = sqlmodel.Field(
         default=None,
         sa_column=sqlalchemy.Column(UTCDateTime),
@@ -376,8 +401,29 @@ class Task(sqlmodel.SQLModel, table=True):
     result: results.Results | None = sqlmodel.Field(default=None, sa_column=sqlalchemy.Column(ResultsJSON))
     error: str | None = None
 
+    # How long the task waited to be claimed, and whether other tasks ran in the same worker at the same time
+    usage_overlapped: bool | None = None
+    queue_wait_seconds: float | None = None
+    # Resources used by the worker process while it ran the task
+    # These are measured per worker, so they are only recorded when usage_overlapped is false
+    cpu_user_seconds: float | None = None
+    cpu_system_seconds: float | None = None
+    # CPU time of subprocesses, such as the RAT JVM, syft, and sbomqs, and of the archive process pool
+    child_cpu_seconds: float | None = None
+    peak_rss_bytes: int | None = None
+    read_bytes: int | None = None
+    written_bytes: int | None = None
+
     workflow: "WorkflowStatus" = sqlmodel.Relationship(back_populates="task")
 
+    # A task which must complete before this task can be claimed
+    depends_on: int | None = sqlmodel.Field(default=None, foreign_key="task.id", index=True)
+    prerequisite: Optional["Task"] = sqlmodel.Relationship(
+        sa_relationship_kwargs={"remote_side": "Task.id", "foreign_keys": "Task.depends_on"}
+    )
+    # The identity of a check and its inputs, shared by checks which would record identical results
+    dedup_key: str | None = sqlmodel.Field(default=None, index=True)
+
     # Used for check tasks
     # We don't put these in task_args because we want to query them efficiently
     project_name: str | None = sqlmodel.Field(default=None, foreign_key="project.name")
@@ -401,13 +447,15 @@ class Task(sqlmodel.SQLModel, table=True):
         if isinstance(self.completed, str):
             self.completed = datetime.datetime.fromisoformat(self.completed.rstrip("Z"))
 
-    # Create an index on status and added for efficient task claiming
+    # Create indexes on status, priority, project, and added for efficient task claiming
     __table_args__ = (
         sqlalchemy.Index("ix_task_status_added", "status", "added"),
+        sqlalchemy.Index("ix_task_status_priority_project_name_added", "status", "priority", "project_name", "added"),
         # Ensure valid status transitions:
         # - QUEUED can transition to ACTIVE
         # - ACTIVE can transition to COMPLETED or FAILED
-        # - COMPLETED and FAILED are terminal states
+        # - QUEUED or ACTIVE can transition to SUPERSEDED when a newer revision is checked
+        # - COMPLETED, FAILED, and SUPERSEDED are terminal states
         sqlalchemy.CheckConstraint(
             """
             (
@@ -419,6 +467,8 @@ class Task(sqlmodel.SQLModel, table=True):
                 OR (status = 'COMPLETED' AND completed IS NOT NULL AND result IS NOT NULL)
                 -- ACTIVE -> FAILED requires setting completed time and error (result optional)
                 OR (status = 'FAILED' AND completed IS NOT NULL AND error IS NOT NULL)
+                -- QUEUED or ACTIVE -> SUPERSEDED requires setting completed time and error
+                OR (status = 'SUPERSEDED' AND completed IS NOT NULL AND error IS NOT NULL)
             )
             """,
             name="valid_task_status_transitions",
@@ -1281,6 +1331,20 @@ def release_name(project_name: str, version_name: str) -> str:
     return f"{project_name}-{version_name}"
 
 
+def task_prerequisite_completed() -> expression.ColumnElement[bool]:
+    """Return a condition which holds for tasks without a prerequisite or whose prerequisite has completed."""
+    prerequisite = orm.aliased(Task)
+    return sqlmodel.or_(
+        validate_instrumented_attribute(Task.depends_on).is_(None),
+        sqlalchemy.exists().where(
+            sqlmodel.and_(
+                prerequisite.id == Task.depends_on,
+                prerequisite.status == TaskStatus.COMPLETED,
+            )
+        ),
+    )
+
+
 def validate_instrumented_attribute(obj: Any) -> orm.InstrumentedAttribute:
     """Check if the given object is an InstrumentedAttribute."""
     if not isinstance(obj, orm.InstrumentedAttribute):
@@ -23,7 +23,7 @@ import asfquart.base as base
 import quart
 
 import atr.blueprints.post as post
-import atr.db.interaction as interaction
+import atr.db as db
 import atr.form as form
 import atr.get as get
 import atr.log as log
@@ -149,7 +149,7 @@ async def hashgen(session: web.Committer, project_name: str, version_name: str,
 @post.committer("/draft/sbomgen/<project_name>/<version_name>/<path:file_path>")
 @post.empty()
 async def sbomgen(session: web.Committer, project_name: str, version_name: str, file_path: str) -> web.WerkzeugResponse:
-    """Generate a CycloneDX SBOM file for a candidate draft file, creating a new revision."""
+    """Queue the generation of a CycloneDX SBOM file for a candidate draft file, which creates a new revision."""
     await session.check_access(project_name)
 
     rel_path = form.to_relpath(file_path)
@@ -169,37 +169,29 @@ async def sbomgen(session: web.Committer, project_name: str, version_name: str,
         )
 
     try:
-        description = "SBOM generation through web interface"
+        async with db.session() as data:
+            release = await data.release(project_name=project_name, version=version_name).demand(
+                web.FlashError("Release does not exist for SBOM generation")
+            )
+            revision_number = release.latest_revision_number
+            if revision_number is None:
+                raise web.FlashError("Internal error: Revision not found")
+        revision_dir = util.get_unfinished_dir() / project_name / version_name / revision_number
+
+        # Check that the source file exists in the latest revision
+        if not await aiofiles.os.path.exists(revision_dir / rel_path):
+            log.error(f"Source file {rel_path} not found in revision {revision_number} for SBOM generation.")
+            raise web.FlashError("Source artifact file not found in the latest revision.")
+
+        # Check that the SBOM file does not already exist in the latest revision
+        sbom_path_rel = rel_path.with_suffix(rel_path.suffix + ".cdx.json").name
+        if await aiofiles.os.path.exists(revision_dir / rel_path.parent / sbom_path_rel):
+            raise base.ASFQuartException("SBOM file already exists", errorcode=400)
+
+        # The task adds the SBOM in a new revision, so there is no need to wait for it here
         async with storage.write(session) as write:
             wacp = await write.as_project_committee_participant(project_name)
-            async with wacp.revision.create_and_manage(
-                project_name, version_name, session.uid, description=description
-            ) as creating:
-                # Uses new_revision_number in a functional way
-                path_in_new_revision = creating.interim_path / rel_path
-                sbom_path_rel = rel_path.with_suffix(rel_path.suffix + ".cdx.json").name
-                sbom_path_in_new_revision = creating.interim_path / rel_path.parent / sbom_path_rel
-
-                # Check that the source file exists in the new revision
-                if not await aiofiles.os.path.exists(path_in_new_revision):
-                    log.error(f"Source file {rel_path} not found in new revision for SBOM generation.")
-                    raise web.FlashError("Source artifact file not found in the new revision.")
-
-                # Check that the SBOM file does not already exist in the new revision
-                if await aiofiles.os.path.exists(sbom_path_in_new_revision):
-                    raise base.ASFQuartException("SBOM file already exists", errorcode=400)
-
-                # This shouldn't happen as we need a revision to kick the task off from
-                if creating.old is None:
-                    raise web.FlashError("Internal error: Revision not found")
-
-                # Create and queue the task, using paths within the new revision
-                sbom_task = await wacp.sbom.generate_cyclonedx(
-                    project_name, version_name, creating.old.number, path_in_new_revision, sbom_path_in_new_revision
-                )
-                success = await interaction.wait_for_task(sbom_task)
-                if not success:
-                    raise web.FlashError("Internal error: SBOM generation timed out")
+            sbom_task = await wacp.sbom.generate_cyclonedx(project_name, version_name, revision_number, rel_path)
 
     except Exception as e:
         log.exception("Error generating SBOM:")
@@ -208,7 +200,7 @@ async def sbomgen(session: web.Committer, project_name: str, version_name: str,
 
     return await session.redirect(
         get.compose.selected,
-        success=f"SBOM generated for {rel_path.name}",
+        success=f"SBOM generation queued for {rel_path.name} (task ID: {util.unwrap(sbom_task.id)})",
         project_name=project_name,
         version_name=version_name,
     )
@@ -0,0 +1,284 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""ratservice.py - Long lived Apache RAT processes which run reports for task workers
+
+The service is started by the worker manager, and listens on a Unix socket. It keeps a pool of JVMs, each running
+RatService.java, so that a report does not pay for starting a JVM and warming it up. Each request is a line of JSON,
+and so is each response. A JVM which fails or does not finish a report in time is stopped, and started again for the
+next request.
+"""
+
+import contextlib
+import json
+import os
+import pathlib
+import queue
+import select
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Final, cast
+
+import atr.config as config
+import atr.log as log
+
+_INT: Final = struct.Struct(">i")
+_JAVA_CLASS: Final = "RatService"
+_JAVA_SOURCE: Final = pathlib.Path(__file__).with_name(f"{_JAVA_CLASS}.java")
+_HEALTH_TIMEOUT_SECONDS: Final = 10.0
+
+
+class Jvm:
+    """A Java process which runs Apache RAT reports, one at a time."""
+
+    def __init__(self, command: list[str]) -> None:
+        self.command = command
+        self.process: subprocess.Popen[bytes] | None = None
+
+    def alive(self) -> bool:
+        return (self.process is not None) and (self.process.poll() is None)
+
+    def request(self, arguments: list[str], timeout: float) -> None:
+        """Run Apache RAT with the given arguments, or check the health of the JVM if there are none."""
+        if not self.alive():
+            self.start()
+        try:
+            self._send(arguments)
+        except OSError:
+            # The JVM exited while it was idle, so the request is sent to a new one
+            self.start()
+            self._send(arguments)
+
+        try:
+            status, message = self._receive(time.monotonic() + timeout)
+        except (EOFError, OSError, TimeoutError):
+            # The JVM is in an unknown state, so the next request starts a new one
+            self.stop()
+            raise
+        if status != 0:
+            raise ReportError(message)
+
+    def start(self) -> None:
+        self.stop()
+        # The JVM writes its log to standard error, which is inherited from the service
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        log.info(f"Started Apache RAT JVM {self.process.pid}")
+
+    def stop(self) -> None:
+        process = self.process
+        self.process = None
+        if process is None:
+            return
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        for stream in (process.stdin, process.stdout):
+            if stream is not None:
+                stream.close()
+
+    def _receive(self, deadline: float) -> tuple[int, str]:
+        if (self.process is None) or (self.process.stdout is None):
+            raise EOFError("The Apache RAT JVM is not running")
+        fd = self.process.stdout.fileno()
+        (status,) = _INT.unpack(_read_exactly(fd, _INT.size, deadline))
+        (length,) = _INT.unpack(_read_exactly(fd, _INT.size, deadline))
+        return status, _read_exactly(fd, length, deadline).decode("utf-8", "replace")
+
+    def _send(self, arguments: list[str]) -> None:
+        if (self.process is None) or (self.process.stdin is None):
+            raise BrokenPipeError("The Apache RAT JVM is not running")
+        parts = [_INT.pack(len(arguments))]
+        for argument in arguments:
+            encoded = argument.encode("utf-8", "surrogateescape")
+            parts.append(_INT.pack(len(encoded)))
+            parts.append(encoded)
+        self.process.stdin.write(b"".join(parts))
+        self.process.stdin.flush()
+
+
+class ReportError(RuntimeError):
+    """Apache RAT failed to produce a report."""
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Answer one request from a task worker."""
+
+    def handle(self) -> None:
+        service = cast("Server", self.server).service
+        try:
+            request = json.loads(self.rfile.readline())
+            response = service.handle(request)
+        except (ValueError, KeyError, TypeError) as e:
+            response = {"status": "failure", "message": f"Invalid request: {e}"}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    """Listen for requests from task workers, answering each in its own thread."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: "Service") -> None:
+        self.service = service
+        super().__init__(socket_path, RequestHandler)
+
+
+class Service:
+    """A pool of JVMs which run Apache RAT reports."""
+
+    def __init__(self, command: list[str], processes: int) -> None:
+        self.jvms = [Jvm(command) for _ in range(max(1, processes))]
+        self.idle: queue.SimpleQueue[Jvm] = queue.SimpleQueue()
+        for jvm in self.jvms:
+            self.idle.put(jvm)
+
+    def handle(self, request: dict[str, Any]) -> dict[str, str]:
+        if request.get("health"):
+            problem = self.health()
+            return {"status": "ok"} if (problem is None) else {"status": "failure", "message": problem}
+
+        jvm = self.idle.get()
+        try:
+            jvm.request([str(argument) for argument in request["arguments"]], float(request["timeout"]))
+        except ReportError as e:
+            return {"status": "failure", "message": str(e)}
+        except TimeoutError as e:
+            return {"status": "timeout", "message": str(e)}
+        except (EOFError, OSError) as e:
+            return {"status": "failure", "message": f"The Apache RAT JVM failed: {e}"}
+        finally:
+            self.idle.put(jvm)
+        return {"status": "ok"}
+
+    def health(self) -> str | None:
+        """Check the JVMs which are idle, starting any which have failed, and return a problem if there is one."""
+        checked: list[Jvm] = []
+        problem: str | None = None
+        with contextlib.suppress(queue.Empty):
+            while len(checked) < len(self.jvms):
+                jvm = self.idle.get_nowait()
+                checked.append(jvm)
+                try:
+                    jvm.request([], _HEALTH_TIMEOUT_SECONDS)
+                except (EOFError, OSError, ReportError, TimeoutError) as e:
+                    problem = f"Apache RAT JVM did not respond: {e}"
+        for jvm in checked:
+            self.idle.put(jvm)
+        # Busy JVMs are healthy as long as they are running
+        if any((jvm not in checked) and (not jvm.alive()) for jvm in self.jvms):
+            problem = "Apache RAT JVM exited during a report"
+        return problem
+
+    def stop(self) -> None:
+        for jvm in self.jvms:
+            jvm.stop()
+
+
+def health(timeout: float = _HEALTH_TIMEOUT_SECONDS) -> str | None:
+    """Return the problem with the JVMs of the service if there is one, or None if they are healthy.
+
+    Raises OSError if the service itself is not reachable.
+    """
+    response = _call({"health": True}, timeout)
+    if response.get("status") != "ok":
+        return str(response.get("message", "Unknown problem"))
+    return None
+
+
+def main(socket_path: str) -> None:
+    """Serve Apache RAT reports to task workers on a Unix socket."""
+    # The service is compiled against the RAT JAR each time that it starts, because that JAR may have been upgraded
+    with tempfile.TemporaryDirectory(prefix="ratservice_") as classes_dir:
+        service = Service(_jvm_command(classes_dir), config.get().APACHE_RAT_SERVICE_PROCESSES)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
+        try:
+            with Server(socket_path, service) as server:
+                log.info(f"Apache RAT service listening on {socket_path}")
+                server.serve_forever()
+        finally:
+            service.stop()
+
+
+def report(arguments: list[str], timeout: float) -> None:
+    """Run Apache RAT with the given arguments in the service.
+
+    Raises OSError if the service is not reachable, so that the caller can run RAT itself instead.
+    """
+    # Allow a little longer than the report itself for the service to reply
+    response = _call({"arguments": arguments, "timeout": timeout}, timeout + _HEALTH_TIMEOUT_SECONDS)
+    match response.get("status"):
+        case "ok":
+            return
+        case "timeout":
+            raise TimeoutError(response.get("message", "Apache RAT timed out"))
+        case _:
+            raise ReportError(response.get("message", "Unknown failure"))
+
+
+def _call(request: dict[str, Any], timeout: float) -> dict[str, Any]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(config.get().APACHE_RAT_SERVICE_SOCKET)
+        connection.sendall(json.dumps(request).encode() + b"\n")
+        with connection.makefile("rb") as response:
+            line = response.readline()
+    if not line:
+        raise ConnectionError("Apache RAT service closed the connection")
+    return json.loads(line)
+
+
+def _jvm_command(classes_dir: str) -> list[str]:
+    app_config = config.get()
+    jar_path = app_config.APACHE_RAT_JAR_PATH
+    subprocess.run(
+        ["javac", "-cp", jar_path, "-d", classes_dir, str(_JAVA_SOURCE)], check=True, capture_output=True, timeout=120
+    )
+    return [
+        "java",
+        f"-Xmx{app_config.APACHE_RAT_SERVICE_HEAP_MB}m",
+        # Exit rather than continue in an unknown state, so that the JVM is started again for the next request
+        "-XX:+ExitOnOutOfMemoryError",
+        "-cp",
+        os.pathsep.join([jar_path, classes_dir]),
+        _JAVA_CLASS,
+    ]
+
+
+def _read_exactly(fd: int, size: int, deadline: float) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Apache RAT did not finish in time")
+        readable, _writable, _exceptional = select.select([fd], [], [], remaining)
+        if not readable:
+            continue
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            raise EOFError("The Apache RAT JVM exited")
+        data += chunk
+    return bytes(data)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
@@ -22,7 +22,6 @@ import asyncio
 import base64
 import contextlib
 import datetime
-import hashlib
 from typing import TYPE_CHECKING, Final
 
 import aiofiles.os
@@ -35,6 +34,7 @@ import atr.analysis as analysis
 import atr.config as config
 import atr.db as db
 import atr.form as form
+import atr.hashes as hashes
 import atr.log as log
 import atr.models.api as api
 import atr.models.sql as sql
@@ -229,13 +229,9 @@ class CommitteeParticipant(FoundationCommitter):
                 raise storage.AccessError("SHA512 file already exists")
 
             # Read the source file from the new revision and compute the hash
-            hash_obj = hashlib.sha512()
-            async with aiofiles.open(path_in_new_revision, "rb") as f:
-                while chunk := await f.read(8192):
-                    hash_obj.update(chunk)
+            hash_value = await hashes.async_digest(path_in_new_revision, "sha512")
 
             # Write the hash file into the new revision
-            hash_value = hash_obj.hexdigest()
             async with aiofiles.open(hash_path_in_new_revision, "w") as f:
                 await f.write(f"{hash_value}  {rel_path.name}\n")
 
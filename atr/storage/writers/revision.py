@@ -111,6 +111,7 @@ class CommitteeParticipant(FoundationCommitter):
         version_name: str,
         asf_uid: str,
         description: str | None = None,
+        depends_on: int | None = None,
     ) -> AsyncGenerator[types.Creating]:
         """Manage the creation and symlinking of a mutable release revision."""
         # Get the release
@@ -221,7 +222,14 @@ class CommitteeParticipant(FoundationCommitter):
                 # It does, however, need a transaction to be created using data.begin()
                 if release.phase == sql.ReleasePhase.RELEASE_CANDIDATE_DRAFT:
                     # Must use caller_data here because we acquired the write lock
-                    await tasks.draft_checks(asf_uid, project_name, version_name, new_revision.number, caller_data=data)
+                    await tasks.draft_checks(
+                        asf_uid,
+                        project_name,
+                        version_name,
+                        new_revision.number,
+                        caller_data=data,
+                        depends_on=depends_on,
+                    )
 
 
 class CommitteeMember(CommitteeParticipant):
@@ -108,16 +108,17 @@ class CommitteeParticipant(FoundationCommitter):
         project_name: str,
         version_name: str,
         revision_number: str,
-        path_in_new_revision: pathlib.Path,
-        sbom_path_in_new_revision: pathlib.Path,
+        rel_path: pathlib.Path,
     ) -> sql.Task:
-        # Create and queue the task, using paths within the new revision
-        # We still need release.name for the task metadata
+        # The task creates a new revision containing the SBOM when it completes
         sbom_task = sql.Task(
             task_type=sql.TaskType.SBOM_GENERATE_CYCLONEDX,
             task_args=sbom.GenerateCycloneDX(
-                artifact_path=str(path_in_new_revision.resolve()),
-                output_path=str(sbom_path_in_new_revision.resolve()),
+                project_name=project_name,
+                version_name=version_name,
+                revision_number=revision_number,
+                artifact_path=str(rel_path),
+                asf_uid=util.unwrap(self.__asf_uid),
             ).model_dump(),
             asf_uid=util.unwrap(self.__asf_uid),
             added=datetime.datetime.now(datetime.UTC),
@@ -125,6 +126,7 @@ class CommitteeParticipant(FoundationCommitter):
             project_name=project_name,
             version_name=version_name,
             revision_number=revision_number,
+            primary_rel_path=str(rel_path),
         )
         self.__data.add(sbom_task)
         await self.__data.commit()
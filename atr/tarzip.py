@@ -18,10 +18,13 @@
 import contextlib
 import tarfile
 import zipfile
+import zlib
 from collections.abc import Generator, Iterator
 from typing import IO, Final, Literal, TypeVar
 from typing import Protocol as TypingProtocol
 
+import atr.gzindex as gzindex
+
 MAX_ARCHIVE_MEMBERS: Final[int] = 100_000
 
 
@@ -39,7 +42,9 @@ MemberT = TypeVar("MemberT", tarfile.TarInfo, zipfile.ZipInfo, covariant=True)
 class AbstractArchiveMember[MemberT: (tarfile.TarInfo, zipfile.ZipInfo)](TypingProtocol):
     name: str
     size: int
+    mode: int
     linkname: str | None
+    header_offset: int
 
     _original_info: MemberT
 
@@ -55,7 +60,10 @@ class TarMember(AbstractArchiveMember[tarfile.TarInfo]):
         self.name = original.name
         self._original_info = original
         self.size = original.size
+        self.mode = original.mode
         self.linkname = original.linkname if hasattr(original, "linkname") else None
+        # The offset of the header in the uncompressed tar stream
+        self.header_offset = original.offset
 
     def isfile(self) -> bool:
         return self._original_info.isfile()
@@ -79,8 +87,12 @@ class ZipMember(AbstractArchiveMember[zipfile.ZipInfo]):
         self._original_info = original
 
         self.size = original.file_size
+        # The high bits of the external attributes hold the Unix mode, when the archiver recorded one
+        self.mode = (original.external_attr >> 16) & 0xFFFF
         # Link targets are not encoded in ZIP files
         self.linkname: str | None = None
+        # The offset of the local file header in the ZIP file
+        self.header_offset = original.header_offset
 
     def isfile(self) -> bool:
         return not self._original_info.is_dir()
@@ -98,40 +110,60 @@ class ZipMember(AbstractArchiveMember[zipfile.ZipInfo]):
         return False
 
 
+class MemberInfo(TypingProtocol):
+    """The metadata of an archive member, whether read from the archive itself or from its manifest."""
+
+    @property
+    def name(self) -> str: ...
+    @property
+    def size(self) -> int: ...
+    @property
+    def mode(self) -> int: ...
+    @property
+    def linkname(self) -> str | None: ...
+    @property
+    def header_offset(self) -> int: ...
+
+    def isfile(self) -> bool: ...
+    def isdir(self) -> bool: ...
+    def issym(self) -> bool: ...
+    def islnk(self) -> bool: ...
+    def isdev(self) -> bool: ...
+
+
 type Member = TarMember | ZipMember
 
 
 class ArchiveContext[ArchiveT: (tarfile.TarFile, zipfile.ZipFile)]:
     _archive_obj: ArchiveT
     _max_members: int
+    _gzip_file: gzindex.IndexedGzipFile | None
 
-    def __init__(self, archive_obj: ArchiveT, max_members: int = MAX_ARCHIVE_MEMBERS):
+    def __init__(
+        self,
+        archive_obj: ArchiveT,
+        max_members: int = MAX_ARCHIVE_MEMBERS,
+        gzip_file: gzindex.IndexedGzipFile | None = None,
+    ):
         self._archive_obj = archive_obj
         self._max_members = max_members
+        self._gzip_file = gzip_file
 
     def __iter__(self) -> Iterator[TarMember | ZipMember]:
         count = 0
-        enforce_limit = self._max_members > 0
         match self._archive_obj:
             case tarfile.TarFile() as tf:
                 for member_orig in tf:
                     if member_orig.isdev():
                         continue
-                    if enforce_limit:
-                        count += 1
-                        if count > self._max_members:
-                            raise ArchiveMemberLimitExceededError(
-                                f"Archive contains too many members: exceeded limit of {self._max_members}"
-                            )
+                    count = self._count_member(count)
                     yield TarMember(member_orig)
+                if self._gzip_file is not None:
+                    # Only the end of archive padding remains, so completing the gzip index is cheap
+                    self._gzip_file.finish()
             case zipfile.ZipFile() as zf:
                 for member_orig in zf.infolist():
-                    if enforce_limit:
-                        count += 1
-                        if count > self._max_members:
-                            raise ArchiveMemberLimitExceededError(
-                                f"Archive contains too many members: exceeded limit of {self._max_members}"
-                            )
+                    count = self._count_member(count)
                     yield ZipMember(member_orig)
 
     def extractfile(self, member_wrapper: Member) -> IO[bytes] | None:
@@ -180,6 +212,14 @@ class ArchiveContext[ArchiveT: (tarfile.TarFile, zipfile.ZipFile)]:
     def specific(self) -> tarfile.TarFile | zipfile.ZipFile:
         return self._archive_obj
 
+    def _count_member(self, count: int) -> int:
+        count += 1
+        if (self._max_members > 0) and (count > self._max_members):
+            raise ArchiveMemberLimitExceededError(
+                f"Archive contains too many members: exceeded limit of {self._max_members}"
+            )
+        return count
+
 
 type TarArchive = ArchiveContext[tarfile.TarFile]
 type ZipArchive = ArchiveContext[zipfile.ZipFile]
@@ -204,9 +244,10 @@ def open_archive(
         ArchiveMemberLimitExceededError: If the archive exceeds max_members during iteration.
     """
     archive_file: tarfile.TarFile | zipfile.ZipFile | None = None
+    gzip_file: gzindex.IndexedGzipFile | None = None
     try:
         try:
-            archive_file = tarfile.open(archive_path, "r:*")
+            archive_file, gzip_file = _tar_open(archive_path)
         except tarfile.ReadError:
             try:
                 archive_file = zipfile.ZipFile(archive_path, "r")
@@ -215,10 +256,29 @@ def open_archive(
 
         match archive_file:
             case tarfile.TarFile() as tf_concrete:
-                yield ArchiveContext[tarfile.TarFile](tf_concrete, max_members)
+                yield ArchiveContext[tarfile.TarFile](tf_concrete, max_members, gzip_file)
             case zipfile.ZipFile() as zf_concrete:
                 yield ArchiveContext[zipfile.ZipFile](zf_concrete, max_members)
 
     finally:
         if archive_file:
             archive_file.close()
+        if gzip_file:
+            gzip_file.close()
+
+
+def _tar_open(archive_path: str) -> tuple[tarfile.TarFile, gzindex.IndexedGzipFile | None]:
+    """Open a tar archive, reading it through a gzip index when it is gzip compressed."""
+    if not (gzindex.is_gzip(archive_path) and gzindex.available()):
+        return tarfile.open(archive_path, "r:*"), None
+
+    gzip_file = gzindex.IndexedGzipFile(archive_path)
+    try:
+        return tarfile.open(fileobj=gzip_file, mode="r:"), gzip_file  # type: ignore[arg-type]
+    except (OSError, zlib.error) as e:
+        gzip_file.close()
+        # This is what tarfile raises for a gzip file which it cannot open, while EOFError propagates
+        raise tarfile.ReadError("not a gzip file") from e
+    except BaseException:
+        gzip_file.close()
+        raise
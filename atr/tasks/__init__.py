@@ -16,14 +16,23 @@
 # under the License.
 
 import datetime
+import json
+import pathlib
 from collections.abc import Awaitable, Callable, Coroutine
 from typing import Any, Final
 
+import aiofiles.os
+import blake3
 import sqlmodel
 
+import atr.attestable as attestable
+import atr.config as config
 import atr.db as db
+import atr.log as log
 import atr.models.results as results
 import atr.models.sql as sql
+import atr.tasks.checks as checks
+import atr.tasks.checks.archive as archive
 import atr.tasks.checks.hashing as hashing
 import atr.tasks.checks.license as license
 import atr.tasks.checks.paths as paths
@@ -41,6 +50,32 @@ import atr.tasks.svn as svn
 import atr.tasks.vote as vote
 import atr.util as util
 
+# Revisions which queue more checks than this are queued at bulk priority
+_BULK_CHECKS_THRESHOLD: Final = 50
+
+# Revisions with at least this many signature files check them all in one task
+_SIGNATURE_BATCH_THRESHOLD: Final = 2
+
+# Checks whose results only matter for the revision that they check
+# Nothing else waits on these, so they can be dropped once a newer revision of the draft exists
+_SUPERSEDABLE_TASK_TYPES: Final = frozenset(
+    {
+        sql.TaskType.ARCHIVE_SCAN,
+        sql.TaskType.HASHING_CHECK,
+        sql.TaskType.LICENSE_FILES,
+        sql.TaskType.LICENSE_HEADERS,
+        sql.TaskType.PATHS_CHECK,
+        sql.TaskType.RAT_CHECK,
+        sql.TaskType.SBOM_TOOL_SCORE,
+        sql.TaskType.SIGNATURE_CHECK,
+        sql.TaskType.SIGNATURE_CHECK_BATCH,
+        sql.TaskType.TARGZ_INTEGRITY,
+        sql.TaskType.TARGZ_STRUCTURE,
+        sql.TaskType.ZIPFORMAT_INTEGRITY,
+        sql.TaskType.ZIPFORMAT_STRUCTURE,
+    }
+)
+
 
 async def asc_checks(asf_uid: str, release: sql.Release, revision: str, signature_path: str) -> list[sql.Task]:
     """Create signature check task for a .asc file."""
@@ -61,6 +96,15 @@ async def asc_checks(asf_uid: str, release: sql.Release, revision: str, signatur
     return tasks
 
 
+def checkers(task_type: sql.TaskType) -> list[str]:
+    """Return the keys of the checkers whose results a task of the given type records."""
+    if task_type == sql.TaskType.ARCHIVE_SCAN:
+        return archive.checkers()
+    if task_type == sql.TaskType.SIGNATURE_CHECK_BATCH:
+        return [checks.function_key(signature.check)]
+    return [checks.function_key(resolve(task_type))]
+
+
 async def clear_scheduled(caller_data: db.Session | None = None) -> None:
     """Clear all future scheduled tasks of the given types."""
     async with db.ensure_session(caller_data) as data:
@@ -98,6 +142,7 @@ async def distribution_status_check(
             task_type=sql.TaskType.DISTRIBUTION_STATUS,
             task_args=args.model_dump(),
             asf_uid=asf_uid,
+            priority=sql.TaskPriority.BACKGROUND,
             revision_number=None,
             primary_rel_path=None,
         )
@@ -110,9 +155,14 @@ async def distribution_status_check(
 
 
 async def draft_checks(
-    asf_uid: str, project_name: str, release_version: str, revision_number: str, caller_data: db.Session | None = None
+    asf_uid: str,
+    project_name: str,
+    release_version: str,
+    revision_number: str,
+    caller_data: db.Session | None = None,
+    depends_on: int | None = None,
 ) -> int:
-    """Core logic to analyse a draft revision and queue checks."""
+    """Core logic to analyse a draft revision and queue checks, optionally after a task which must complete first."""
     # Construct path to the specific revision
     # We don't have the release object here, so we can't use util.release_directory
     revision_path = util.get_unfinished_dir() / project_name / release_version / revision_number
@@ -134,6 +184,7 @@ async def draft_checks(
         previous_version = next(
             (v for v in release_versions if util.version_sort_key(v.version) < release_version_sortable), None
         )
+        check_tasks: list[sql.Task] = []
         for path in relative_paths:
             path_str = str(path)
             task_function: Callable[[str, sql.Release, str, str], Awaitable[list[sql.Task]]] | None = None
@@ -144,11 +195,11 @@ async def draft_checks(
             if task_function:
                 for task in await task_function(asf_uid, release, revision_number, path_str):
                     task.revision_number = revision_number
-                    data.add(task)
+                    check_tasks.append(task)
             # TODO: Should we check .json files for their content?
             # Ideally we would not have to do that
             if path.name.endswith(".cdx.json"):
-                data.add(
+                check_tasks.append(
                     queued(
                         asf_uid,
                         sql.TaskType.SBOM_TOOL_SCORE,
@@ -173,7 +224,14 @@ async def draft_checks(
         path_check_task = queued(
             asf_uid, sql.TaskType.PATHS_CHECK, release, revision_number, extra_args={"is_podling": is_podling}
         )
-        data.add(path_check_task)
+        check_tasks.append(path_check_task)
+
+        check_tasks = _signature_checks_batch(asf_uid, release, revision_number, check_tasks)
+        check_tasks = await _checks_deduplicate(data, project_name, release_version, revision_number, check_tasks)
+        await _checks_supersede(data, project_name, release_version, revision_number, check_tasks)
+        _checks_prerequisite_set(check_tasks, depends_on)
+        _bulk_priority_set(check_tasks)
+        data.add_all(check_tasks)
         if caller_data is None:
             await data.commit()
 
@@ -218,6 +276,7 @@ async def metadata_update(
             task_type=sql.TaskType.METADATA_UPDATE,
             task_args=args.model_dump(),
             asf_uid=asf_uid,
+            priority=sql.TaskPriority.BACKGROUND,
             revision_number=None,
             primary_rel_path=None,
         )
@@ -250,7 +309,12 @@ def queued(
 
 
 def resolve(task_type: sql.TaskType) -> Callable[..., Awaitable[results.Results | None]]:  # noqa: C901
+    # Archives queue ARCHIVE_SCAN instead of LICENSE_FILES, LICENSE_HEADERS, TARGZ_*, and ZIPFORMAT_* tasks
+    # Those task types are no longer queued, and are only resolved so that tasks queued before remain runnable
+    # Their checker functions are still the keys under which an archive scan records the results of each check
     match task_type:
+        case sql.TaskType.ARCHIVE_SCAN:
+            return archive.scan
         case sql.TaskType.DISTRIBUTION_STATUS:
             return distribution.status_check
         case sql.TaskType.DISTRIBUTION_WORKFLOW:
@@ -283,6 +347,8 @@ def resolve(task_type: sql.TaskType) -> Callable[..., Awaitable[results.Results
             return sbom.score_tool
         case sql.TaskType.SIGNATURE_CHECK:
             return signature.check
+        case sql.TaskType.SIGNATURE_CHECK_BATCH:
+            return signature.check_batch
         case sql.TaskType.SVN_IMPORT_FILES:
             return svn.import_files
         case sql.TaskType.TARGZ_INTEGRITY:
@@ -315,11 +381,9 @@ async def tar_gz_checks(asf_uid: str, release: sql.Release, revision: str, path:
     # This release has committee, as guaranteed in draft_checks
     is_podling = (release.project.committee is not None) and release.project.committee.is_podling
     tasks = [
-        queued(asf_uid, sql.TaskType.LICENSE_FILES, release, revision, path, extra_args={"is_podling": is_podling}),
-        queued(asf_uid, sql.TaskType.LICENSE_HEADERS, release, revision, path),
+        # The license, integrity, and structure checks share a single read of the archive
+        queued(asf_uid, sql.TaskType.ARCHIVE_SCAN, release, revision, path, extra_args={"is_podling": is_podling}),
         queued(asf_uid, sql.TaskType.RAT_CHECK, release, revision, path),
-        queued(asf_uid, sql.TaskType.TARGZ_INTEGRITY, release, revision, path),
-        queued(asf_uid, sql.TaskType.TARGZ_STRUCTURE, release, revision, path),
     ]
 
     return tasks
@@ -341,6 +405,7 @@ async def workflow_update(
             task_type=sql.TaskType.WORKFLOW_STATUS,
             task_args=args.model_dump(),
             asf_uid=asf_uid,
+            priority=sql.TaskPriority.BACKGROUND,
             revision_number=None,
             primary_rel_path=None,
         )
@@ -357,15 +422,314 @@ async def zip_checks(asf_uid: str, release: sql.Release, revision: str, path: st
     # This release has committee, as guaranteed in draft_checks
     is_podling = (release.project.committee is not None) and release.project.committee.is_podling
     tasks = [
-        queued(asf_uid, sql.TaskType.LICENSE_FILES, release, revision, path, extra_args={"is_podling": is_podling}),
-        queued(asf_uid, sql.TaskType.LICENSE_HEADERS, release, revision, path),
+        # The license, integrity, and structure checks share a single read of the archive
+        queued(asf_uid, sql.TaskType.ARCHIVE_SCAN, release, revision, path, extra_args={"is_podling": is_podling}),
         queued(asf_uid, sql.TaskType.RAT_CHECK, release, revision, path),
-        queued(asf_uid, sql.TaskType.ZIPFORMAT_INTEGRITY, release, revision, path),
-        queued(asf_uid, sql.TaskType.ZIPFORMAT_STRUCTURE, release, revision, path),
     ]
     return tasks
 
 
+def _bulk_priority_set(check_tasks: list[sql.Task]) -> None:
+    # Large revisions should not delay the checks of small revisions
+    if len(check_tasks) > _BULK_CHECKS_THRESHOLD:
+        for task in check_tasks:
+            task.priority = sql.TaskPriority.BULK
+
+
+async def _checks_carry_forward(
+    data: db.Session,
+    project_name: str,
+    version_name: str,
+    revision_number: str,
+    check_tasks: list[sql.Task],
+    path_hashes: dict[str, str],
+) -> tuple[list[sql.Task], list[sql.Task]]:
+    """Copy the results of checks of files which are unchanged since the parent revision, in bulk.
+
+    Returns the checks which still need results, and the checks whose results were carried forward.
+    """
+    release_name = sql.release_name(project_name, version_name)
+    revision = await data.revision(release_name=release_name, number=revision_number).get()
+    if (revision is None) or (revision.parent_name is None):
+        return check_tasks, []
+    parent_revision = await data.revision(name=revision.parent_name).get()
+    if parent_revision is None:
+        return check_tasks, []
+    parent_revision_number = parent_revision.number
+    parent_index = await attestable.async_index(project_name, version_name, parent_revision_number)
+    if parent_index is None:
+        return check_tasks, []
+    # Files are compared by content hash, which is only computed again for new content when a revision is created
+    unchanged = {path for path, hash_ref in path_hashes.items() if parent_index.hash(path) == hash_ref}
+
+    parent_tasks = await data.task(
+        project_name=project_name, version_name=version_name, revision_number=parent_revision_number
+    ).all()
+    completed: dict[tuple[str, str | None, str | None], sql.Task] = {}
+    unfinished: set[tuple[str, str | None]] = set()
+    for parent_task in parent_tasks:
+        if parent_task.status == sql.TaskStatus.COMPLETED:
+            completed[(parent_task.task_type, parent_task.primary_rel_path, parent_task.dedup_key)] = parent_task
+        elif parent_task.status in {sql.TaskStatus.QUEUED, sql.TaskStatus.ACTIVE}:
+            # Results of the parent which are still being recorded are not complete
+            unfinished.add((parent_task.task_type, parent_task.primary_rel_path))
+
+    pending: list[sql.Task] = []
+    carried: list[sql.Task] = []
+    for check_task in check_tasks:
+        # The dedup key covers the other inputs of the check, its version, and the policy that it reads
+        parent_task = completed.get((check_task.task_type, check_task.primary_rel_path, check_task.dedup_key))
+        if (
+            (check_task.dedup_key is not None)
+            and (check_task.primary_rel_path in unchanged)
+            and (parent_task is not None)
+            and ((check_task.task_type, check_task.primary_rel_path) not in unfinished)
+        ):
+            _task_reused(check_task, parent_task)
+            carried.append(check_task)
+        else:
+            pending.append(check_task)
+    if not carried:
+        return check_tasks, []
+
+    pairs = [
+        (util.unwrap(check_task.primary_rel_path), checker)
+        for check_task in carried
+        for checker in checkers(check_task.task_type)
+    ]
+    await checks.results_carry_forward(release_name, parent_revision_number, revision_number, pairs, caller_data=data)
+    log.info(
+        f"Carried forward {util.plural(len(carried), 'check')} of {release_name} from revision"
+        f" {parent_revision_number} to {revision_number}, with"
+        f" {util.plural(len(path_hashes) - len(unchanged), 'new or changed file')}"
+    )
+    return pending, carried
+
+
+async def _checks_deduplicate(
+    data: db.Session, project_name: str, version_name: str, revision_number: str, check_tasks: list[sql.Task]
+) -> list[sql.Task]:
+    """Reuse the results of identical checks instead of queueing them again, returning the checks still to queue."""
+    revision_path = util.get_unfinished_dir() / project_name / version_name / revision_number
+    if config.get().DISABLE_CHECK_CACHE or await aiofiles.os.path.exists(revision_path / ".atr-no-cache"):
+        return check_tasks
+    # The attestable data for the new revision has already been written, so its file hashes are free
+    revision_index = await attestable.async_index(project_name, version_name, revision_number)
+    if revision_index is None:
+        return check_tasks
+    project = await data.project(name=project_name, _release_policy=True).demand(
+        RuntimeError(f"Project {project_name} not found")
+    )
+    for check_task in check_tasks:
+        check_task.dedup_key = _dedup_key(check_task, revision_index.paths, project)
+
+    # Most new revisions change only a few files, so the results of the others are carried forward in bulk first
+    pending, reused = await _checks_carry_forward(
+        data, project_name, version_name, revision_number, check_tasks, revision_index.paths
+    )
+    duplicates = await _duplicates_find(data, project_name, version_name, pending)
+    # Results are deleted along with their release, so a completed check of a release which remains has all of them
+    source_releases = await _releases_existing(
+        data,
+        {
+            _task_release_name(duplicate)
+            for duplicate in duplicates.values()
+            if (duplicate.status == sql.TaskStatus.COMPLETED)
+        },
+    )
+    copies: list[tuple[sql.Task, sql.Task, list[str]]] = []
+    remaining: list[sql.Task] = []
+    for check_task in pending:
+        duplicate = duplicates.get(check_task.dedup_key) if (check_task.dedup_key is not None) else None
+        if (duplicate is not None) and (duplicate.status == sql.TaskStatus.COMPLETED):
+            if _task_release_name(duplicate) in source_releases:
+                _task_reused(check_task, duplicate)
+                reused.append(check_task)
+                copies.append((duplicate, check_task, checkers(check_task.task_type)))
+                continue
+        elif duplicate is not None:
+            # The worker copies the results of the identical check once it completes
+            check_task.depends_on = duplicate.id
+        remaining.append(check_task)
+    await checks.results_copy(copies, caller_data=data)
+    if reused:
+        # Reused checks are recorded as completed, so that the next revision can carry their results forward too
+        data.add_all(reused)
+        log.info(f"Reused the results of {len(reused)} identical checks for {revision_path}")
+    return remaining
+
+
+def _checks_prerequisite_set(check_tasks: list[sql.Task], depends_on: int | None) -> None:
+    if depends_on is None:
+        return
+    # Checks already waiting on an identical check wait on that instead, since it shares their inputs
+    for check_task in check_tasks:
+        if check_task.depends_on is None:
+            check_task.depends_on = depends_on
+
+
+async def _checks_supersede(
+    data: db.Session, project_name: str, version_name: str, revision_number: str, check_tasks: list[sql.Task]
+) -> None:
+    """Mark the unfinished checks of earlier revisions of a draft as superseded by a new revision."""
+    via = sql.validate_instrumented_attribute
+    # Identical checks of earlier revisions which the new checks wait on must still run
+    prerequisite_ids = [check_task.depends_on for check_task in check_tasks if (check_task.depends_on is not None)]
+    statuses = [sql.TaskStatus.QUEUED]
+    if config.get().WORKER_CANCEL_SUPERSEDED:
+        # Workers cancel running tasks that they no longer hold when they next renew their leases
+        statuses.append(sql.TaskStatus.ACTIVE)
+    update_stmt = (
+        sqlmodel.update(sql.Task)
+        .where(
+            via(sql.Task.project_name) == project_name,
+            via(sql.Task.version_name) == version_name,
+            via(sql.Task.revision_number).is_not(None),
+            via(sql.Task.revision_number) != revision_number,
+            via(sql.Task.task_type).in_(_SUPERSEDABLE_TASK_TYPES),
+            via(sql.Task.status).in_(statuses),
+            via(sql.Task.id).notin_(prerequisite_ids),
+        )
+        .values(
+            status=sql.TaskStatus.SUPERSEDED,
+            completed=datetime.datetime.now(datetime.UTC),
+            lease_expires=None,
+            error=f"Superseded by revision {revision_number}",
+        )
+        .returning(via(sql.Task.id))
+    )
+    superseded_ids = (await data.execute(update_stmt)).scalars().all()
+    if superseded_ids:
+        log.info(
+            f"Superseded {len(superseded_ids)} checks of {project_name} {version_name} by revision {revision_number}"
+        )
+
+
+def _dedup_key(check_task: sql.Task, path_hashes: dict[str, str], project: sql.Project) -> str | None:
+    """Compute the identity of a check from the cache declarations of its checkers, and its input file hashes.
+
+    Only checks whose checkers are all declared with checks.cached, and which read nothing beyond their files,
+    arguments, and policy, have an identity.
+    """
+    if check_task.primary_rel_path is None:
+        return None
+    checker_keys = checkers(sql.TaskType(check_task.task_type))
+    cacheables = [checks.cacheable(checker_key) for checker_key in checker_keys]
+    if any(((cacheable is None) or (cacheable.context is not None)) for cacheable in cacheables):
+        return None
+    declared = [util.unwrap(cacheable) for cacheable in cacheables]
+
+    primary_rel_path = check_task.primary_rel_path
+    input_rel_paths = [primary_rel_path]
+    for cacheable in declared:
+        if cacheable.inputs is not None:
+            input_rel_paths.extend(cacheable.inputs(primary_rel_path))
+    input_hashes = [path_hashes.get(input_rel_path) for input_rel_path in dict.fromkeys(input_rel_paths)]
+    if None in input_hashes:
+        return None
+
+    policy_names = {name for cacheable in declared for name in cacheable.policy}
+    argument_names = {name for cacheable in declared for name in cacheable.arguments}
+    identity: dict[str, Any] = {
+        "task_type": check_task.task_type,
+        # Increasing the version of any checker gives the check a new identity, so earlier results are not reused
+        "versions": {checker_key: cacheable.version for checker_key, cacheable in zip(checker_keys, declared)},
+        "input_hashes": input_hashes,
+        "arguments": {name: check_task.task_args.get(name) for name in sorted(argument_names)},
+        "policy": {name: getattr(project, name) for name in sorted(policy_names)},
+    }
+    # Checkers classify artifacts by matching some policy patterns against the full path
+    if any(identity["policy"].get(name) for name in checks.PATH_POLICIES):
+        identity["path"] = primary_rel_path
+    elif any(cacheable.named for cacheable in declared):
+        identity["path"] = pathlib.PurePosixPath(primary_rel_path).name
+    encoded = json.dumps(identity, sort_keys=True, default=str).encode("utf-8")
+    return f"blake3:{blake3.blake3(encoded).hexdigest()}"
+
+
+async def _duplicates_find(
+    data: db.Session, project_name: str, version_name: str, check_tasks: list[sql.Task]
+) -> dict[str, sql.Task]:
+    """Find an existing task for each check identity, preferring completed tasks over those still to finish."""
+    dedup_keys = {check_task.dedup_key for check_task in check_tasks if (check_task.dedup_key is not None)}
+    if not dedup_keys:
+        return {}
+    via = sql.validate_instrumented_attribute
+    # The newest completed task of each identity has results from the most recent run of its checkers
+    completed_ids = (
+        sqlmodel.select(sqlmodel.func.max(via(sql.Task.id)))
+        .where(
+            via(sql.Task.dedup_key).in_(dedup_keys),
+            via(sql.Task.status) == sql.TaskStatus.COMPLETED,
+        )
+        .group_by(via(sql.Task.dedup_key))
+    )
+    # Only wait on checks of the same release, which are deleted along with the new check
+    # The earliest of these is the one doing the work, and any others are waiting on it
+    unfinished_ids = (
+        sqlmodel.select(sqlmodel.func.min(via(sql.Task.id)))
+        .where(
+            via(sql.Task.dedup_key).in_(dedup_keys),
+            via(sql.Task.status).in_([sql.TaskStatus.QUEUED, sql.TaskStatus.ACTIVE]),
+            via(sql.Task.project_name) == project_name,
+            via(sql.Task.version_name) == version_name,
+        )
+        .group_by(via(sql.Task.dedup_key))
+    )
+    query = sqlmodel.select(sql.Task).where(
+        sqlmodel.or_(via(sql.Task.id).in_(completed_ids), via(sql.Task.id).in_(unfinished_ids))
+    )
+    duplicates: dict[str, sql.Task] = {}
+    for existing in (await data.execute(query)).scalars().all():
+        dedup_key = util.unwrap(existing.dedup_key)
+        if (dedup_key not in duplicates) or (existing.status == sql.TaskStatus.COMPLETED):
+            duplicates[dedup_key] = existing
+    return duplicates
+
+
+async def _releases_existing(data: db.Session, release_names: set[str]) -> set[str]:
+    if not release_names:
+        return set()
+    via = sql.validate_instrumented_attribute
+    query = sqlmodel.select(via(sql.Release.name)).where(via(sql.Release.name).in_(release_names))
+    return set((await data.execute(query)).scalars().all())
+
+
+def _signature_checks_batch(
+    asf_uid: str, release: sql.Release, revision_number: str, check_tasks: list[sql.Task]
+) -> list[sql.Task]:
+    """Replace the signature checks of a revision with one task which checks them all using the same keyring."""
+    signature_tasks = [task for task in check_tasks if (task.task_type == sql.TaskType.SIGNATURE_CHECK)]
+    if len(signature_tasks) < _SIGNATURE_BATCH_THRESHOLD:
+        return check_tasks
+    # Every signature check of a revision is queued with the committee of its release
+    committee_names = {task.task_args.get("committee_name") for task in signature_tasks}
+    if len(committee_names) != 1:
+        return check_tasks
+    batch_task = queued(
+        asf_uid,
+        sql.TaskType.SIGNATURE_CHECK_BATCH,
+        release,
+        revision_number,
+        extra_args={
+            "committee_name": committee_names.pop(),
+            "signature_paths": sorted(util.unwrap(task.primary_rel_path) for task in signature_tasks),
+        },
+    )
+    return [task for task in check_tasks if (task.task_type != sql.TaskType.SIGNATURE_CHECK)] + [batch_task]
+
+
+def _task_release_name(task: sql.Task) -> str:
+    return sql.release_name(util.unwrap(task.project_name), util.unwrap(task.version_name))
+
+
+def _task_reused(check_task: sql.Task, source: sql.Task) -> None:
+    # The check is complete without running, because it has the results of an identical check
+    check_task.status = sql.TaskStatus.COMPLETED
+    check_task.completed = datetime.datetime.now(datetime.UTC)
+    check_task.result = source.result
+
+
 TASK_FUNCTIONS: Final[dict[str, Callable[..., Coroutine[Any, Any, list[sql.Task]]]]] = {
     ".asc": asc_checks,
     ".sha256": sha_checks,
@@ -17,28 +17,100 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import contextvars
 import dataclasses
 import datetime
 import functools
+import json
 import pathlib
-from typing import TYPE_CHECKING, Any, Final
+from typing import TYPE_CHECKING, Any, Final, Protocol
 
 import aiofiles
 import aiofiles.os
 import blake3
+import sqlalchemy
 import sqlmodel
 
 if TYPE_CHECKING:
-    from collections.abc import Awaitable, Callable
+    from collections.abc import AsyncGenerator, Awaitable, Callable, Collection, Iterable
 
+    import atr.models.results as results
     import atr.models.schema as schema
 
+import atr.archives as archives
+import atr.attestable as attestable
 import atr.config as config
 import atr.db as db
+import atr.log as log
+import atr.manifests as manifests
 import atr.models.sql as sql
 import atr.util as util
 
-_HASH_CHUNK_SIZE: Final[int] = 4 * 1024 * 1024
+# The number of (path, checker) pairs whose results are carried forward or copied in each statement
+# This is kept below the default limit of 500 on the terms of a compound select in SQLite
+_COPY_BATCH_SIZE: Final = 400
+
+# The columns of a check result which are written when results are copied within the database
+_COPY_COLUMNS: Final = [
+    "release_name",
+    "revision_number",
+    "checker",
+    "primary_rel_path",
+    "member_rel_path",
+    "created",
+    "status",
+    "message",
+    "data",
+    "input_hash",
+]
+
+# The columns of each row which maps the results of a source check task to those of a target
+_COPY_MAPPING_COLUMNS: Final = [
+    "source_release_name",
+    "source_revision_number",
+    "source_primary_rel_path",
+    "checker",
+    "target_release_name",
+    "target_revision_number",
+    "target_primary_rel_path",
+]
+
+# Policies whose patterns are matched against the full path of a file, so that its results depend on where it is
+PATH_POLICIES: Final = frozenset({"policy_binary_artifact_paths", "policy_source_artifact_paths"})
+
+# The cache declarations of checkers, by the key of the checker
+_cacheable: dict[str, Cacheable] = {}
+
+# The recorders created by the current task, if that task buffers its results
+_buffered_recorders: contextvars.ContextVar[list[Recorder] | None] = contextvars.ContextVar(
+    "buffered_recorders", default=None
+)
+
+
+class ArchiveVisitor(archives.ScanVisitor, Protocol):
+    """An archive member checker which records its own results once an archive scan has finished."""
+
+    async def record(self, recorder: Recorder) -> None: ...
+
+
+@dataclasses.dataclass(frozen=True)
+class Cacheable:
+    """What the results of a checker depend on, so that they can be reused when all of it is unchanged."""
+
+    # Increased whenever the checker changes what it records
+    version: int
+    # Attributes of the project, mostly release policy, which the checker reads
+    policy: tuple[str, ...] = ()
+    # Task arguments which the checker reads
+    arguments: tuple[str, ...] = ()
+    # Whether the checker reads the name of the primary file as well as its content
+    named: bool = False
+    # Other files which the checker reads, as relative paths computed from the primary relative path
+    inputs: Callable[[str], list[str]] | None = None
+    # Anything else which the checker reads, such as the keys of a committee
+    context: Callable[[FunctionArguments], Awaitable[Any]] | None = None
 
 
 # Pydantic does not like Callable types, so we use a dataclass instead
@@ -63,8 +135,10 @@ class Recorder:
     member_rel_path: str | None
     revision: str
     afresh: bool
+    __buffered: bool
     __cached: bool
     __input_hash: str | None
+    __pending: list[sql.CheckResult]
 
     def __init__(
         self,
@@ -84,8 +158,10 @@ class Recorder:
         self.afresh = afresh
         self.constructed = False
         self.member_problems: dict[sql.CheckResultStatus, int] = {}
+        self.__buffered = False
         self.__cached = False
         self.__input_hash = None
+        self.__pending = []
 
         self.project_name = project_name
         self.version_name = version_name
@@ -106,6 +182,9 @@ class Recorder:
             # Clear outer path whether it's specified or not
             await recorder.clear(primary_rel_path=primary_rel_path, member_rel_path=member_rel_path)
         recorder.constructed = True
+        if (recorders := _buffered_recorders.get()) is not None:
+            recorder.__buffered = True
+            recorders.append(recorder)
         return recorder
 
     async def _add(
@@ -115,6 +194,21 @@ class Recorder:
         data: Any,
         primary_rel_path: str | None = None,
         member_rel_path: str | None = None,
+    ) -> sql.CheckResult:
+        result = self._result(status, message, data, primary_rel_path, member_rel_path)
+        self.__pending.append(result)
+        # Results of a buffered task are written in batches, and the rest as soon as they are added
+        if (not self.__buffered) or (len(self.__pending) >= config.get().CHECK_RESULT_BATCH_SIZE):
+            await self.flush()
+        return result
+
+    def _result(
+        self,
+        status: sql.CheckResultStatus,
+        message: str,
+        data: Any,
+        primary_rel_path: str | None = None,
+        member_rel_path: str | None = None,
     ) -> sql.CheckResult:
         if self.constructed is False:
             raise RuntimeError("Cannot add check result to a recorder that has not been constructed")
@@ -129,7 +223,7 @@ class Recorder:
             if status != sql.CheckResultStatus.SUCCESS:
                 self.member_problems[status] = self.member_problems.get(status, 0) + 1
 
-        result = sql.CheckResult(
+        return sql.CheckResult(
             release_name=self.release_name,
             revision_number=self.revision_number,
             checker=self.checker,
@@ -139,16 +233,93 @@ class Recorder:
             status=status,
             message=message,
             data=data,
-            input_hash=self.__input_hash,
         )
 
-        # It would be more efficient to keep a session open
-        # But, we prefer in this case to maintain a simpler interface
-        # If performance is unacceptable, we can revisit this design
-        async with db.session() as session:
-            session.add(result)
-            await session.commit()
-        return result
+    async def _cache_copy(self, input_hash: str) -> int:
+        via = sql.validate_instrumented_attribute
+        async with db.session() as data:
+            source_stmt = (
+                sqlmodel.select(
+                    via(sql.CheckResult.release_name),
+                    via(sql.CheckResult.revision_number),
+                    via(sql.CheckResult.primary_rel_path),
+                )
+                .where(
+                    via(sql.CheckResult.checker) == self.checker,
+                    via(sql.CheckResult.input_hash) == input_hash,
+                    sqlalchemy.not_(
+                        sqlalchemy.and_(
+                            via(sql.CheckResult.release_name) == self.release_name,
+                            via(sql.CheckResult.revision_number) == self.revision_number,
+                            via(sql.CheckResult.primary_rel_path) == self.primary_rel_path,
+                        )
+                    ),
+                )
+                .order_by(via(sql.CheckResult.id).desc())
+                .limit(1)
+            )
+            source = (await data.execute(source_stmt)).one_or_none()
+            if source is None:
+                return 0
+            source_release_name, source_revision_number, source_primary_rel_path = source
+
+            # Copy every result of that check within the database, rather than loading them first
+            copy_select = (
+                sqlalchemy.select(
+                    sqlalchemy.literal(self.release_name),
+                    sqlalchemy.literal(self.revision_number),
+                    via(sql.CheckResult.checker),
+                    sqlalchemy.literal(self.primary_rel_path),
+                    via(sql.CheckResult.member_rel_path),
+                    sqlalchemy.literal(datetime.datetime.now(datetime.UTC), sql.UTCDateTime()),
+                    via(sql.CheckResult.status),
+                    via(sql.CheckResult.message),
+                    via(sql.CheckResult.data),
+                    via(sql.CheckResult.input_hash),
+                )
+                .where(
+                    via(sql.CheckResult.release_name) == source_release_name,
+                    via(sql.CheckResult.revision_number) == source_revision_number,
+                    via(sql.CheckResult.primary_rel_path) == source_primary_rel_path,
+                    via(sql.CheckResult.checker) == self.checker,
+                    via(sql.CheckResult.input_hash) == input_hash,
+                )
+                .order_by(via(sql.CheckResult.id))
+            )
+            copy_stmt = sqlalchemy.insert(sql.CheckResult).from_select(_COPY_COLUMNS, copy_select)
+            copy_result = await data.execute(copy_stmt)
+            copied = copy_result.rowcount if isinstance(copy_result, sqlalchemy.CursorResult) else 0
+            await data.commit()
+        return copied
+
+    async def _cache_key(self, cacheable: Cacheable, args: FunctionArguments, context: Any) -> str | None:
+        primary_rel_path = self.primary_rel_path or ""
+        input_rel_paths = [primary_rel_path]
+        if cacheable.inputs is not None:
+            input_rel_paths.extend(cacheable.inputs(primary_rel_path))
+        input_hashes: list[str] = []
+        for input_rel_path in input_rel_paths:
+            input_abs_path = self.abs_path_base() / input_rel_path
+            if not await aiofiles.os.path.isfile(input_abs_path):
+                return None
+            input_hashes.append(await attestable.async_file_blake3(input_abs_path))
+
+        identity: dict[str, Any] = {
+            "checker": self.checker,
+            "version": cacheable.version,
+            "input_hashes": input_hashes,
+            "arguments": {name: args.extra_args.get(name) for name in cacheable.arguments},
+            "context": context,
+        }
+        if cacheable.policy:
+            project = await self.project()
+            identity["policy"] = {name: getattr(project, name) for name in cacheable.policy}
+            if any(identity["policy"].get(name) for name in PATH_POLICIES):
+                identity["path"] = primary_rel_path
+        if cacheable.named and ("path" not in identity):
+            identity["path"] = pathlib.PurePosixPath(primary_rel_path).name
+        encoded = json.dumps(identity, sort_keys=True, default=str).encode("utf-8")
+        return f"blake3:{blake3.blake3(encoded).hexdigest()}"
 
     async def abs_path(self, rel_path: str | None = None) -> pathlib.Path | None:
         """Construct the absolute path using the required revision."""
@@ -197,12 +368,44 @@ class Recorder:
         abs_path = await self.abs_path()
         return matches(str(abs_path))
 
+    async def cache_complete(self) -> None:
+        """Tag the results of a check which finished normally with its cache key, so that later checks can reuse them.
+
+        Results are written untagged while the check runs, so those of a check which fails are never served from the
+        cache as if they were complete.
+        """
+        if (self.__input_hash is None) or self.__cached:
+            return
+        await self.flush()
+        via = sql.validate_instrumented_attribute
+        async with db.session() as data:
+            stmt = (
+                sqlmodel.update(sql.CheckResult)
+                .where(
+                    via(sql.CheckResult.release_name) == self.release_name,
+                    via(sql.CheckResult.revision_number) == self.revision_number,
+                    via(sql.CheckResult.checker) == self.checker,
+                    via(sql.CheckResult.primary_rel_path) == self.primary_rel_path,
+                    via(sql.CheckResult.input_hash).is_(None),
+                )
+                .values(input_hash=self.__input_hash)
+            )
+            await data.execute(stmt)
+            await data.commit()
+
     @property
     def cached(self) -> bool:
         return self.__cached
 
-    async def check_cache(self, path: pathlib.Path) -> bool:
-        if not await aiofiles.os.path.isfile(path):
+    async def check_cache(self, args: FunctionArguments, context: Any = None) -> bool:
+        """Copy the results of an earlier check of identical inputs, and return whether there were any.
+
+        Only checkers declared with cached use the cache. The results of the most recent check with the same cache key
+        are copied in one statement, whatever the path of the file which that check read, so a renamed file is not
+        checked again unless the checker reads its name.
+        """
+        cacheable = _cacheable.get(self.checker)
+        if (cacheable is None) or (self.primary_rel_path is None):
             return False
 
         if config.get().DISABLE_CHECK_CACHE:
@@ -212,43 +415,13 @@ class Recorder:
         if await aiofiles.os.path.exists(no_cache_file):
             return False
 
-        self.__input_hash = await _compute_file_hash(path)
-
-        async with db.session() as data:
-            via = sql.validate_instrumented_attribute
-            subquery = (
-                sqlmodel.select(
-                    sql.CheckResult.member_rel_path,
-                    sqlmodel.func.max(via(sql.CheckResult.id)).label("max_id"),
-                )
-                .where(sql.CheckResult.checker == self.checker)
-                .where(sql.CheckResult.input_hash == self.__input_hash)
-                .where(sql.CheckResult.primary_rel_path == self.primary_rel_path)
-                .group_by(sql.CheckResult.member_rel_path)
-                .subquery()
-            )
-            stmt = sqlmodel.select(sql.CheckResult).join(subquery, via(sql.CheckResult.id) == subquery.c.max_id)
-            results = await data.execute(stmt)
-            cached_results = results.scalars().all()
-
-            if not cached_results:
-                return False
-
-            for cached in cached_results:
-                new_result = sql.CheckResult(
-                    release_name=self.release_name,
-                    revision_number=self.revision_number,
-                    checker=self.checker,
-                    primary_rel_path=self.primary_rel_path,
-                    member_rel_path=cached.member_rel_path,
-                    created=datetime.datetime.now(datetime.UTC),
-                    status=cached.status,
-                    message=cached.message,
-                    data=cached.data,
-                    input_hash=self.__input_hash,
-                )
-                data.add(new_result)
-            await data.commit()
+        input_hash = await self._cache_key(cacheable, args, context)
+        if input_hash is None:
+            return False
+        # The results recorded after a miss are tagged with the key once the check has finished
+        self.__input_hash = input_hash
+        if not await self._cache_copy(input_hash):
+            return False
 
         self.__cached = True
         return True
@@ -265,6 +438,33 @@ class Recorder:
             await data.execute(stmt)
             await data.commit()
 
+    async def flush(self) -> None:
+        """Write the results which have been added but not yet written, in one transaction."""
+        if not self.__pending:
+            return
+        pending = self.__pending
+        self.__pending = []
+        async with db.session() as session:
+            session.add_all(pending)
+            await session.commit()
+
+    async def members(self, status: sql.CheckResultStatus, results: Iterable[tuple[str, Any, str]]) -> int:
+        """Add a result with the given status for each (message, data, member_rel_path), in batches.
+
+        The results are consumed lazily, so that a long iterable of results neither needs a transaction each nor has
+        to be held in memory all at once.
+        """
+        count = 0
+        batch_size = config.get().CHECK_RESULT_BATCH_SIZE
+        for message, data, member_rel_path in results:
+            self.__pending.append(self._result(status, message, data, member_rel_path=member_rel_path))
+            count += 1
+            if len(self.__pending) >= batch_size:
+                await self.flush()
+        if not self.__buffered:
+            await self.flush()
+        return count
+
     @property
     def input_hash(self) -> str | None:
         return self.__input_hash
@@ -314,10 +514,213 @@ class Recorder:
         )
 
 
+async def archive_scan(archive_path: pathlib.Path, checkers: list[tuple[Recorder, ArchiveVisitor]]) -> None:
+    """Scan an archive once for all of the given checkers, then record the results of each with its recorder."""
+    visitors = [visitor for _recorder, visitor in checkers]
+    await asyncio.to_thread(manifests.scan, str(archive_path), visitors)
+    for recorder, visitor in checkers:
+        await visitor.record(recorder)
+        await recorder.cache_complete()
+
+
+@contextlib.asynccontextmanager
+async def buffered() -> AsyncGenerator[None]:
+    """Buffer the results of the recorders created in this context, writing them in batches and when it exits.
+
+    Results are still all written before the task which records them finishes, so a check which is no longer
+    ongoing has all of its results visible.
+    """
+    recorders: list[Recorder] = []
+    token = _buffered_recorders.set(recorders)
+    try:
+        yield
+    except asyncio.CancelledError:
+        # A cancelled task has been superseded or has lost its lease, so its results are not wanted
+        raise
+    except Exception:
+        # Record what the task found before it failed, as an unbuffered task would have done
+        await _recorders_flush(recorders)
+        raise
+    else:
+        await _recorders_flush(recorders)
+    finally:
+        _buffered_recorders.reset(token)
+
+
+def cacheable(checker: str) -> Cacheable | None:
+    """Return the cache declaration of the checker with the given key, if it was declared with cached."""
+    return _cacheable.get(checker)
+
+
+def cached(
+    version: int,
+    policy: Iterable[str] = (),
+    arguments: Iterable[str] = (),
+    named: bool = False,
+    inputs: Callable[[str], list[str]] | None = None,
+    context: Callable[[FunctionArguments], Awaitable[Any]] | None = None,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator to reuse the results of an earlier check when everything that the check reads is unchanged.
+
+    The results are keyed by the content of the primary file and any other inputs, the version of the checker, and
+    the policy, arguments, and context that it reads, as described by Cacheable.
+    """
+    cacheable = Cacheable(version, tuple(policy), tuple(arguments), named, inputs, context)
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        _cacheable[function_key(func)] = cacheable
+
+        @functools.wraps(func)
+        async def wrapper(args: FunctionArguments) -> results.Results | None:
+            recorder = await args.recorder()
+            context_value = (await cacheable.context(args)) if (cacheable.context is not None) else None
+            if await recorder.check_cache(args, context_value):
+                log.info(f"Using cached {recorder.checker} results for {args.primary_rel_path}")
+                return None
+
+            # The check uses the same recorder, which has the cache key and must not be cleared again
+            async def recorder_get() -> Recorder:
+                return recorder
+
+            result = await func(dataclasses.replace(args, recorder=recorder_get))
+            await recorder.cache_complete()
+            return result
+
+        return wrapper
+
+    return decorator
+
+
 def function_key(func: Callable[..., Any]) -> str:
     return func.__module__ + "." + func.__name__
 
 
+async def results_carry_forward(
+    release_name: str,
+    source_revision_number: str,
+    target_revision_number: str,
+    pairs: Collection[tuple[str, str]],
+    caller_data: db.Session | None = None,
+) -> int:
+    """Copy the results of each (primary_rel_path, checker) pair from one revision of a release to another, in bulk."""
+    via = sql.validate_instrumented_attribute
+    ordered_pairs = sorted(set(pairs))
+    created = datetime.datetime.now(datetime.UTC)
+    copied = 0
+    async with db.ensure_session(caller_data) as data:
+        for start in range(0, len(ordered_pairs), _COPY_BATCH_SIZE):
+            batch = ordered_pairs[start : start + _COPY_BATCH_SIZE]
+            copy_select = (
+                sqlalchemy.select(
+                    via(sql.CheckResult.release_name),
+                    sqlalchemy.literal(target_revision_number),
+                    via(sql.CheckResult.checker),
+                    via(sql.CheckResult.primary_rel_path),
+                    via(sql.CheckResult.member_rel_path),
+                    sqlalchemy.literal(created, sql.UTCDateTime()),
+                    via(sql.CheckResult.status),
+                    via(sql.CheckResult.message),
+                    via(sql.CheckResult.data),
+                    via(sql.CheckResult.input_hash),
+                )
+                .where(
+                    via(sql.CheckResult.release_name) == release_name,
+                    via(sql.CheckResult.revision_number) == source_revision_number,
+                    sqlalchemy.tuple_(via(sql.CheckResult.primary_rel_path), via(sql.CheckResult.checker)).in_(batch),
+                )
+                .order_by(via(sql.CheckResult.id))
+            )
+            copy_result = await data.execute(sqlalchemy.insert(sql.CheckResult).from_select(_COPY_COLUMNS, copy_select))
+            copied += copy_result.rowcount if isinstance(copy_result, sqlalchemy.CursorResult) else 0
+        if caller_data is None:
+            await data.commit()
+    return copied
+
+
+async def results_clear(
+    release_name: str,
+    revision_number: str,
+    checkers: Collection[str],
+    primary_rel_paths: Collection[str | None],
+    caller_data: db.Session | None = None,
+) -> None:
+    """Delete every result, including member results, which the given checkers recorded for the given paths."""
+    via = sql.validate_instrumented_attribute
+    path_conditions = [
+        via(sql.CheckResult.primary_rel_path).is_(None)
+        if (primary_rel_path is None)
+        else (via(sql.CheckResult.primary_rel_path) == primary_rel_path)
+        for primary_rel_path in primary_rel_paths
+    ]
+    if (not checkers) or (not path_conditions):
+        return
+    async with db.ensure_session(caller_data) as data:
+        stmt = sqlmodel.delete(sql.CheckResult).where(
+            via(sql.CheckResult.release_name) == release_name,
+            via(sql.CheckResult.revision_number) == revision_number,
+            via(sql.CheckResult.checker).in_(checkers),
+            sqlalchemy.or_(*path_conditions),
+        )
+        await data.execute(stmt)
+        if caller_data is None:
+            await data.commit()
+
+
+async def results_copy(
+    copies: Collection[tuple[sql.Task, sql.Task, Collection[str]]], caller_data: db.Session | None = None
+) -> int:
+    """Copy the results which checkers recorded for each source check task to the revision of a target, in bulk.
+
+    Each copy is a (source, target, checkers) triple, where the source and target are identical check tasks.
+    """
+    via = sql.validate_instrumented_attribute
+    rows = _results_copy_rows(copies)
+    created = datetime.datetime.now(datetime.UTC)
+    copied = 0
+    async with db.ensure_session(caller_data) as data:
+        for start in range(0, len(rows), _COPY_BATCH_SIZE):
+            batch = rows[start : start + _COPY_BATCH_SIZE]
+            # SQLite does not accept a VALUES clause with named columns, so the mapping is a compound select instead
+            mapping = sqlalchemy.union_all(
+                *(
+                    sqlalchemy.select(
+                        *(sqlalchemy.literal(value).label(name) for name, value in zip(_COPY_MAPPING_COLUMNS, row))
+                    )
+                    for row in batch
+                )
+            ).subquery("mapping")
+            copy_select = (
+                sqlalchemy.select(
+                    mapping.c.target_release_name,
+                    mapping.c.target_revision_number,
+                    via(sql.CheckResult.checker),
+                    mapping.c.target_primary_rel_path,
+                    via(sql.CheckResult.member_rel_path),
+                    sqlalchemy.literal(created, sql.UTCDateTime()),
+                    via(sql.CheckResult.status),
+                    via(sql.CheckResult.message),
+                    via(sql.CheckResult.data),
+                    via(sql.CheckResult.input_hash),
+                )
+                .select_from(sql.CheckResult)
+                .join(
+                    mapping,
+                    sqlalchemy.and_(
+                        via(sql.CheckResult.release_name) == mapping.c.source_release_name,
+                        via(sql.CheckResult.revision_number) == mapping.c.source_revision_number,
+                        via(sql.CheckResult.primary_rel_path) == mapping.c.source_primary_rel_path,
+                        via(sql.CheckResult.checker) == mapping.c.checker,
+                    ),
+                )
+                .order_by(via(sql.CheckResult.id))
+            )
+            copy_result = await data.execute(sqlalchemy.insert(sql.CheckResult).from_select(_COPY_COLUMNS, copy_select))
+            copied += copy_result.rowcount if isinstance(copy_result, sqlalchemy.CursorResult) else 0
+        if caller_data is None:
+            await data.commit()
+    return copied
+
+
 def with_model(cls: type[schema.Strict]) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
     """Decorator to specify the parameters for a check."""
 
@@ -332,9 +735,30 @@ def with_model(cls: type[schema.Strict]) -> Callable[[Callable[..., Any]], Calla
     return decorator
 
 
-async def _compute_file_hash(path: pathlib.Path) -> str:
-    hasher = blake3.blake3()
-    async with aiofiles.open(path, "rb") as f:
-        while chunk := await f.read(_HASH_CHUNK_SIZE):
-            hasher.update(chunk)
-    return f"blake3:{hasher.hexdigest()}"
+async def _recorders_flush(recorders: list[Recorder]) -> None:
+    for recorder in recorders:
+        await recorder.flush()
+
+
+def _results_copy_rows(
+    copies: Collection[tuple[sql.Task, sql.Task, Collection[str]]],
+) -> list[tuple[str, str, str, str, str, str, str]]:
+    rows: set[tuple[str, str, str, str, str, str, str]] = set()
+    for source, target, checkers in copies:
+        source_names = (source.project_name, source.version_name, source.revision_number, source.primary_rel_path)
+        target_names = (target.project_name, target.version_name, target.revision_number, target.primary_rel_path)
+        if (None in source_names) or (None in target_names):
+            continue
+        for checker in checkers:
+            rows.add(
+                (
+                    sql.release_name(util.unwrap(source.project_name), util.unwrap(source.version_name)),
+                    util.unwrap(source.revision_number),
+                    util.unwrap(source.primary_rel_path),
+                    checker,
+                    sql.release_name(util.unwrap(target.project_name), util.unwrap(target.version_name)),
+                    util.unwrap(target.revision_number),
+                    util.unwrap(target.primary_rel_path),
+                )
+            )
+    return sorted(rows)
@@ -0,0 +1,74 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+from collections.abc import Awaitable, Callable
+from typing import Any, Final
+
+import atr.log as log
+import atr.models.results as results
+import atr.tasks.checks as checks
+import atr.tasks.checks.license as license
+import atr.tasks.checks.targz as targz
+import atr.tasks.checks.zipformat as zipformat
+
+# The member-level checkers of each archive format, with the functions which prepare their visitors
+_TAR_CHECKERS: Final[list[tuple[Callable[..., Any], Callable[..., Awaitable[checks.ArchiveVisitor | None]]]]] = [
+    (license.files, license.files_visitor),
+    (license.headers, license.headers_visitor),
+    (targz.integrity, targz.integrity_visitor),
+    (targz.structure, targz.structure_visitor),
+]
+_ZIP_CHECKERS: Final[list[tuple[Callable[..., Any], Callable[..., Awaitable[checks.ArchiveVisitor | None]]]]] = [
+    (license.files, license.files_visitor),
+    (license.headers, license.headers_visitor),
+    (zipformat.integrity, zipformat.integrity_visitor),
+    (zipformat.structure, zipformat.structure_visitor),
+]
+
+
+def checkers() -> list[str]:
+    """Return the keys of the checkers whose results an archive scan records."""
+    functions = [checker for checker, _visitor in [*_TAR_CHECKERS, *_ZIP_CHECKERS]]
+    return sorted({checks.function_key(function) for function in functions})
+
+
+async def scan(args: checks.FunctionArguments) -> results.Results | None:
+    """Run all of the member-level checks of an archive, decompressing the archive only once."""
+    recorder = await args.recorder()
+    if not (artifact_abs_path := await recorder.abs_path()):
+        return None
+
+    archive_checkers = _ZIP_CHECKERS if artifact_abs_path.name.endswith(".zip") else _TAR_CHECKERS
+    prepared: list[tuple[checks.Recorder, checks.ArchiveVisitor]] = []
+    for checker, visitor_prepare in archive_checkers:
+        # Each checker keeps its own recorder, so results are recorded as if each checker had its own task
+        checker_recorder = await checks.Recorder.create(
+            checker=checker,
+            project_name=args.project_name,
+            version_name=args.version_name,
+            revision_number=args.revision_number,
+            primary_rel_path=args.primary_rel_path,
+        )
+        if await checker_recorder.check_cache(args):
+            log.info(f"Using cached {checker_recorder.checker} results for {args.primary_rel_path}")
+            continue
+        if visitor := await visitor_prepare(checker_recorder, args, artifact_abs_path):
+            prepared.append((checker_recorder, visitor))
+
+    if prepared:
+        await checks.archive_scan(artifact_abs_path, prepared)
+    return None
@@ -15,16 +15,19 @@
 # specific language governing permissions and limitations
 # under the License.
 
-import hashlib
+import pathlib
 import secrets
 
 import aiofiles
 
+import atr.hashes as hashes
 import atr.log as log
 import atr.models.results as results
 import atr.tasks.checks as checks
 
 
+# The artifact which a hash file names is read as well as the hash file
+@checks.cached(version=1, named=True, inputs=lambda rel_path: [str(pathlib.PurePosixPath(rel_path).with_suffix(""))])
 async def check(args: checks.FunctionArguments) -> results.Results | None:
     """Check the hash of a file."""
     recorder = await args.recorder()
@@ -48,13 +51,8 @@ async def check(args: checks.FunctionArguments) -> results.Results | None:
         f"Checking hash ({algorithm}) for {artifact_abs_path} against {hash_abs_path} (rel: {args.primary_rel_path})"
     )
 
-    hash_func = hashlib.sha256 if (algorithm == "sha256") else hashlib.sha512
-    hash_obj = hash_func()
     try:
-        async with aiofiles.open(artifact_abs_path, mode="rb") as f:
-            while chunk := await f.read(4096):
-                hash_obj.update(chunk)
-        computed_hash = hash_obj.hexdigest()
+        computed_hash = await hashes.async_digest(artifact_abs_path, algorithm)
 
         async with aiofiles.open(hash_abs_path) as f:
             expected_hash = await f.read()
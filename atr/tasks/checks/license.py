@@ -15,15 +15,15 @@
 # specific language governing permissions and limitations
 # under the License.
 
-import asyncio
 import difflib
 import hashlib
 import os
 import pathlib
 import re
 from collections.abc import Iterator
-from typing import Any, Final
+from typing import Any, Final, Self
 
+import atr.archives as archives
 import atr.constants as constants
 import atr.log as log
 import atr.models.results as results
@@ -48,6 +48,10 @@ HTTP_APACHE_LICENSE_HEADER: Final[bytes] = (
 
 HTTPS_APACHE_LICENSE_HEADER: Final[bytes] = HTTP_APACHE_LICENSE_HEADER.replace(b" http ", b" https ")
 
+# Allow for some extra content at the start of a source file before its license header
+# That may be shebangs, encoding declarations, etc.
+HEADERS_CONTENT_LIMIT: Final[int] = 4096
+
 # Patterns for files to include in license header checks
 # Ordered by their popularity in the Stack Overflow Developer Survey 2024
 INCLUDED_PATTERNS: Final[list[str]] = [
@@ -96,6 +100,165 @@ class ArtifactResult(schema.Strict):
     data: Any = schema.Field(default=None)
 
 
+type Result = ArtifactResult | MemberResult | MemberSkippedResult
+
+
+class FilesVisitor:
+    """Check the LICENSE, NOTICE, and DISCLAIMER files in the root directory of an archive."""
+
+    metadata_only = False
+    read_all = False
+
+    def __init__(self, is_podling: bool) -> None:
+        self.is_podling = is_podling
+        self.license_results: dict[str, str | None] = {}
+        self.notice_results: dict[str, tuple[bool, list[str], str]] = {}
+        self.disclaimer_found = False
+        self.error: Exception | None = None
+
+    def content_limit(self, member: tarzip.MemberInfo) -> int:
+        if _files_root_filename(member) in {"LICENSE", "NOTICE"}:
+            return archives.SCAN_CONTENT_ALL
+        return 0
+
+    def finish(self, error: Exception | None) -> None:
+        self.error = error
+
+    async def record(self, recorder: checks.Recorder) -> None:
+        try:
+            for result in self.results():
+                await _record_result(recorder, result)
+        except Exception as e:
+            log.exception("Error during license file check execution:")
+            await recorder.exception("Error during license file check execution", {"error": str(e)})
+
+    def merge(self, shard: Self) -> None:
+        self.license_results.update(shard.license_results)
+        self.notice_results.update(shard.notice_results)
+        self.disclaimer_found = self.disclaimer_found or shard.disclaimer_found
+
+    def results(self) -> Iterator[Result]:
+        if isinstance(self.error, tarzip.ArchiveMemberLimitExceededError):
+            yield ArtifactResult(
+                status=sql.CheckResultStatus.FAILURE,
+                message=f"Archive has too many members: {self.error}",
+                data={"error": str(self.error)},
+            )
+            return
+        if self.error is not None:
+            raise self.error
+
+        yield from _license_results(self.license_results)
+        yield from _notice_results(self.notice_results)
+        if self.is_podling and (not self.disclaimer_found):
+            yield ArtifactResult(
+                status=sql.CheckResultStatus.FAILURE,
+                message="No DISCLAIMER or DISCLAIMER-WIP file found",
+                data=None,
+            )
+
+    def visit(self, member: tarzip.MemberInfo, content: bytes | None) -> None:
+        filename = _files_root_filename(member)
+        if filename == "LICENSE":
+            # TODO: Check length, should be 11,358 bytes
+            self.license_results[filename] = _files_check_core_logic_license(content)
+        elif filename == "NOTICE":
+            # TODO: Check length doesn't exceed some preset
+            self.notice_results[filename] = _files_check_core_logic_notice(content)
+        elif filename in {"DISCLAIMER", "DISCLAIMER-WIP"}:
+            self.disclaimer_found = True
+
+
+class HeadersVisitor:
+    """Check the Apache License headers of the source files in an archive."""
+
+    metadata_only = False
+    read_all = False
+
+    def __init__(self, artifact_basename: str, ignore_lines: list[str], excludes_source: str) -> None:
+        self.artifact_basename = artifact_basename
+        self.ignore_lines = ignore_lines
+        self.artifact_data = ArtifactData(excludes_source=excludes_source)
+        self.member_results: list[MemberResult] = []
+        self.error: Exception | None = None
+
+    def content_limit(self, member: tarzip.MemberInfo) -> int:
+        if (not member.isfile()) or (not _headers_check_core_logic_should_check(member.name)):
+            return 0
+        if _headers_ignored(member, self.artifact_basename, self.ignore_lines):
+            return 0
+        return HEADERS_CONTENT_LIMIT
+
+    def finish(self, error: Exception | None) -> None:
+        self.error = error
+
+    async def record(self, recorder: checks.Recorder) -> None:
+        try:
+            for result in self.results():
+                await _record_result(recorder, result)
+            member_failures = recorder.member_problems.get(sql.CheckResultStatus.FAILURE, 0)
+            if member_failures > 0:
+                await recorder.failure(
+                    f"Some files had invalid license headers ({member_failures} failures)",
+                    None,
+                )
+
+        except Exception as e:
+            await recorder.exception("Error during license header check execution", {"error": str(e)})
+
+    def merge(self, shard: Self) -> None:
+        self.member_results.extend(shard.member_results)
+        self.artifact_data.files_checked += shard.artifact_data.files_checked
+        self.artifact_data.files_with_valid_headers += shard.artifact_data.files_with_valid_headers
+        self.artifact_data.files_with_invalid_headers += shard.artifact_data.files_with_invalid_headers
+        self.artifact_data.files_skipped += shard.artifact_data.files_skipped
+
+    def results(self) -> Iterator[Result]:
+        yield from self.member_results
+        if isinstance(self.error, tarzip.ArchiveMemberLimitExceededError):
+            yield ArtifactResult(
+                status=sql.CheckResultStatus.FAILURE,
+                message=f"Archive has too many members: {self.error}",
+                data={"error": str(self.error)},
+            )
+            return
+        if self.error is not None:
+            raise self.error
+
+        artifact_data = self.artifact_data
+        yield ArtifactResult(
+            status=sql.CheckResultStatus.SUCCESS,
+            message=f"Checked {util.plural(artifact_data.files_checked, 'file')},"
+            f" found {artifact_data.files_with_valid_headers} with valid headers,"
+            f" {artifact_data.files_with_invalid_headers} with invalid headers,"
+            f" and {artifact_data.files_skipped} skipped",
+            data=artifact_data.model_dump(),
+        )
+
+    def visit(self, member: tarzip.MemberInfo, content: bytes | None) -> None:
+        # Ignored members are not counted as skipped either
+        if _headers_ignored(member, self.artifact_basename, self.ignore_lines):
+            return
+
+        match _headers_check_core_logic_process_file(member, content):
+            case MemberResult() as result:
+                self.artifact_data.files_checked += 1
+                match result.status:
+                    case sql.CheckResultStatus.SUCCESS:
+                        self.artifact_data.files_with_valid_headers += 1
+                    case sql.CheckResultStatus.FAILURE:
+                        self.artifact_data.files_with_invalid_headers += 1
+                    case sql.CheckResultStatus.WARNING:
+                        self.artifact_data.files_with_invalid_headers += 1
+                    case sql.CheckResultStatus.EXCEPTION:
+                        self.artifact_data.files_with_invalid_headers += 1
+                self.member_results.append(result)
+            case MemberSkippedResult():
+                self.artifact_data.files_skipped += 1
+            case ArtifactResult():
+                pass
+
+
 # class LicenseCheckResult(schema.Strict):
 #     files_checked: list[str]
 #     files_with_valid_headers: int
@@ -117,17 +280,28 @@ class MemberSkippedResult(schema.Strict):
     reason: str
 
 
-type Result = ArtifactResult | MemberResult | MemberSkippedResult
-
 # Tasks
 
 
+@checks.cached(
+    version=1,
+    policy=("policy_binary_artifact_paths", "policy_license_check_mode"),
+    arguments=("is_podling",),
+)
 async def files(args: checks.FunctionArguments) -> results.Results | None:
     """Check that the LICENSE and NOTICE files exist and are valid."""
     recorder = await args.recorder()
     if not (artifact_abs_path := await recorder.abs_path()):
         return None
+    if visitor := await files_visitor(recorder, args, artifact_abs_path):
+        await checks.archive_scan(artifact_abs_path, [(recorder, visitor)])
+    return None
+
 
+async def files_visitor(
+    recorder: checks.Recorder, args: checks.FunctionArguments, artifact_abs_path: pathlib.Path
+) -> FilesVisitor | None:
+    """Prepare the license files check of an archive for an archive scan, unless it does not apply."""
     is_binary = await recorder.primary_path_is_binary()
     if not is_binary:
         project = await recorder.project()
@@ -135,55 +309,27 @@ async def files(args: checks.FunctionArguments) -> results.Results | None:
             return None
 
     log.info(f"Checking license files for {artifact_abs_path} (rel: {args.primary_rel_path})")
-
-    try:
-        is_podling = args.extra_args.get("is_podling", False)
-        for result in await asyncio.to_thread(_files_check_core_logic, str(artifact_abs_path), is_podling):
-            match result:
-                case ArtifactResult():
-                    await _record_artifact(recorder, result)
-                case MemberResult():
-                    await _record_member(recorder, result)
-                case MemberSkippedResult():
-                    pass
-
-    except Exception as e:
-        log.exception("Error during license file check execution:")
-        await recorder.exception("Error during license file check execution", {"error": str(e)})
-
-    return None
-
-
+    return FilesVisitor(args.extra_args.get("is_podling", False))
+
+
+@checks.cached(
+    version=1,
+    policy=(
+        "policy_binary_artifact_paths",
+        "policy_license_check_mode",
+        "policy_source_artifact_paths",
+        "policy_source_excludes_lightweight",
+    ),
+    named=True,
+)
 async def headers(args: checks.FunctionArguments) -> results.Results | None:
     """Check that all source files have valid license headers."""
     recorder = await args.recorder()
     if not (artifact_abs_path := await recorder.abs_path()):
         return None
-
-    is_binary = await recorder.primary_path_is_binary()
-    if not is_binary:
-        project = await recorder.project()
-        if project.policy_license_check_mode == sql.LicenseCheckMode.RAT:
-            return None
-
-    if await recorder.check_cache(artifact_abs_path):
-        log.info(f"Using cached license headers result for {artifact_abs_path} (rel: {args.primary_rel_path})")
-        return None
-
-    log.info(f"Checking license headers for {artifact_abs_path} (rel: {args.primary_rel_path})")
-
-    is_source = await recorder.primary_path_is_source()
-    project = await recorder.project()
-
-    ignore_lines: list[str] = []
-    excludes_source: str
-    if is_source:
-        ignore_lines = project.policy_source_excludes_lightweight
-        excludes_source = "policy" if ignore_lines else "none"
-    else:
-        excludes_source = "none"
-
-    return await _headers_core(recorder, str(artifact_abs_path), ignore_lines, excludes_source)
+    if visitor := await headers_visitor(recorder, args, artifact_abs_path):
+        await checks.archive_scan(artifact_abs_path, [(recorder, visitor)])
+    return None
 
 
 def headers_validate(content: bytes, _filename: str) -> tuple[bool, str | None]:
@@ -214,57 +360,42 @@ def headers_validate(content: bytes, _filename: str) -> tuple[bool, str | None]:
     return False, "Could not find Apache License header"
 
 
-def _files_check_core_logic(artifact_path: str, is_podling: bool) -> Iterator[Result]:
-    """Verify that LICENSE and NOTICE files exist and are placed and formatted correctly."""
-    license_results: dict[str, str | None] = {}
-    notice_results: dict[str, tuple[bool, list[str], str]] = {}
-    disclaimer_found = False
+async def headers_visitor(
+    recorder: checks.Recorder, args: checks.FunctionArguments, artifact_abs_path: pathlib.Path
+) -> HeadersVisitor | None:
+    """Prepare the license headers check of an archive for an archive scan, unless it does not apply."""
+    is_binary = await recorder.primary_path_is_binary()
+    if not is_binary:
+        project = await recorder.project()
+        if project.policy_license_check_mode == sql.LicenseCheckMode.RAT:
+            return None
 
-    # Check for license files in the root directory
-    try:
-        with tarzip.open_archive(artifact_path) as archive:
-            for member in archive:
-                if member.name and member.name.split("/")[-1].startswith("._"):
-                    # Metadata convention
-                    continue
-
-                if member.name.count("/") > 1:
-                    # Skip files in subdirectories
-                    continue
-
-                filename = os.path.basename(member.name)
-                if filename == "LICENSE":
-                    # TODO: Check length, should be 11,358 bytes
-                    license_diff = _files_check_core_logic_license(archive, member)
-                    license_results[filename] = license_diff
-                elif filename == "NOTICE":
-                    # TODO: Check length doesn't exceed some preset
-                    notice_ok, notice_issues, notice_preamble = _files_check_core_logic_notice(archive, member)
-                    notice_results[filename] = (notice_ok, notice_issues, notice_preamble)
-                elif filename in {"DISCLAIMER", "DISCLAIMER-WIP"}:
-                    disclaimer_found = True
-    except tarzip.ArchiveMemberLimitExceededError as e:
-        yield ArtifactResult(
-            status=sql.CheckResultStatus.FAILURE,
-            message=f"Archive has too many members: {e}",
-            data={"error": str(e)},
-        )
-        return
+    log.info(f"Checking license headers for {artifact_abs_path} (rel: {args.primary_rel_path})")
 
-    yield from _license_results(license_results)
-    yield from _notice_results(notice_results)
-    if is_podling and (not disclaimer_found):
-        yield ArtifactResult(
-            status=sql.CheckResultStatus.FAILURE,
-            message="No DISCLAIMER or DISCLAIMER-WIP file found",
-            data=None,
-        )
+    is_source = await recorder.primary_path_is_source()
+    project = await recorder.project()
+
+    ignore_lines: list[str] = []
+    excludes_source: str
+    if is_source:
+        ignore_lines = project.policy_source_excludes_lightweight
+        excludes_source = "policy" if ignore_lines else "none"
+    else:
+        excludes_source = "none"
 
+    return HeadersVisitor(artifact_abs_path.name, ignore_lines, excludes_source)
 
-def _files_check_core_logic_license(archive: tarzip.Archive, member: tarzip.Member) -> str | None:
+
+def _files_check_core_logic(artifact_path: str, is_podling: bool) -> Iterator[Result]:
+    """Verify that LICENSE and NOTICE files exist and are placed and formatted correctly."""
+    visitor = FilesVisitor(is_podling)
+    archives.scan(artifact_path, [visitor])
+    yield from visitor.results()
+
+
+def _files_check_core_logic_license(content: bytes | None) -> str | None:
     """Verify that the start of the LICENSE file matches the Apache 2.0 license."""
-    f = archive.extractfile(member)
-    if not f:
+    if content is None:
         return None
 
     sha3e = hashlib.sha3_256()
@@ -274,8 +405,7 @@ def _files_check_core_logic_license(archive: tarzip.Archive, member: tarzip.Memb
     if sha3_expected != "5efa4839f385df309ffc022ca5ce9763c4bc709dab862ca77d9a894db6598456":
         log.error("SHA3 expected value is incorrect, please update the static.LICENSE constant")
 
-    package_license_bytes = f.read()
-    package_license = package_license_bytes.decode("utf-8", errors="replace")
+    package_license = content.decode("utf-8", errors="replace")
 
     # Some whitespace variations are permitted:
     # - Any form of leading or trailing whitespace
@@ -296,20 +426,19 @@ def _files_check_core_logic_license(archive: tarzip.Archive, member: tarzip.Memb
     return None
 
 
-def _files_check_core_logic_notice(archive: tarzip.Archive, member: tarzip.Member) -> tuple[bool, list[str], str]:
+def _files_check_core_logic_notice(content: bytes | None) -> tuple[bool, list[str], str]:
     """Verify that the NOTICE file follows the required format."""
-    f = archive.extractfile(member)
-    if not f:
+    if content is None:
         return False, ["the NOTICE file is missing or could not be read"], ""
 
     try:
-        content = f.read().decode("utf-8")
+        text = content.decode("utf-8")
     except UnicodeDecodeError:
         return False, ["the NOTICE file is not valid UTF-8"], ""
-    preamble = "".join(content.splitlines(keepends=True)[:3])
+    preamble = "".join(text.splitlines(keepends=True)[:3])
     issues = []
 
-    normalised = re.sub(r"\s+", " ", content)
+    normalised = re.sub(r"\s+", " ", text)
     if not re.search(r"Apache [\w\-\.]+", normalised):
         issues.append("missing or invalid Apache product header")
     if not re.search(r"Copyright (\d{4}|\d{4}-\d{4}) The Apache Software Foundation", normalised):
@@ -320,6 +449,17 @@ def _files_check_core_logic_notice(archive: tarzip.Archive, member: tarzip.Membe
     return len(issues) == 0, issues, preamble
 
 
+def _files_root_filename(member: tarzip.MemberInfo) -> str | None:
+    """Return the filename of a member in the root directory of an archive, or None for any other member."""
+    if member.name and member.name.split("/")[-1].startswith("._"):
+        # Metadata convention
+        return None
+    if member.name.count("/") > 1:
+        # Skip files in subdirectories
+        return None
+    return os.path.basename(member.name)
+
+
 def _get_file_extension(filename: str) -> str | None:
     """Get the file extension without the dot."""
     _, ext = os.path.splitext(filename)
@@ -328,78 +468,16 @@ def _get_file_extension(filename: str) -> str | None:
     return ext[1:].lower()
 
 
-def _headers_check_core_logic(artifact_path: str, ignore_lines: list[str], excludes_source: str) -> Iterator[Result]:  # noqa: C901
+def _headers_check_core_logic(artifact_path: str, ignore_lines: list[str], excludes_source: str) -> Iterator[Result]:
     """Verify Apache License headers in source files within an archive."""
     # We could modify @Lucas-C/pre-commit-hooks instead for this
     # But hopefully this will be robust enough, at least for testing
-    # First find and validate the root directory
-    artifact_data = ArtifactData(excludes_source=excludes_source)
-
-    # try:
-    #     targz.root_directory(artifact_path)
-    # except targz.RootDirectoryError as e:
-    #     # Tooling believes that this should be a warning, not an error
-    #     yield ArtifactResult(
-    #         status=models.CheckResultStatus.WARNING,
-    #         message=f"Could not determine root directory: {e!s}",
-    #         data=None,
-    #     )
-
-    artifact_basename = os.path.basename(artifact_path)
-    # log.info(f"Ignore lines: {ignore_lines}")
-
-    # Check files in the archive
-    try:
-        with tarzip.open_archive(artifact_path) as archive:
-            for member in archive:
-                if member.name and member.name.split("/")[-1].startswith("._"):
-                    # Metadata convention
-                    continue
-
-                ignore_path = "/" + artifact_basename + "/" + member.name.lstrip("/")
-                matcher = util.create_path_matcher(ignore_lines, pathlib.Path(ignore_path), pathlib.Path("/"))
-                # log.info(f"Checking {ignore_path} with matcher {matcher}")
-                if matcher(ignore_path):
-                    # log.info(f"Skipping {ignore_path} because it matches the ignore list")
-                    continue
-
-                match _headers_check_core_logic_process_file(archive, member):
-                    case ArtifactResult() | MemberResult() as result:
-                        artifact_data.files_checked += 1
-                        match result.status:
-                            case sql.CheckResultStatus.SUCCESS:
-                                artifact_data.files_with_valid_headers += 1
-                            case sql.CheckResultStatus.FAILURE:
-                                artifact_data.files_with_invalid_headers += 1
-                            case sql.CheckResultStatus.WARNING:
-                                artifact_data.files_with_invalid_headers += 1
-                            case sql.CheckResultStatus.EXCEPTION:
-                                artifact_data.files_with_invalid_headers += 1
-                        yield result
-                    case MemberSkippedResult():
-                        artifact_data.files_skipped += 1
-    except tarzip.ArchiveMemberLimitExceededError as e:
-        yield ArtifactResult(
-            status=sql.CheckResultStatus.FAILURE,
-            message=f"Archive has too many members: {e}",
-            data={"error": str(e)},
-        )
-        return
+    visitor = HeadersVisitor(os.path.basename(artifact_path), ignore_lines, excludes_source)
+    archives.scan(artifact_path, [visitor])
+    yield from visitor.results()
 
-    yield ArtifactResult(
-        status=sql.CheckResultStatus.SUCCESS,
-        message=f"Checked {util.plural(artifact_data.files_checked, 'file')},"
-        f" found {artifact_data.files_with_valid_headers} with valid headers,"
-        f" {artifact_data.files_with_invalid_headers} with invalid headers,"
-        f" and {artifact_data.files_skipped} skipped",
-        data=artifact_data.model_dump(),
-    )
 
-
-def _headers_check_core_logic_process_file(
-    archive: tarzip.Archive,
-    member: tarzip.Member,
-) -> Result:
+def _headers_check_core_logic_process_file(member: tarzip.MemberInfo, content: bytes | None) -> Result:
     """Process a single file in an archive for license header verification."""
     if not member.isfile():
         return MemberSkippedResult(
@@ -414,20 +492,15 @@ def _headers_check_core_logic_process_file(
             reason="Not a source file",
         )
 
-    # Extract and check the file
-    try:
-        f = archive.extractfile(member)
-        if f is None:
-            return MemberResult(
-                status=sql.CheckResultStatus.EXCEPTION,
-                path=member.name,
-                message="Could not read file",
-                data=None,
-            )
+    if content is None:
+        return MemberResult(
+            status=sql.CheckResultStatus.EXCEPTION,
+            path=member.name,
+            message="Could not read file",
+            data=None,
+        )
 
-        # Allow for some extra content at the start of the file
-        # That may be shebangs, encoding declarations, etc.
-        content = f.read(4096)
+    try:
         is_valid, error = headers_validate(content, member.name)
         if is_valid:
             return MemberResult(
@@ -469,31 +542,15 @@ def _headers_check_core_logic_should_check(filepath: str) -> bool:
     return False
 
 
-async def _headers_core(
-    recorder: checks.Recorder, artifact_abs_path: str, ignore_lines: list[str], excludes_source: str
-) -> None:
-    try:
-        for result in await asyncio.to_thread(
-            _headers_check_core_logic, str(artifact_abs_path), ignore_lines, excludes_source
-        ):
-            match result:
-                case ArtifactResult():
-                    await _record_artifact(recorder, result)
-                case MemberResult():
-                    await _record_member(recorder, result)
-                case MemberSkippedResult():
-                    pass
-        member_failures = recorder.member_problems.get(sql.CheckResultStatus.FAILURE, 0)
-        if member_failures > 0:
-            await recorder.failure(
-                f"Some files had invalid license headers ({member_failures} failures)",
-                None,
-            )
+def _headers_ignored(member: tarzip.MemberInfo, artifact_basename: str, ignore_lines: list[str]) -> bool:
+    """Determine whether a member is excluded from license header checks altogether."""
+    if member.name and member.name.split("/")[-1].startswith("._"):
+        # Metadata convention
+        return True
 
-    except Exception as e:
-        await recorder.exception("Error during license header check execution", {"error": str(e)})
-
-    return None
+    ignore_path = "/" + artifact_basename + "/" + member.name.lstrip("/")
+    matcher = util.create_path_matcher(ignore_lines, pathlib.Path(ignore_path), pathlib.Path("/"))
+    return matcher(ignore_path)
 
 
 def _license_results(
@@ -601,3 +658,13 @@ async def _record_member(recorder: checks.Recorder, result: MemberResult) -> Non
             await recorder.failure(result.message, result.data, member_rel_path=result.path)
         case sql.CheckResultStatus.EXCEPTION:
             await recorder.exception(result.message, result.data, member_rel_path=result.path)
+
+
+async def _record_result(recorder: checks.Recorder, result: Result) -> None:
+    match result:
+        case ArtifactResult():
+            await _record_artifact(recorder, result)
+        case MemberResult():
+            await _record_member(recorder, result)
+        case MemberSkippedResult():
+            pass
@@ -16,20 +16,23 @@
 # under the License.
 
 import asyncio
+import itertools
 import os
 import pathlib
 import subprocess
 import tempfile
 import xml.etree.ElementTree as ElementTree
+from collections.abc import Iterator
 from typing import Final
 
-import atr.archives as archives
 import atr.config as config
 import atr.constants as constants
+import atr.extracts as extracts
 import atr.log as log
 import atr.models.checkdata as checkdata
 import atr.models.results as results
 import atr.models.sql as sql
+import atr.ratservice as ratservice
 import atr.tasks.checks as checks
 import atr.util as util
 
@@ -44,6 +47,9 @@ _JAVA_MEMORY_ARGS: Final[list[str]] = [
 # Generated file patterns, always excluded
 _GENERATED_FILE_PATTERNS: Final[list[str]] = [f"**/*{s}" for s in constants.GENERATED_FILE_SUFFIXES]
 
+# The number of files of each kind that we report
+_MAX_REPORTED_FILES: Final[int] = 100
+
 # The name of the temp file for excludes defined in release policies
 _POLICY_EXCLUDES_FILENAME: Final[str] = ".atr-policy-rat-excludes"
 
@@ -53,6 +59,9 @@ _RAT_EXCLUDES_FILENAME: Final[str] = ".rat-excludes"
 # The name of the RAT report file
 _RAT_REPORT_FILENAME: Final[str] = ".atr-rat-report.xml"
 
+# The time that a RAT report may take, which is five minutes
+_RAT_TIMEOUT_SECONDS: Final[int] = 300
+
 # Standard exclusions, always applied explicitly
 _STD_EXCLUSIONS_ALWAYS: Final[list[str]] = ["MISC", "HIDDEN_DIR", "MAC"]
 
@@ -70,6 +79,15 @@ class RatError(RuntimeError):
     pass
 
 
+@checks.cached(
+    version=1,
+    policy=(
+        "policy_binary_artifact_paths",
+        "policy_license_check_mode",
+        "policy_source_artifact_paths",
+        "policy_source_excludes_rat",
+    ),
+)
 async def check(args: checks.FunctionArguments) -> results.Results | None:
     """Use Apache RAT to check the licenses of the files in the artifact."""
     recorder = await args.recorder()
@@ -84,10 +102,6 @@ async def check(args: checks.FunctionArguments) -> results.Results | None:
         log.info(f"Skipping RAT check for {artifact_abs_path} (mode is LIGHTWEIGHT)")
         return None
 
-    if await recorder.check_cache(artifact_abs_path):
-        log.info(f"Using cached RAT result for {artifact_abs_path} (rel: {args.primary_rel_path})")
-        return None
-
     log.info(f"Checking RAT licenses for {artifact_abs_path} (rel: {args.primary_rel_path})")
 
     is_source = await recorder.primary_path_is_source()
@@ -164,11 +178,14 @@ async def _check_core(
         chunk_size=args.extra_args.get("chunk_size", _CONFIG.EXTRACT_CHUNK_SIZE),
     )
 
-    # Record individual file failures before the overall result
-    for file in result.unknown_license_files:
-        await recorder.failure("Unknown license", None, member_rel_path=file.name)
-    for file in result.unapproved_files:
-        await recorder.failure("Unapproved license", {"license": file.license}, member_rel_path=file.name)
+    # Record individual file failures before the overall result, in batches rather than one transaction each
+    await recorder.members(
+        sql.CheckResultStatus.FAILURE,
+        itertools.chain(
+            (("Unknown license", None, file.name) for file in result.unknown_license_files),
+            (("Unapproved license", {"license": file.license}, file.name) for file in result.unapproved_files),
+        ),
+    )
 
     # Convert to dict for storage, excluding the file lists, which are already recorded
     result_data = result.model_dump(exclude={"unapproved_files", "unknown_license_files"})
@@ -188,29 +205,32 @@ def _check_core_logic_execute_rat(
     xml_output_path: str,
 ) -> tuple[checkdata.Rat | None, str | None]:
     """Execute Apache RAT and process its output."""
-    # Change working directory to scan_root when running the process
-    current_dir = os.getcwd()
-    os.chdir(scan_root)
+    if _CONFIG.APACHE_RAT_SERVICE:
+        try:
+            return _check_core_logic_execute_rat_service(command, scan_root, temp_dir, xml_output_path)
+        except OSError as e:
+            log.warning(f"Apache RAT service is not reachable, starting a JVM for this check instead: {e}")
 
-    log.info(f"Executing Apache RAT from directory: {os.getcwd()}")
+    # The working directory is given to the process rather than changed here
+    # Other tasks run in threads of the same worker process, and they share its working directory
+    log.info(f"Executing Apache RAT from directory: {scan_root}")
 
     try:
         # Run the actual RAT command
         # We do check=False because we'll handle errors below
-        # The timeout is five minutes
         process = subprocess.run(
             command,
             capture_output=True,
             text=True,
             check=False,
-            timeout=300,
+            timeout=_RAT_TIMEOUT_SECONDS,
+            cwd=scan_root,
         )
 
         if process.returncode != 0:
             log.error(f"Apache RAT failed with return code {process.returncode}")
             log.error(f"STDOUT: {process.stdout}")
             log.error(f"STDERR: {process.stderr}")
-            os.chdir(current_dir)
             return checkdata.Rat(
                 message=f"Apache RAT process failed with code {process.returncode}",
                 errors=[
@@ -223,24 +243,49 @@ def _check_core_logic_execute_rat(
         log.info(f"Apache RAT completed successfully with return code {process.returncode}")
         log.info(f"stdout: {process.stdout[:200]}...")
     except subprocess.TimeoutExpired as e:
-        os.chdir(current_dir)
         log.error(f"Apache RAT process timed out: {e}")
         return checkdata.Rat(
             message="Apache RAT process timed out",
             errors=[f"Timeout: {e}"],
         ), None
     except Exception as e:
-        # Change back to the original directory before raising
-        os.chdir(current_dir)
         log.error(f"Exception running Apache RAT: {e}")
         return checkdata.Rat(
             message=f"Apache RAT process failed: {e}",
             errors=[f"Process error: {e}"],
         ), None
 
-    # Change back to the original directory
-    os.chdir(current_dir)
+    return _check_core_logic_xml_output(temp_dir, xml_output_path)
+
+
+def _check_core_logic_execute_rat_service(
+    command: list[str],
+    scan_root: str,
+    temp_dir: str,
+    xml_output_path: str,
+) -> tuple[checkdata.Rat | None, str | None]:
+    """Execute Apache RAT in the RAT service, raising OSError if the service is not reachable."""
+    log.info(f"Executing Apache RAT in the service for directory: {scan_root}")
+    try:
+        ratservice.report(_service_arguments(command, scan_root), _RAT_TIMEOUT_SECONDS)
+    except TimeoutError as e:
+        log.error(f"Apache RAT service timed out: {e}")
+        return checkdata.Rat(
+            message="Apache RAT process timed out",
+            errors=[f"Timeout: {e}"],
+        ), None
+    except ratservice.ReportError as e:
+        log.error(f"Apache RAT service failed: {e}")
+        return checkdata.Rat(
+            message="Apache RAT service failed",
+            errors=[f"Service error: {e}"],
+        ), None
+
+    log.info("Apache RAT service completed successfully")
+    return _check_core_logic_xml_output(temp_dir, xml_output_path)
 
+
+def _check_core_logic_xml_output(temp_dir: str, xml_output_path: str) -> tuple[checkdata.Rat | None, str | None]:
     # Check that the output file exists
     if not os.path.exists(xml_output_path):
         log.error(f"XML output file not found at: {xml_output_path}")
@@ -282,19 +327,21 @@ def _count_files_outside_directory(temp_dir: str, scan_root: str) -> int:
 
 
 def _get_command_and_xml_output_path(
-    temp_dir: str, excludes_file_path: str | None, apply_extended_std: bool, scan_root: str, rat_jar_path: str
+    work_dir: str, excludes_abs_path: str | None, apply_extended_std: bool, scan_root: str, rat_jar_path: str
 ) -> tuple[list[str], str]:
-    xml_output_path = os.path.join(temp_dir, _RAT_REPORT_FILENAME)
+    xml_output_path = os.path.join(work_dir, _RAT_REPORT_FILENAME)
     log.info(f"XML output will be written to: {xml_output_path}")
 
-    # Convert exclusion file path from temp_dir relative to scan_root relative
+    # Exclusion files inside the scan root are given relative to it, and others by absolute path
     excludes_file: str | None = None
-    if excludes_file_path is not None:
-        abs_path = os.path.join(temp_dir, excludes_file_path)
-        if not (os.path.exists(abs_path) and os.path.isfile(abs_path)):
-            log.error(f"Exclusion file not found or not a regular file: {abs_path}")
-            raise RatError(f"Exclusion file is not a regular file: {excludes_file_path}({abs_path})")
-        excludes_file = os.path.relpath(abs_path, scan_root)
+    if excludes_abs_path is not None:
+        if not (os.path.exists(excludes_abs_path) and os.path.isfile(excludes_abs_path)):
+            log.error(f"Exclusion file not found or not a regular file: {excludes_abs_path}")
+            raise RatError(f"Exclusion file is not a regular file: {excludes_abs_path}")
+        if _is_inside_directory(excludes_abs_path, scan_root):
+            excludes_file = os.path.relpath(excludes_abs_path, scan_root)
+        else:
+            excludes_file = excludes_abs_path
         log.info(f"Using exclusion file: {excludes_file}")
     command = _build_rat_command(rat_jar_path, xml_output_path, excludes_file, apply_extended_std)
     log.info(f"Running Apache RAT: {' '.join(command)}")
@@ -312,7 +359,7 @@ def _is_inside_directory(path: str, directory: str) -> bool:
 
 def _sanitise_command_for_storage(command: list[str]) -> list[str]:
     """Replace absolute paths with filenames for known arguments."""
-    path_args = {"-jar", "--output-file"}
+    path_args = {"-jar", "--input-exclude", "--input-exclude-file", "--output-file"}
     result: list[str] = []
     for i, arg in enumerate(command):
         if (i > 0) and (command[i - 1] in path_args) and os.path.isabs(arg):
@@ -322,6 +369,24 @@ def _sanitise_command_for_storage(command: list[str]) -> list[str]:
     return result
 
 
+def _service_arguments(command: list[str], scan_root: str) -> list[str]:
+    """Return the RAT arguments of a command, with the paths relative to the scan root made absolute.
+
+    The service does not run in the scan root, unlike a JVM started for a single check.
+    """
+    arguments = command[command.index("-jar") + 2 :]
+    result: list[str] = []
+    for i, argument in enumerate(arguments):
+        previous = arguments[i - 1] if (i > 0) else None
+        if (previous == "--") and (argument == "."):
+            result.append(scan_root)
+        elif (previous == "--input-exclude-file") and (not os.path.isabs(argument)):
+            result.append(os.path.join(scan_root, argument))
+        else:
+            result.append(argument)
+    return result
+
+
 def _summary_message(valid: bool, unapproved_licenses: int, unknown_licenses: int) -> str:
     message = "All files have approved licenses"
     if not valid:
@@ -354,15 +419,16 @@ def _synchronous(
     rat_jar_path, jar_error = _synchronous_check_jar_exists(rat_jar_path)
     if jar_error:
         return jar_error
+    # RAT runs in the directory that it scans, so a relative path to the JAR would no longer resolve
+    rat_jar_path = os.path.abspath(rat_jar_path)
 
     try:
-        # Create a temporary directory for extraction
-        # TODO: We could extract to somewhere in "state/" instead
-        with tempfile.TemporaryDirectory(prefix="rat_verify_") as temp_dir:
-            log.info(f"Created temporary directory: {temp_dir}")
-            return _synchronous_extract(
-                artifact_path, temp_dir, max_extract_size, chunk_size, policy_excludes, rat_jar_path
-            )
+        # The extracted tree is shared with other checks and is read only
+        # So the report and any policy excludes are written to a separate temporary directory
+        with extracts.extracted(artifact_path, max_extract_size, chunk_size) as tree_dir:
+            with tempfile.TemporaryDirectory(prefix="rat_verify_") as work_dir:
+                log.info(f"Created temporary directory: {work_dir}")
+                return _synchronous_extract(str(tree_dir), work_dir, policy_excludes, rat_jar_path)
     except Exception as e:
         import traceback
 
@@ -454,23 +520,12 @@ def _synchronous_check_java_installed() -> checkdata.Rat | None:
 
 
 def _synchronous_extract(
-    artifact_path: str,
-    temp_dir: str,
-    max_extract_size: int,
-    chunk_size: int,
+    tree_dir: str,
+    work_dir: str,
     policy_excludes: list[str],
     rat_jar_path: str,
 ) -> checkdata.Rat:
-    # Extract the archive to the temporary directory
-    log.info(f"Extracting {artifact_path} to {temp_dir}")
-    extracted_size, exclude_file_paths = archives.extract(
-        artifact_path,
-        temp_dir,
-        max_size=max_extract_size,
-        chunk_size=chunk_size,
-        track_files={_RAT_EXCLUDES_FILENAME},
-    )
-    log.info(f"Extracted {extracted_size} bytes")
+    exclude_file_paths = _synchronous_extract_rat_excludes(tree_dir)
     log.info(f"Found {len(exclude_file_paths)} {_RAT_EXCLUDES_FILENAME} file(s): {exclude_file_paths}")
 
     # Validate that we found at most one exclusion file
@@ -485,11 +540,11 @@ def _synchronous_extract(
     archive_excludes_path: str | None = exclude_file_paths[0] if exclude_file_paths else None
 
     excludes_source, effective_excludes_path = _synchronous_extract_excludes_source(
-        archive_excludes_path, policy_excludes, temp_dir
+        archive_excludes_path, policy_excludes, tree_dir, work_dir
     )
 
     try:
-        scan_root = _synchronous_extract_scan_root(archive_excludes_path, temp_dir)
+        scan_root = _synchronous_extract_scan_root(archive_excludes_path, tree_dir)
     except RatError as e:
         return checkdata.Rat(
             message=f"Failed to determine scan root: {e}",
@@ -502,14 +557,14 @@ def _synchronous_extract(
     apply_extended_std = excludes_source != "archive"
     try:
         command, xml_output_path = _get_command_and_xml_output_path(
-            temp_dir, effective_excludes_path, apply_extended_std, scan_root, rat_jar_path
+            work_dir, effective_excludes_path, apply_extended_std, scan_root, rat_jar_path
         )
     except RatError as e:
         return checkdata.Rat(
             message=f"Failed to build RAT command: {e}",
             errors=[str(e)],
         )
-    error_result, xml_output_path = _check_core_logic_execute_rat(command, scan_root, temp_dir, xml_output_path)
+    error_result, xml_output_path = _check_core_logic_execute_rat(command, scan_root, work_dir, xml_output_path)
     if error_result is not None:
         return error_result
 
@@ -524,7 +579,7 @@ def _synchronous_extract(
 
     # The unknown_license_files and unapproved_files contain FileEntry objects
     # The path is relative to scan_root, so we prepend the scan_root relative path
-    scan_root_rel = os.path.relpath(scan_root, temp_dir)
+    scan_root_rel = os.path.relpath(scan_root, tree_dir)
     if scan_root_rel != ".":
         for file in result.unknown_license_files:
             file.name = os.path.join(scan_root_rel, os.path.normpath(file.name))
@@ -538,22 +593,22 @@ def _synchronous_extract(
 
 
 def _synchronous_extract_excludes_source(
-    archive_excludes_path: str | None, policy_excludes: list[str], temp_dir: str
+    archive_excludes_path: str | None, policy_excludes: list[str], tree_dir: str, work_dir: str
 ) -> tuple[str, str | None]:
-    # Determine excludes_source and effective excludes file
+    # Determine excludes_source and the absolute path of the effective excludes file
     excludes_source: str
     effective_excludes_path: str | None
 
     if archive_excludes_path is not None:
         excludes_source = "archive"
-        effective_excludes_path = archive_excludes_path
+        effective_excludes_path = os.path.join(tree_dir, archive_excludes_path)
         log.info(f"Using archive {_RAT_EXCLUDES_FILENAME}: {archive_excludes_path}")
     elif policy_excludes:
         excludes_source = "policy"
-        policy_excludes_file = os.path.join(temp_dir, _POLICY_EXCLUDES_FILENAME)
+        policy_excludes_file = os.path.join(work_dir, _POLICY_EXCLUDES_FILENAME)
         with open(policy_excludes_file, "w") as f:
             f.write("\n".join(policy_excludes))
-        effective_excludes_path = os.path.relpath(policy_excludes_file, temp_dir)
+        effective_excludes_path = policy_excludes_file
         log.info(f"Using policy excludes written to: {policy_excludes_file}")
     else:
         excludes_source = "none"
@@ -576,9 +631,6 @@ def _synchronous_extract_parse_output(xml_file: str, base_dir: str) -> checkdata
 
 def _synchronous_extract_parse_output_core(xml_file: str, base_dir: str) -> checkdata.Rat:
     """Parse the XML output from Apache RAT."""
-    tree = ElementTree.parse(xml_file)
-    root = tree.getroot()
-
     total_files = 0
     approved_licenses = 0
     unapproved_licenses = 0
@@ -587,40 +639,19 @@ def _synchronous_extract_parse_output_core(xml_file: str, base_dir: str) -> chec
     unapproved_files: list[checkdata.RatFileEntry] = []
     unknown_license_files: list[checkdata.RatFileEntry] = []
 
-    # Process each resource
-    for resource in root.findall(".//resource"):
+    # Count every resource, but keep only the first few files of each kind
+    for entry in _synchronous_extract_parse_output_resources(xml_file, base_dir):
         total_files += 1
-
-        # Get the name attribute value
-        name = resource.get("name", "")
-
-        # Remove base_dir prefix for cleaner display
-        if name.startswith(base_dir):
-            name = name[len(base_dir) :].lstrip("/")
-
-        # Get license information
-        license_elem = resource.find("license")
-
-        if license_elem is None:
-            resource_type = resource.get("type", "")
-            if resource_type in {"NOTICE", "BINARY", "IGNORED", "ARCHIVE"}:
-                approved_licenses += 1
-            else:
-                unknown_licenses += 1
-                unknown_license_files.append(checkdata.RatFileEntry(name=name, license="Unknown license"))
+        if entry is None:
+            approved_licenses += 1
+        elif entry.license == "Unknown license":
+            unknown_licenses += 1
+            if len(unknown_license_files) < _MAX_REPORTED_FILES:
+                unknown_license_files.append(entry)
         else:
-            approval = license_elem.get("approval", "false")
-            is_approved = approval == "true"
-            license_name = license_elem.get("name", "Unknown")
-
-            if is_approved:
-                approved_licenses += 1
-            elif license_name == "Unknown license":
-                unknown_licenses += 1
-                unknown_license_files.append(checkdata.RatFileEntry(name=name, license=license_name))
-            else:
-                unapproved_licenses += 1
-                unapproved_files.append(checkdata.RatFileEntry(name=name, license=license_name))
+            unapproved_licenses += 1
+            if len(unapproved_files) < _MAX_REPORTED_FILES:
+                unapproved_files.append(entry)
 
     # Calculate overall validity
     valid = (unapproved_licenses == 0) and (unknown_licenses == 0)
@@ -628,7 +659,6 @@ def _synchronous_extract_parse_output_core(xml_file: str, base_dir: str) -> chec
     # Prepare a summary message of just the right length
     message = _summary_message(valid, unapproved_licenses, unknown_licenses)
 
-    # We limit the number of files we report to 100
     return checkdata.Rat(
         valid=valid,
         message=message,
@@ -636,11 +666,55 @@ def _synchronous_extract_parse_output_core(xml_file: str, base_dir: str) -> chec
         approved_licenses=approved_licenses,
         unapproved_licenses=unapproved_licenses,
         unknown_licenses=unknown_licenses,
-        unapproved_files=unapproved_files[:100],
-        unknown_license_files=unknown_license_files[:100],
+        unapproved_files=unapproved_files,
+        unknown_license_files=unknown_license_files,
     )
 
 
+def _synchronous_extract_parse_output_resources(
+    xml_file: str, base_dir: str
+) -> Iterator[checkdata.RatFileEntry | None]:
+    """Yield an entry for each resource in the XML output which is not approved, and None for each which is."""
+    # The report has an element for every file, so it is parsed incrementally and each element is dropped once read
+    parents: list[ElementTree.Element] = []
+    for event, element in ElementTree.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag != "resource":
+            continue
+
+        # Remove base_dir prefix for cleaner display
+        name = element.get("name", "")
+        if name.startswith(base_dir):
+            name = name[len(base_dir) :].lstrip("/")
+
+        license_elem = element.find("license")
+        if license_elem is None:
+            if element.get("type", "") in {"NOTICE", "BINARY", "IGNORED", "ARCHIVE"}:
+                yield None
+            else:
+                yield checkdata.RatFileEntry(name=name, license="Unknown license")
+        elif license_elem.get("approval", "false") == "true":
+            yield None
+        else:
+            yield checkdata.RatFileEntry(name=name, license=license_elem.get("name", "Unknown"))
+
+        element.clear()
+        if parents:
+            parents[-1].remove(element)
+
+
+def _synchronous_extract_rat_excludes(tree_dir: str) -> list[str]:
+    """Find the paths of the archive exclusion files in an extracted tree, relative to the tree."""
+    exclude_file_paths: list[str] = []
+    for root, _dirs, files in os.walk(tree_dir):
+        if _RAT_EXCLUDES_FILENAME in files:
+            exclude_file_paths.append(os.path.relpath(os.path.join(root, _RAT_EXCLUDES_FILENAME), tree_dir))
+    return sorted(exclude_file_paths)
+
+
 def _synchronous_extract_scan_root(archive_excludes_path: str | None, temp_dir: str) -> str:
     # Determine scan root based on archive .rat-excludes location
     if archive_excludes_path is not None:
@@ -16,14 +16,13 @@
 # under the License.
 
 import asyncio
-import tempfile
-import time
-from typing import Any, Final
+from typing import Any
 
 import gnupg
 import sqlmodel
 
 import atr.db as db
+import atr.keyrings as keyrings
 import atr.log as log
 import atr.models.results as results
 import atr.models.sql as sql
@@ -31,6 +30,13 @@ import atr.tasks.checks as checks
 import atr.util as util
 
 
+# The results depend on the keys of the committee as well as on the signature file and the artifact which it signs
+@checks.cached(
+    version=1,
+    arguments=("committee_name",),
+    inputs=lambda rel_path: [rel_path.removesuffix(".asc")],
+    context=lambda args: _cache_context(args),
+)
 async def check(args: checks.FunctionArguments) -> results.Results | None:
     """Check a signature file."""
     recorder = await args.recorder()
@@ -61,83 +67,130 @@ async def check(args: checks.FunctionArguments) -> results.Results | None:
             artifact_path=str(artifact_abs_path),
             signature_path=str(primary_abs_path),
         )
-        if result_data.get("error"):
-            await recorder.failure(result_data["error"], result_data)
-        elif result_data.get("verified"):
-            await recorder.success("Signature verified successfully", result_data)
-        else:
-            # Shouldn't happen
-            await recorder.failure("Signature verification failed for unknown reasons", result_data)
-
+        await _record(recorder, result_data)
     except Exception as e:
         await recorder.failure("Error during signature check execution", {"error": str(e)})
 
     return None
 
 
-async def _check_core_logic(committee_name: str, artifact_path: str, signature_path: str) -> dict[str, Any]:
-    """Verify a signature file using the committee's public signing keys."""
-    log.info(f"Attempting to fetch keys for committee_name: '{committee_name}'")
-    async with db.session() as session:
-        statement = (
-            sqlmodel.select(sql.PublicSigningKey)
-            .join(sql.KeyLink)
-            .join(sql.Committee)
-            .where(sql.validate_instrumented_attribute(sql.Committee.name) == committee_name)
+async def check_batch(args: checks.FunctionArguments) -> results.Results | None:
+    """Check all of the signature files of a revision using one keyring, recording results as check does."""
+    signature_rel_paths = args.extra_args.get("signature_paths") or []
+    committee_name = args.extra_args.get("committee_name")
+
+    # The keys are read once, both for the cache keys of the results and to verify the signatures
+    keys = (await _committee_keys(committee_name)) if isinstance(committee_name, str) else None
+
+    # Each signature file keeps its own recorder, so results are recorded as if each file had its own task
+    recorders: list[checks.Recorder] = []
+    signature_paths: list[tuple[str, str]] = []
+    for signature_rel_path in signature_rel_paths:
+        recorder = await checks.Recorder.create(
+            checker=check,
+            project_name=args.project_name,
+            version_name=args.version_name,
+            revision_number=args.revision_number,
+            primary_rel_path=signature_rel_path,
         )
-        result = await session.execute(statement)
-        db_public_keys = result.scalars().all()
-    log.info(f"Found {len(db_public_keys)} public keys for committee_name: '{committee_name}'")
-    apache_uid_map = {}
-    for key in db_public_keys:
-        if key.fingerprint:
-            apache_uid_map[key.fingerprint.lower()] = False
-            if key.apache_uid:
-                apache_uid_map[key.fingerprint.lower()] = True
-            elif key.primary_declared_uid:
-                if email := util.email_from_uid(key.primary_declared_uid):
-                    # Allow uploaded keys of the form private@<committee_name>.apache.org
-                    allowed_github_key_email = f"private@{committee_name}.apache.org"
-                    log.info(
-                        f"Comparing {key.fingerprint.upper()} with email {email} to allowed {allowed_github_key_email}"
-                    )
-                    if email == allowed_github_key_email:
-                        apache_uid_map[key.fingerprint.lower()] = True
+        if not isinstance(committee_name, str):
+            await recorder.failure("Committee name is required", {"committee_name": committee_name})
+            continue
+        signature_abs_path = await recorder.abs_path()
+        artifact_abs_path = await recorder.abs_path(signature_rel_path.removesuffix(".asc"))
+        if (signature_abs_path is None) or (artifact_abs_path is None):
+            continue
+        if (keys is not None) and await recorder.check_cache(args, _keys_context(*keys)):
+            continue
+        recorders.append(recorder)
+        signature_paths.append((str(signature_abs_path), str(artifact_abs_path)))
+
+    if (not recorders) or (not isinstance(committee_name, str)) or (keys is None):
+        return None
+    log.info(f"Checking {util.plural(len(recorders), 'signature')} using {committee_name} keys")
 
-    public_keys = [key.ascii_armored_key for key in db_public_keys]
-    for i, key in enumerate(public_keys):
-        if isinstance(key, bytes):
-            public_keys[i] = key.decode("utf-8", errors="replace")
+    try:
+        public_keys, apache_uid_map = keys
+        results_data = await asyncio.to_thread(
+            _check_core_logic_verify_signatures,
+            signature_paths=signature_paths,
+            committee_name=committee_name,
+            public_keys=public_keys,
+            apache_uid_map=apache_uid_map,
+        )
+    except Exception as e:
+        results_data = [e] * len(recorders)
+
+    for recorder, result_data in zip(recorders, results_data, strict=True):
+        try:
+            if isinstance(result_data, Exception):
+                raise result_data
+            await _record(recorder, result_data)
+        except Exception as e:
+            await recorder.failure("Error during signature check execution", {"error": str(e)})
+        await recorder.cache_complete()
+    return None
+
+
+async def _cache_context(args: checks.FunctionArguments) -> dict[str, Any] | None:
+    committee_name = args.extra_args.get("committee_name")
+    if not isinstance(committee_name, str):
+        return None
+    return _keys_context(*await _committee_keys(committee_name))
 
+
+async def _check_core_logic(committee_name: str, artifact_path: str, signature_path: str) -> dict[str, Any]:
+    """Verify a signature file using the committee's public signing keys."""
+    public_keys, apache_uid_map = await _committee_keys(committee_name)
     return await asyncio.to_thread(
         _check_core_logic_verify_signature,
         signature_path=signature_path,
         artifact_path=artifact_path,
-        ascii_armored_keys=public_keys,
+        committee_name=committee_name,
+        public_keys=public_keys,
         apache_uid_map=apache_uid_map,
     )
 
 
 def _check_core_logic_verify_signature(
-    signature_path: str, artifact_path: str, ascii_armored_keys: list[str], apache_uid_map: dict[str, bool]
+    signature_path: str,
+    artifact_path: str,
+    committee_name: str,
+    public_keys: list[tuple[str, str]],
+    apache_uid_map: dict[str, bool],
 ) -> dict[str, Any]:
     """Verify an OpenPGP signature for a file."""
-    with tempfile.TemporaryDirectory(prefix="gpg-") as gpg_dir, open(signature_path, "rb") as sig_file:
-        gpg: Final[gnupg.GPG] = gnupg.GPG(gnupghome=gpg_dir)
-
-        # Import all PMC public signing keys
-        start = time.perf_counter_ns()
-        # for key in ascii_armored_keys:
-        #     import_result = gpg.import_keys(key)
-        #     if not import_result.fingerprints:
-        #         # TODO: Log warning about invalid key?
-        #         continue
-        # TODO: Will this fail if one key doesn't work?
-        import_result = gpg.import_keys("\n\n".join(ascii_armored_keys))
-        if not import_result.fingerprints:
-            log.warning("No fingerprints found after importing keys")
-        end = time.perf_counter_ns()
-        log.info(f"Import of {util.plural(len(ascii_armored_keys), 'key')} took {(end - start) / 1000000} ms")
+    # The keyring of the committee is only built when its keys have changed since the last check
+    keyring_dir = keyrings.keyring(committee_name, public_keys)
+    return _check_core_logic_verify_with(
+        keyrings.gpg(keyring_dir), signature_path, artifact_path, len(public_keys), apache_uid_map
+    )
+
+
+def _check_core_logic_verify_signatures(
+    signature_paths: list[tuple[str, str]],
+    committee_name: str,
+    public_keys: list[tuple[str, str]],
+    apache_uid_map: dict[str, bool],
+) -> list[dict[str, Any] | Exception]:
+    """Verify OpenPGP signatures for several files, returning the exception instead of the result of any which fail."""
+    keyring_dir = keyrings.keyring(committee_name, public_keys)
+    gpg = keyrings.gpg(keyring_dir)
+    results_data: list[dict[str, Any] | Exception] = []
+    for signature_path, artifact_path in signature_paths:
+        try:
+            results_data.append(
+                _check_core_logic_verify_with(gpg, signature_path, artifact_path, len(public_keys), apache_uid_map)
+            )
+        except Exception as e:
+            results_data.append(e)
+    return results_data
+
+
+def _check_core_logic_verify_with(
+    gpg: gnupg.GPG, signature_path: str, artifact_path: str, num_committee_keys: int, apache_uid_map: dict[str, bool]
+) -> dict[str, Any]:
+    with open(signature_path, "rb") as sig_file:
         verified = gpg.verify_file(sig_file, str(artifact_path))
 
     key_fp = verified.pubkey_fingerprint.lower() if verified.pubkey_fingerprint else None
@@ -156,7 +209,7 @@ def _check_core_logic_verify_signature(
         "trust_level": verified.trust_level if hasattr(verified, "trust_level") else "Not available",
         "trust_text": verified.trust_text if hasattr(verified, "trust_text") else "Not available",
         "stderr": verified.stderr if hasattr(verified, "stderr") else "Not available",
-        "num_committee_keys": len(ascii_armored_keys),
+        "num_committee_keys": num_committee_keys,
         "key_has_apache_uid": apache_uid_ok,
     }
 
@@ -180,3 +233,56 @@ def _check_core_logic_verify_signature(
         "status": "Valid signature",
         "debug_info": debug_info,
     }
+
+
+async def _committee_keys(committee_name: str) -> tuple[list[tuple[str, str]], dict[str, bool]]:
+    """Return the (fingerprint, ASCII armored key) pairs of a committee, and whether each key has an ASF UID."""
+    log.info(f"Attempting to fetch keys for committee_name: '{committee_name}'")
+    async with db.session() as session:
+        statement = (
+            sqlmodel.select(sql.PublicSigningKey)
+            .join(sql.KeyLink)
+            .join(sql.Committee)
+            .where(sql.validate_instrumented_attribute(sql.Committee.name) == committee_name)
+        )
+        result = await session.execute(statement)
+        db_public_keys = result.scalars().all()
+    log.info(f"Found {len(db_public_keys)} public keys for committee_name: '{committee_name}'")
+    apache_uid_map = {}
+    for key in db_public_keys:
+        if key.fingerprint:
+            apache_uid_map[key.fingerprint.lower()] = False
+            if key.apache_uid:
+                apache_uid_map[key.fingerprint.lower()] = True
+            elif key.primary_declared_uid:
+                if email := util.email_from_uid(key.primary_declared_uid):
+                    # Allow uploaded keys of the form private@<committee_name>.apache.org
+                    allowed_github_key_email = f"private@{committee_name}.apache.org"
+                    log.info(
+                        f"Comparing {key.fingerprint.upper()} with email {email} to allowed {allowed_github_key_email}"
+                    )
+                    if email == allowed_github_key_email:
+                        apache_uid_map[key.fingerprint.lower()] = True
+
+    public_keys: list[tuple[str, str]] = []
+    for key in db_public_keys:
+        armored = key.ascii_armored_key
+        if isinstance(armored, bytes):
+            armored = armored.decode("utf-8", errors="replace")
+        public_keys.append((key.fingerprint, armored))
+    return public_keys, apache_uid_map
+
+
+def _keys_context(public_keys: list[tuple[str, str]], apache_uid_map: dict[str, bool]) -> dict[str, Any]:
+    # Whether a signing key has an ASF UID is recorded in the results, and can change without the key changing
+    return {"keys": keyrings.keys_hash(public_keys), "apache_uids": apache_uid_map}
+
+
+async def _record(recorder: checks.Recorder, result_data: dict[str, Any]) -> None:
+    if result_data.get("error"):
+        await recorder.failure(result_data["error"], result_data)
+    elif result_data.get("verified"):
+        await recorder.success("Signature verified successfully", result_data)
+    else:
+        # Shouldn't happen
+        await recorder.failure("Signature verification failed for unknown reasons", result_data)
@@ -15,69 +15,148 @@
 # specific language governing permissions and limitations
 # under the License.
 
-import asyncio
+import pathlib
 from typing import Final
 
-import atr.archives as archives
 import atr.log as log
+import atr.manifests as manifests
 import atr.models.results as results
 import atr.tarzip as tarzip
 import atr.tasks.checks as checks
 
 
+class IntegrityVisitor:
+    """Total the sizes of the members of a tar archive while reading all of their content."""
+
+    metadata_only = False
+    read_all = True
+
+    def __init__(self) -> None:
+        self.size = 0
+        self.error: Exception | None = None
+
+    def content_limit(self, member: tarzip.MemberInfo) -> int:
+        return 0
+
+    def finish(self, error: Exception | None) -> None:
+        self.error = error
+
+    async def record(self, recorder: checks.Recorder) -> None:
+        match self.error:
+            case None:
+                await recorder.success("Able to read all entries of the archive using tarfile", {"size": self.size})
+            case tarzip.ArchiveMemberLimitExceededError() as e:
+                await recorder.failure(f"Archive has too many members: {e}", {"error": str(e)})
+            case e:
+                await recorder.failure("Unable to read all entries of the archive using tarfile", {"error": str(e)})
+
+    def visit(self, member: tarzip.MemberInfo, content: bytes | None) -> None:
+        self.size += member.size
+
+
 class RootDirectoryError(Exception):
     """Exception raised when a root directory is not found in an archive."""
 
     ...
 
 
+class StructureVisitor:
+    """Find the single root directory of a tar archive."""
+
+    metadata_only = True
+    read_all = False
+
+    def __init__(self, expected_root: str | None = None) -> None:
+        self.expected_root = expected_root
+        self.root: str | None = None
+        self.error: Exception | None = None
+
+    def content_limit(self, member: tarzip.MemberInfo) -> int:
+        return 0
+
+    def finish(self, error: Exception | None) -> None:
+        # An error found in the members takes precedence over any later error reading the archive
+        if self.error is None:
+            self.error = error
+        if (self.error is None) and (not self.root):
+            self.error = RootDirectoryError("No root directory found in archive")
+
+    async def record(self, recorder: checks.Recorder) -> None:
+        match self.error:
+            case None:
+                data = {"root": self.root, "expected": self.expected_root}
+                if self.root == self.expected_root:
+                    await recorder.success(
+                        "Archive contains exactly one root directory matching the expected name", data
+                    )
+                else:
+                    await recorder.warning(
+                        f"Root directory '{self.root}' does not match expected name '{self.expected_root}'", data
+                    )
+            case tarzip.ArchiveMemberLimitExceededError() as e:
+                await recorder.failure(f"Archive has too many members: {e}", {"error": str(e)})
+            case RootDirectoryError() as e:
+                await recorder.warning("Could not get the root directory of the archive", {"error": str(e)})
+            case e:
+                await recorder.failure("Unable to verify archive structure", {"error": str(e)})
+
+    def visit(self, member: tarzip.MemberInfo, content: bytes | None) -> None:
+        if self.error is not None:
+            return
+        if member.name and member.name.split("/")[-1].startswith("._"):
+            # Metadata convention
+            return
+
+        top = member.name.split("/", 1)[0]
+        if not self.root:
+            self.root = top
+        elif top != self.root:
+            self.error = RootDirectoryError(f"Multiple root directories found: {self.root}, {top}")
+
+
+@checks.cached(version=1)
 async def integrity(args: checks.FunctionArguments) -> results.Results | None:
     """Check the integrity of a .tar.gz file."""
     recorder = await args.recorder()
     if not (artifact_abs_path := await recorder.abs_path()):
         return None
+    if visitor := await integrity_visitor(recorder, args, artifact_abs_path):
+        await checks.archive_scan(artifact_abs_path, [(recorder, visitor)])
+    return None
 
-    log.info(f"Checking integrity for {artifact_abs_path} (rel: {args.primary_rel_path})")
 
-    chunk_size = 4096
-    try:
-        size = await asyncio.to_thread(archives.total_size, str(artifact_abs_path), chunk_size)
-        await recorder.success("Able to read all entries of the archive using tarfile", {"size": size})
-    except tarzip.ArchiveMemberLimitExceededError as e:
-        await recorder.failure(f"Archive has too many members: {e}", {"error": str(e)})
-    except Exception as e:
-        await recorder.failure("Unable to read all entries of the archive using tarfile", {"error": str(e)})
-    return None
+async def integrity_visitor(
+    recorder: checks.Recorder, args: checks.FunctionArguments, artifact_abs_path: pathlib.Path
+) -> IntegrityVisitor | None:
+    """Prepare the integrity check of a .tar.gz file for an archive scan."""
+    log.info(f"Checking integrity for {artifact_abs_path} (rel: {args.primary_rel_path})")
+    return IntegrityVisitor()
 
 
 def root_directory(tgz_path: str) -> str:
     """Find the root directory in a tar archive and validate that it has only one root dir."""
-    root = None
-
-    with tarzip.open_archive(tgz_path) as archive:
-        for member in archive:
-            if member.name and member.name.split("/")[-1].startswith("._"):
-                # Metadata convention
-                continue
-
-            parts = member.name.split("/", 1)
-            if len(parts) >= 1:
-                if not root:
-                    root = parts[0]
-                elif parts[0] != root:
-                    raise RootDirectoryError(f"Multiple root directories found: {root}, {parts[0]}")
-
-    if not root:
-        raise RootDirectoryError("No root directory found in archive")
-
-    return root
+    visitor = StructureVisitor()
+    manifests.scan(tgz_path, [visitor])
+    if visitor.error is not None:
+        raise visitor.error
+    return visitor.root or ""
 
 
+@checks.cached(version=1, policy=("policy_binary_artifact_paths",), named=True)
 async def structure(args: checks.FunctionArguments) -> results.Results | None:
     """Check the structure of a .tar.gz file."""
     recorder = await args.recorder()
     if not (artifact_abs_path := await recorder.abs_path()):
         return None
+    if visitor := await structure_visitor(recorder, args, artifact_abs_path):
+        await checks.archive_scan(artifact_abs_path, [(recorder, visitor)])
+    return None
+
+
+async def structure_visitor(
+    recorder: checks.Recorder, args: checks.FunctionArguments, artifact_abs_path: pathlib.Path
+) -> StructureVisitor | None:
+    """Prepare the structure check of a .tar.gz file for an archive scan, unless it does not apply."""
     if await recorder.primary_path_is_binary():
         return None
 
@@ -88,23 +167,4 @@ async def structure(args: checks.FunctionArguments) -> results.Results | None:
     log.info(
         f"Checking structure for {artifact_abs_path} (expected root: {expected_root}) (rel: {args.primary_rel_path})"
     )
-
-    try:
-        root = await asyncio.to_thread(root_directory, str(artifact_abs_path))
-        if root == expected_root:
-            await recorder.success(
-                "Archive contains exactly one root directory matching the expected name",
-                {"root": root, "expected": expected_root},
-            )
-        else:
-            await recorder.warning(
-                f"Root directory '{root}' does not match expected name '{expected_root}'",
-                {"root": root, "expected": expected_root},
-            )
-    except tarzip.ArchiveMemberLimitExceededError as e:
-        await recorder.failure(f"Archive has too many members: {e}", {"error": str(e)})
-    except RootDirectoryError as e:
-        await recorder.warning("Could not get the root directory of the archive", {"error": str(e)})
-    except Exception as e:
-        await recorder.failure("Unable to verify archive structure", {"error": str(e)})
-    return None
+    return StructureVisitor(expected_root)
@@ -15,127 +15,196 @@
 # specific language governing permissions and limitations
 # under the License.
 
-import asyncio
 import os
+import pathlib
 import zipfile
-from typing import Any
+from typing import Any, Self
 
 import atr.log as log
+import atr.manifests as manifests
 import atr.models.results as results
 import atr.tarzip as tarzip
 import atr.tasks.checks as checks
 import atr.util as util
 
 
+class IntegrityVisitor:
+    """Count the members of a zip archive, reading each file to its end so that its CRC is verified."""
+
+    metadata_only = False
+    read_all = True
+
+    def __init__(self) -> None:
+        self.member_count = 0
+        self.error: Exception | None = None
+
+    def content_limit(self, member: tarzip.MemberInfo) -> int:
+        return 0
+
+    def finish(self, error: Exception | None) -> None:
+        self.error = error
+
+    async def record(self, recorder: checks.Recorder) -> None:
+        try:
+            result_data = self.result()
+            if result_data.get("error"):
+                await recorder.failure(result_data["error"], result_data)
+            else:
+                await recorder.success(
+                    f"Zip archive integrity OK ({util.plural(result_data['member_count'], 'member')})", result_data
+                )
+        except Exception as e:
+            await recorder.failure("Error checking zip integrity", {"error": str(e)})
+
+    def merge(self, shard: Self) -> None:
+        self.member_count += shard.member_count
+
+    def result(self) -> dict[str, Any]:
+        if self.error is not None:
+            return _error_result(self.error)
+        return {"member_count": self.member_count}
+
+    def visit(self, member: tarzip.MemberInfo, content: bytes | None) -> None:
+        self.member_count += 1
+
+
+class StructureVisitor:
+    """Collect the members of a zip archive to check its root directory."""
+
+    metadata_only = True
+    read_all = False
+
+    def __init__(self, expected_root: str) -> None:
+        self.expected_root = expected_root
+        self.members: list[tarzip.MemberInfo] = []
+        self.error: Exception | None = None
+
+    def content_limit(self, member: tarzip.MemberInfo) -> int:
+        return 0
+
+    def finish(self, error: Exception | None) -> None:
+        self.error = error
+
+    async def record(self, recorder: checks.Recorder) -> None:
+        try:
+            result_data = self.result()
+            if result_data.get("warning"):
+                await recorder.warning(result_data["warning"], result_data)
+            elif result_data.get("error"):
+                await recorder.failure(result_data["error"], result_data)
+            else:
+                await recorder.success(f"Zip structure OK (root: {result_data['root_dir']})", result_data)
+        except Exception as e:
+            await recorder.failure("Error checking zip structure", {"error": str(e)})
+
+    def merge(self, shard: Self) -> None:
+        self.members.extend(shard.members)
+
+    def result(self) -> dict[str, Any]:
+        if self.error is not None:
+            return _error_result(self.error)
+        if not self.members:
+            return {"error": "Archive is empty"}
+
+        root_dirs, non_rooted_files = _structure_check_core_logic_find_roots(self.members)
+        member_names = [m.name for m in self.members]
+        actual_root, error_msg = _structure_check_core_logic_validate_root(
+            member_names, root_dirs, non_rooted_files, self.expected_root
+        )
+
+        if error_msg:
+            if error_msg.startswith("Root directory mismatch"):
+                return {"warning": error_msg}
+            else:
+                return {"error": error_msg}
+        if actual_root:
+            return {"root_dir": actual_root}
+        return {"error": "Unknown structure validation error"}
+
+    def visit(self, member: tarzip.MemberInfo, content: bytes | None) -> None:
+        self.members.append(member)
+
+
+@checks.cached(version=1)
 async def integrity(args: checks.FunctionArguments) -> results.Results | None:
     """Check that the zip archive is not corrupted and can be opened."""
     recorder = await args.recorder()
     if not (artifact_abs_path := await recorder.abs_path()):
         return None
+    if visitor := await integrity_visitor(recorder, args, artifact_abs_path):
+        await checks.archive_scan(artifact_abs_path, [(recorder, visitor)])
+    return None
 
-    log.info(f"Checking zip integrity for {artifact_abs_path} (rel: {args.primary_rel_path})")
-
-    try:
-        result_data = await asyncio.to_thread(_integrity_check_core_logic, str(artifact_abs_path))
-        if result_data.get("error"):
-            await recorder.failure(result_data["error"], result_data)
-        else:
-            await recorder.success(
-                f"Zip archive integrity OK ({util.plural(result_data['member_count'], 'member')})", result_data
-            )
-    except Exception as e:
-        await recorder.failure("Error checking zip integrity", {"error": str(e)})
 
-    return None
+async def integrity_visitor(
+    recorder: checks.Recorder, args: checks.FunctionArguments, artifact_abs_path: pathlib.Path
+) -> IntegrityVisitor | None:
+    """Prepare the integrity check of a zip archive for an archive scan."""
+    log.info(f"Checking zip integrity for {artifact_abs_path} (rel: {args.primary_rel_path})")
+    return IntegrityVisitor()
 
 
+@checks.cached(version=1, policy=("policy_binary_artifact_paths",), named=True)
 async def structure(args: checks.FunctionArguments) -> results.Results | None:
     """Check that the zip archive has a single root directory matching the artifact name."""
     recorder = await args.recorder()
     if not (artifact_abs_path := await recorder.abs_path()):
         return None
+    if visitor := await structure_visitor(recorder, args, artifact_abs_path):
+        await checks.archive_scan(artifact_abs_path, [(recorder, visitor)])
+    return None
+
+
+async def structure_visitor(
+    recorder: checks.Recorder, args: checks.FunctionArguments, artifact_abs_path: pathlib.Path
+) -> StructureVisitor | None:
+    """Prepare the structure check of a zip archive for an archive scan, unless it does not apply."""
     if await recorder.primary_path_is_binary():
         return None
 
     log.info(f"Checking zip structure for {artifact_abs_path} (rel: {args.primary_rel_path})")
+    return StructureVisitor(_expected_root(str(artifact_abs_path)))
 
-    try:
-        result_data = await asyncio.to_thread(_structure_check_core_logic, str(artifact_abs_path))
 
-        if result_data.get("warning"):
-            await recorder.warning(result_data["warning"], result_data)
-        elif result_data.get("error"):
-            await recorder.failure(result_data["error"], result_data)
-        else:
-            await recorder.success(f"Zip structure OK (root: {result_data['root_dir']})", result_data)
-    except Exception as e:
-        await recorder.failure("Error checking zip structure", {"error": str(e)})
+def _error_result(error: Exception) -> dict[str, Any]:
+    match error:
+        case tarzip.ArchiveMemberLimitExceededError():
+            return {"error": f"Archive has too many members: {error}"}
+        case zipfile.BadZipFile():
+            return {"error": f"Bad zip file: {error}"}
+        case FileNotFoundError():
+            return {"error": "File not found"}
+        case _:
+            return {"error": f"Unexpected error: {error}"}
 
-    return None
+
+def _expected_root(artifact_path: str) -> str:
+    base_name = os.path.basename(artifact_path)
+    name_part = base_name.removesuffix(".zip")
+    # # TODO: Airavata has e.g. "-source-release"
+    # # It would be useful if there were a function in analysis.py for stripping these
+    # # But the root directory should probably always match the name of the file sans suffix
+    # # (This would also be easier to implement)
+    # if name_part.endswith(("-src", "-bin", "-dist")):
+    #     name_part = "-".join(name_part.split("-")[:-1])
+    return name_part
 
 
 def _integrity_check_core_logic(artifact_path: str) -> dict[str, Any]:
-    """Verify that a zip file can be opened and its members listed."""
-    try:
-        with tarzip.open_archive(artifact_path) as archive:
-            # This is a simple check using list members
-            # We can use zf.testzip() for CRC checks if needed, though this will be slower
-            member_count = sum(1 for _ in archive)
-            return {"member_count": member_count}
-    except tarzip.ArchiveMemberLimitExceededError as e:
-        return {"error": f"Archive has too many members: {e}"}
-    except zipfile.BadZipFile as e:
-        return {"error": f"Bad zip file: {e}"}
-    except FileNotFoundError:
-        return {"error": "File not found"}
-    except Exception as e:
-        return {"error": f"Unexpected error: {e}"}
+    """Verify that a zip file can be opened and the CRCs of its members."""
+    visitor = IntegrityVisitor()
+    manifests.scan(artifact_path, [visitor])
+    return visitor.result()
 
 
 def _structure_check_core_logic(artifact_path: str) -> dict[str, Any]:
     """Verify the internal structure of the zip archive."""
-    try:
-        with tarzip.open_archive(artifact_path) as archive:
-            members: list[tarzip.Member] = list(archive)
-            if not members:
-                return {"error": "Archive is empty"}
-
-            base_name = os.path.basename(artifact_path)
-            name_part = base_name.removesuffix(".zip")
-            # # TODO: Airavata has e.g. "-source-release"
-            # # It would be useful if there were a function in analysis.py for stripping these
-            # # But the root directory should probably always match the name of the file sans suffix
-            # # (This would also be easier to implement)
-            # if name_part.endswith(("-src", "-bin", "-dist")):
-            #     name_part = "-".join(name_part.split("-")[:-1])
-            expected_root = name_part
-
-            root_dirs, non_rooted_files = _structure_check_core_logic_find_roots(members)
-            member_names = [m.name for m in members]
-            actual_root, error_msg = _structure_check_core_logic_validate_root(
-                member_names, root_dirs, non_rooted_files, expected_root
-            )
-
-            if error_msg:
-                if error_msg.startswith("Root directory mismatch"):
-                    return {"warning": error_msg}
-                else:
-                    return {"error": error_msg}
-            if actual_root:
-                return {"root_dir": actual_root}
-            return {"error": "Unknown structure validation error"}
-
-    except tarzip.ArchiveMemberLimitExceededError as e:
-        return {"error": f"Archive has too many members: {e}"}
-    except zipfile.BadZipFile as e:
-        return {"error": f"Bad zip file: {e}"}
-    except FileNotFoundError:
-        return {"error": "File not found"}
-    except Exception as e:
-        return {"error": f"Unexpected error: {e}"}
-
-
-def _structure_check_core_logic_find_roots(members: list[tarzip.Member]) -> tuple[set[str], list[str]]:
+    visitor = StructureVisitor(_expected_root(artifact_path))
+    manifests.scan(artifact_path, [visitor])
+    return visitor.result()
+
+
+def _structure_check_core_logic_find_roots(members: list[tarzip.MemberInfo]) -> tuple[set[str], list[str]]:
     """Identify root directories and non-rooted files in a zip archive."""
     root_dirs: set[str] = set()
     non_rooted_files: list[str] = []
@@ -19,6 +19,7 @@ import asyncio
 import json
 import os
 import pathlib
+import shutil
 from typing import Any, Final
 
 import aiofiles
@@ -26,6 +27,7 @@ import aiofiles.os
 
 import atr.archives as archives
 import atr.config as config
+import atr.extracts as extracts
 import atr.log as log
 import atr.models.results as results
 import atr.models.schema as schema
@@ -40,8 +42,11 @@ _CONFIG: Final = config.get()
 class GenerateCycloneDX(schema.Strict):
     """Arguments for the task to generate a CycloneDX SBOM."""
 
-    artifact_path: str = schema.description("Absolute path to the artifact")
-    output_path: str = schema.description("Absolute path where the generated SBOM JSON should be written")
+    project_name: str = schema.description("Project name")
+    version_name: str = schema.description("Version name")
+    revision_number: str = schema.description("Revision number containing the artifact")
+    artifact_path: str = schema.description("Relative path to the artifact")
+    asf_uid: str = schema.description("ASF UID of the user who requested the SBOM")
 
 
 class SBOMGenerationError(Exception):
@@ -117,21 +122,49 @@ async def augment(args: FileArgs) -> results.Results | None:
 
 
 @checks.with_model(GenerateCycloneDX)
-async def generate_cyclonedx(args: GenerateCycloneDX) -> results.Results | None:
-    """Generate a CycloneDX SBOM for the given artifact and write it to the output path."""
-    try:
-        result_data = await _generate_cyclonedx_core(args.artifact_path, args.output_path)
-        log.info(f"Successfully generated CycloneDX SBOM for {args.artifact_path}")
+async def generate_cyclonedx(args: GenerateCycloneDX, *, task_id: int | None = None) -> results.Results | None:
+    """Generate a CycloneDX SBOM for the given artifact and add it in a new revision."""
+    base_dir = util.get_unfinished_dir() / args.project_name / args.version_name / args.revision_number
+    artifact_path = base_dir / args.artifact_path
+    if not await aiofiles.os.path.isfile(artifact_path):
+        raise SBOMGenerationError("Artifact file does not exist", {"artifact_path": args.artifact_path})
+    artifact_rel_path = pathlib.Path(args.artifact_path)
+    sbom_rel_path = artifact_rel_path.with_name(artifact_rel_path.name + ".cdx.json")
+
+    async with util.async_temporary_directory(prefix="cyclonedx_output_") as output_dir:
+        output_path = output_dir / sbom_rel_path.name
+        try:
+            result_data = await _generate_cyclonedx_core(str(artifact_path), str(output_path))
+        except (archives.ExtractionError, SBOMGenerationError) as e:
+            log.error(f"SBOM generation failed for {artifact_path}: {e}")
+            raise
         msg = result_data["message"]
         if not isinstance(msg, str):
             raise SBOMGenerationError(f"Invalid message type: {type(msg)}")
-        return results.SBOMGenerateCycloneDX(
-            kind="sbom_generate_cyclonedx",
-            msg=msg,
-        )
-    except (archives.ExtractionError, SBOMGenerationError) as e:
-        log.error(f"SBOM generation failed for {args.artifact_path}: {e}")
-        raise
+        if not await aiofiles.os.path.isfile(output_path):
+            raise SBOMGenerationError(msg, {"artifact_path": args.artifact_path})
+
+        description = "SBOM generation through web interface"
+        async with storage.write(args.asf_uid) as write:
+            wacp = await write.as_project_committee_participant(args.project_name)
+            # The checks of the new revision, including those of the SBOM, wait until this task completes
+            async with wacp.revision.create_and_manage(
+                args.project_name, args.version_name, args.asf_uid, description=description, depends_on=task_id
+            ) as creating:
+                new_sbom_path = creating.interim_path / sbom_rel_path
+                if await aiofiles.os.path.exists(new_sbom_path):
+                    raise SBOMGenerationError("SBOM file already exists", {"file_path": str(sbom_rel_path)})
+                log.info(f"Writing generated SBOM to {new_sbom_path}")
+                await asyncio.to_thread(shutil.copyfile, output_path, new_sbom_path)
+
+            if creating.new is None:
+                raise RuntimeError("Internal error: New revision not found")
+
+    log.info(f"Successfully generated CycloneDX SBOM for {artifact_path}")
+    return results.SBOMGenerateCycloneDX(
+        kind="sbom_generate_cyclonedx",
+        msg=msg,
+    )
 
 
 @checks.with_model(FileArgs)
@@ -286,9 +319,11 @@ async def _generate_cyclonedx_core(artifact_path: str, output_path: str) -> dict
     """Core logic to generate CycloneDX SBOM on failure."""
     log.info(f"Generating CycloneDX SBOM for {artifact_path} -> {output_path}")
 
-    # TODO: Should create a new revision here rather than in the caller
-    async with util.async_temporary_directory(prefix="cyclonedx_sbom_") as temp_dir:
-        log.info(f"Created temporary directory: {temp_dir}")
+    # The extracted tree is shared with other tasks and is read only
+    async with extracts.async_extracted(
+        artifact_path, max_size=_CONFIG.MAX_EXTRACT_SIZE, chunk_size=_CONFIG.EXTRACT_CHUNK_SIZE
+    ) as tree_dir:
+        log.info(f"Using extracted tree: {tree_dir}")
 
         # # Find and validate the root directory
         # try:
@@ -300,22 +335,10 @@ async def _generate_cyclonedx_core(artifact_path: str, output_path: str) -> dict
         #         f"Failed to determine archive root directory: {e}", {"artifact_path": artifact_path}
         #     ) from e
         #
-        # extract_dir = os.path.join(temp_dir, root_dir)
-
-        # Extract the archive to the temporary directory
-        # TODO: Ideally we'd have task dependencies or archive caching
-        log.info(f"Extracting {artifact_path} to {temp_dir}")
-        extracted_size, _extracted_paths = await asyncio.to_thread(
-            archives.extract,
-            artifact_path,
-            str(temp_dir),
-            max_size=_CONFIG.MAX_EXTRACT_SIZE,
-            chunk_size=_CONFIG.EXTRACT_CHUNK_SIZE,
-        )
-        log.info(f"Extracted {extracted_size} bytes")
+        # extract_dir = os.path.join(tree_dir, root_dir)
 
         # Find the root directory
-        if (extract_dir := _extracted_dir(str(temp_dir))) is None:
+        if (extract_dir := _extracted_dir(str(tree_dir))) is None:
             log.error("No root directory found in archive")
             return {
                 "valid": False,
@@ -326,7 +349,7 @@ async def _generate_cyclonedx_core(artifact_path: str, output_path: str) -> dict
         log.info(f"Using root directory: {extract_dir}")
 
         # Run syft to generate the CycloneDX SBOM
-        syft_command = ["syft", extract_dir, "-o", "cyclonedx-json", "--enrich", "all", "--base-path", f"{temp_dir!s}"]
+        syft_command = ["syft", extract_dir, "-o", "cyclonedx-json", "--enrich", "all", "--base-path", f"{tree_dir!s}"]
         log.info(f"Running syft: {' '.join(syft_command)}")
 
         try:
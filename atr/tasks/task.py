@@ -26,6 +26,7 @@ QUEUED: Final = sql.TaskStatus.QUEUED
 ACTIVE: Final = sql.TaskStatus.ACTIVE
 COMPLETED: Final = sql.TaskStatus.COMPLETED
 FAILED: Final = sql.TaskStatus.FAILED
+SUPERSEDED: Final = sql.TaskStatus.SUPERSEDED
 
 
 class Error(Exception):
@@ -47,12 +47,12 @@ import quart
 # NOTE: The atr.db module imports this module
 # Therefore, this module must not import atr.db
 import atr.config as config
+import atr.hashes as hashes
 import atr.ldap as ldap
 import atr.log as log
 import atr.models.sql as sql
 import atr.models.validation as validation
 import atr.registry as registry
-import atr.tarzip as tarzip
 import atr.user as user
 
 T = TypeVar("T")
@@ -94,6 +94,9 @@ class FetchError(RuntimeError):
 
 async def archive_listing(file_path: pathlib.Path) -> list[str] | None:
     """Attempt to list contents of supported archive files."""
+    # Must be imported here, to avoid a circular import
+    import atr.manifests as manifests
+
     if not await aiofiles.os.path.isfile(file_path):
         return None
 
@@ -102,9 +105,9 @@ async def archive_listing(file_path: pathlib.Path) -> list[str] | None:
 
             def _read_archive() -> list[str] | None:
                 with contextlib.suppress(tarfile.ReadError, zipfile.BadZipFile, EOFError, ValueError, OSError):
-                    with tarzip.open_archive(str(file_path)) as archive:
-                        # TODO: Skip metadata files
-                        return sorted(member.name for member in archive)
+                    # TODO: Skip metadata files
+                    # The manifest is built on the first listing or scan, and later listings only read the manifest
+                    return manifests.listing(str(file_path))
                 return None
 
             return await asyncio.to_thread(_read_archive)
@@ -219,11 +222,7 @@ def compute_sha3_256(file_data: bytes) -> str:
 
 async def compute_sha512(file_path: pathlib.Path) -> str:
     """Compute SHA-512 hash of a file."""
-    sha512 = hashlib.sha512()
-    async with aiofiles.open(file_path, "rb") as f:
-        while chunk := await f.read(4096):
-            sha512.update(chunk)
-    return sha512.hexdigest()
+    return await hashes.async_digest(file_path, "sha512")
 
 
 async def content_list(
@@ -384,11 +383,7 @@ async def email_to_uid_map() -> dict[str, str]:
 
 async def file_sha3(path: str) -> str:
     """Compute SHA3-256 hash of a file."""
-    sha3 = hashlib.sha3_256()
-    async with aiofiles.open(path, "rb") as f:
-        while chunk := await f.read(4096):
-            sha3.update(chunk)
-    return sha3.hexdigest()
+    return await hashes.async_digest(path, "sha3_256")
 
 
 def format_datetime(dt_obj: datetime.datetime | int) -> str:
@@ -483,10 +478,22 @@ def get_downloads_dir() -> pathlib.Path:
     return pathlib.Path(config.get().DOWNLOADS_STORAGE_DIR)
 
 
+def get_extracts_dir() -> pathlib.Path:
+    return pathlib.Path(config.get().EXTRACTS_STORAGE_DIR)
+
+
 def get_finished_dir() -> pathlib.Path:
     return pathlib.Path(config.get().FINISHED_STORAGE_DIR)
 
 
+def get_keyrings_dir() -> pathlib.Path:
+    return pathlib.Path(config.get().KEYRINGS_STORAGE_DIR)
+
+
+def get_manifests_dir() -> pathlib.Path:
+    return pathlib.Path(config.get().MANIFESTS_STORAGE_DIR)
+
+
 async def get_release_stats(release: sql.Release) -> tuple[int, int, str]:
     """Calculate file count, total byte size, and formatted size for a release."""
     base_dir = release_directory(release)
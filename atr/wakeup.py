@@ -0,0 +1,101 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Wake idle task workers as soon as new tasks are committed."""
+
+import asyncio
+import contextlib
+import os
+import socket
+from typing import Final
+
+import atr.config as config
+import atr.log as log
+
+_SOCKET_SUFFIX: Final = ".sock"
+
+
+def listen() -> socket.socket | None:
+    """Bind a wakeup socket for the current worker process."""
+    path = _socket_path(os.getpid())
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+        sock.bind(path)
+    except OSError as e:
+        sock.close()
+        log.warning(f"Could not bind wakeup socket {path}, falling back to polling: {e}")
+        return None
+    sock.setblocking(False)
+    return sock
+
+
+def notify() -> None:
+    """Wake every listening worker process."""
+    wakeup_dir = config.get().WORKER_WAKEUP_DIR
+    try:
+        names = os.listdir(wakeup_dir)
+    except FileNotFoundError:
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    try:
+        for name in names:
+            if not name.endswith(_SOCKET_SUFFIX):
+                continue
+            try:
+                sock.sendto(b"\0", os.path.join(wakeup_dir, name))
+            except BlockingIOError:
+                # The worker already has wakeups pending
+                ...
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker has exited and its socket will be removed by the manager
+                ...
+            except OSError as e:
+                log.warning(f"Could not wake worker via {name}: {e}")
+    finally:
+        sock.close()
+
+
+def prepare() -> None:
+    """Create the wakeup directory and remove any sockets left by previous runs."""
+    wakeup_dir = config.get().WORKER_WAKEUP_DIR
+    os.makedirs(wakeup_dir, exist_ok=True)
+    for name in os.listdir(wakeup_dir):
+        if name.endswith(_SOCKET_SUFFIX):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(os.path.join(wakeup_dir, name))
+
+
+def remove(pid: int) -> None:
+    """Remove the wakeup socket of an exited worker process."""
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(_socket_path(pid))
+
+
+async def wait(sock: socket.socket) -> None:
+    """Wait until a wakeup datagram is received, then drain any others."""
+    loop = asyncio.get_running_loop()
+    await loop.sock_recv(sock, 1)
+    with contextlib.suppress(BlockingIOError):
+        while sock.recv(64):
+            ...
+
+
+def _socket_path(pid: int) -> str:
+    return os.path.join(config.get().WORKER_WAKEUP_DIR, f"{pid}{_SOCKET_SUFFIX}")
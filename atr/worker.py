@@ -17,23 +17,23 @@
 
 """worker.py - Task worker process for ATR"""
 
-# TODO: If started is older than some threshold and status
-# is active but the pid is no longer running, we can revert
-# the task to status='QUEUED'. For this to work, ideally we
-# need to check wall clock time as well as CPU time.
-
 import asyncio
+import collections
+import dataclasses
 import datetime
 import inspect
 import os
 import resource
 import signal
+import socket
 import traceback
-from collections.abc import Awaitable, Callable
-from typing import Any, Final
+from collections.abc import Awaitable, Callable, Collection
+from typing import Any, Final, Literal
 
+import sqlalchemy
 import sqlmodel
 
+import atr.archives as archives
 import atr.db as db
 import atr.log as log
 import atr.models.results as results
@@ -41,11 +41,54 @@ import atr.models.sql as sql
 import atr.tasks as tasks
 import atr.tasks.checks as checks
 import atr.tasks.task as task
+import atr.wakeup as wakeup
 
 # Resource limits, 5 minutes and 3GB
 _CPU_LIMIT_SECONDS: Final = 300
 _MEMORY_LIMIT_BYTES: Final = 3 * 1024 * 1024 * 1024
 
+# Tasks which spend most of their time waiting on a subprocess or the network
+# These are limited separately from CPU bound tasks when running concurrently
+_SUBPROCESS_TASK_TYPES: Final = frozenset(
+    {
+        sql.TaskType.DISTRIBUTION_STATUS,
+        sql.TaskType.DISTRIBUTION_WORKFLOW,
+        sql.TaskType.METADATA_UPDATE,
+        sql.TaskType.RAT_CHECK,
+        sql.TaskType.SBOM_GENERATE_CYCLONEDX,
+        sql.TaskType.SBOM_OSV_SCAN,
+        sql.TaskType.SBOM_QS_SCORE,
+        sql.TaskType.SIGNATURE_CHECK,
+        sql.TaskType.SIGNATURE_CHECK_BATCH,
+        sql.TaskType.SVN_IMPORT_FILES,
+        sql.TaskType.WORKFLOW_STATUS,
+    }
+)
+
+# The IDs of the tasks running in this worker, and of those which have run alongside another task
+# Usage is measured for the whole process, so the usage of a task which overlapped another includes that of the other
+_usage_running: set[int] = set()
+_usage_overlapped: set[int] = set()
+
+# The IDs of the running tasks which are recording their outcome, and which the heartbeat must no longer cancel
+_tasks_finishing: set[int] = set()
+
+type ClaimedTask = tuple[int, str, list[str] | dict[str, Any], str]
+type TaskClass = Literal["cpu", "subprocess"]
+
+
+@dataclasses.dataclass(frozen=True)
+class TaskUsage:
+    """Cumulative resource usage of this worker process, its reaped subprocesses, and its archive process pool."""
+
+    cpu_user_seconds: float
+    cpu_system_seconds: float
+    child_cpu_seconds: float
+    peak_rss_bytes: int
+    read_bytes: int
+    written_bytes: int
+
+
 # # Create tables if they don't exist
 # SQLModel.metadata.create_all(engine)
 
@@ -102,6 +145,16 @@ async def _execute_check_task(
     log.debug(f"Handler {handler.__name__} expects checks.FunctionArguments, fetching full task details")
     async with db.session() as data:
         task_obj = await data.task(id=task_id).demand(ValueError(f"Task {task_id} disappeared during processing"))
+        # A task which was requeued or cancelled may have written some of its results before it stopped
+        # Those are deleted before the task runs again, so that they are not recorded twice
+        await _execute_check_task_results_clear(data, task_obj, task_type, task_args)
+        await data.commit()
+        # A check queued behind an identical check reuses its results instead of running again
+        prerequisite = await _execute_check_task_reuse(data, task_obj, task_type)
+        if prerequisite is not None:
+            await data.commit()
+            log.info(f"Task {task_id} reused the results of identical task {prerequisite.id}")
+            return prerequisite.result
 
     # Validate required fields from the Task object itself
     if task_obj.project_name is None:
@@ -135,10 +188,45 @@ async def _execute_check_task(
         extra_args=task_args,
     )
     log.debug(f"Calling {handler.__name__} with structured arguments: {function_arguments}")
-    handler_result = await handler(function_arguments)
+    # The results are written in batches, and all of them before the task is marked as finished
+    async with checks.buffered():
+        handler_result = await handler(function_arguments)
     return handler_result
 
 
+async def _execute_check_task_results_clear(
+    data: db.Session, task_obj: sql.Task, task_type: str, task_args: list[str] | dict[str, Any]
+) -> None:
+    if (task_obj.project_name is None) or (task_obj.version_name is None) or (task_obj.revision_number is None):
+        return
+    primary_rel_paths: list[str | None] = [task_obj.primary_rel_path]
+    if (task_type == sql.TaskType.SIGNATURE_CHECK_BATCH) and isinstance(task_args, dict):
+        # A batch records results for each signature file as if each had its own task
+        primary_rel_paths = list(task_args.get("signature_paths") or [])
+    await checks.results_clear(
+        sql.release_name(task_obj.project_name, task_obj.version_name),
+        task_obj.revision_number,
+        tasks.checkers(sql.TaskType(task_type)),
+        primary_rel_paths,
+        caller_data=data,
+    )
+
+
+async def _execute_check_task_reuse(data: db.Session, task_obj: sql.Task, task_type: str) -> sql.Task | None:
+    """Copy the results of the identical check which a check was queued behind, and return it, if it completed."""
+    if (task_obj.dedup_key is None) or (task_obj.depends_on is None):
+        return None
+    prerequisite = await data.task(id=task_obj.depends_on, dedup_key=task_obj.dedup_key, status=task.COMPLETED).get()
+    if (prerequisite is None) or (prerequisite.project_name is None) or (prerequisite.version_name is None):
+        return None
+    # Results are deleted along with their release, so a completed check of a release which remains has all of them
+    release_name = sql.release_name(prerequisite.project_name, prerequisite.version_name)
+    if await data.release(name=release_name).get() is None:
+        return None
+    await checks.results_copy([(prerequisite, task_obj, tasks.checkers(sql.TaskType(task_type)))], caller_data=data)
+    return prerequisite
+
+
 def _setup_logging() -> None:
     import logging
 
@@ -166,65 +254,68 @@ def _setup_logging() -> None:
     )
 
 
-async def _task_next_claim() -> tuple[int, str, list[str] | dict[str, Any], str] | None:
+def _task_claim_plan(
+    running: Collection[TaskClass], limits: dict[TaskClass, int], limit: int
+) -> list[tuple[list[sql.TaskType] | None, int]]:
     """
-    Attempt to claim the oldest unclaimed task.
-    Returns (task_id, task_type, task_args) if successful.
-    Returns None if no tasks are available.
+    Plan which task types to claim, and how many of each, given the running task classes.
+    A task types value of None means that tasks of any type can be claimed.
     """
+    counts = collections.Counter(running)
+    free = {task_class: class_limit - counts[task_class] for task_class, class_limit in limits.items()}
+    if all((class_free >= limit) for class_free in free.values()):
+        return [(None, limit)]
+    return [
+        ([task_type for task_type in sql.TaskType if _task_class(task_type) == task_class], class_free)
+        for task_class, class_free in free.items()
+        if class_free > 0
+    ]
+
+
+def _task_class(task_type: str) -> TaskClass:
+    """Return the concurrency class of a task type."""
+    if task_type in _SUBPROCESS_TASK_TYPES:
+        return "subprocess"
+    return "cpu"
+
+
+async def _task_dependants_fail(data: db.Session, task_id: int) -> None:
+    """Fail every queued task which depends, directly or transitively, on a failed task."""
     via = sql.validate_instrumented_attribute
-    async with db.session() as data:
-        async with data.begin():
-            # Get the ID of the oldest queued task
-            oldest_queued_task = (
-                sqlmodel.select(sql.Task.id)
-                .where(
-                    sqlmodel.and_(
-                        sql.Task.status == task.QUEUED,
-                        sqlmodel.or_(
-                            via(sql.Task.scheduled).is_(None),
-                            via(sql.Task.scheduled) <= datetime.datetime.now(datetime.UTC),
-                        ),
-                    )
+    now = datetime.datetime.now(datetime.UTC)
+    failed_ids = [task_id]
+    while failed_ids:
+        update_stmt = (
+            sqlmodel.update(sql.Task)
+            .where(
+                sqlmodel.and_(
+                    via(sql.Task.depends_on).in_(failed_ids),
+                    sql.Task.status == task.QUEUED,
                 )
-                .order_by(via(sql.Task.added).asc())
-                .limit(1)
             )
-
-            # Use an UPDATE with a WHERE clause to atomically claim the task
-            # This ensures that only one worker can claim a specific task
-            now = datetime.datetime.now(datetime.UTC)
-            update_stmt = (
-                sqlmodel.update(sql.Task)
-                .where(sqlmodel.and_(sql.Task.id == oldest_queued_task, sql.Task.status == task.QUEUED))
-                .values(status=task.ACTIVE, started=now, pid=os.getpid())
-                .returning(
-                    sql.validate_instrumented_attribute(sql.Task.id),
-                    sql.validate_instrumented_attribute(sql.Task.task_type),
-                    sql.validate_instrumented_attribute(sql.Task.task_args),
-                    sql.validate_instrumented_attribute(sql.Task.asf_uid),
-                )
-            )
-
-            result = await data.execute(update_stmt)
-            claimed_task = result.first()
-
-            if claimed_task:
-                task_id, task_type, task_args, asf_uid = claimed_task
-                log.info(f"Claimed task {task_id} ({task_type}) with args {task_args}")
-                return task_id, task_type, task_args, asf_uid
-
-            return None
+            .values(status=task.FAILED, completed=now, error=f"Prerequisite task {task_id} failed")
+            .returning(via(sql.Task.id))
+        )
+        result = await data.execute(update_stmt)
+        failed_ids = list(result.scalars().all())
+        if failed_ids:
+            log.warning(f"Failed tasks {failed_ids} because prerequisite task {task_id} failed")
 
 
-async def _task_process(task_id: int, task_type: str, task_args: list[str] | dict[str, Any], asf_uid: str) -> None:
+async def _task_process(
+    task_id: int,
+    task_type: str,
+    task_args: list[str] | dict[str, Any],
+    asf_uid: str,
+    usage_start: TaskUsage | None = None,
+) -> None:
     """Process a claimed task."""
     log.info(f"Processing task {task_id} ({task_type}) with raw args {task_args}")
     try:
         task_type_member = sql.TaskType(task_type)
     except ValueError as e:
         log.error(f"Invalid task type: {task_type}")
-        await _task_result_process(task_id, None, task.FAILED, str(e))
+        await _task_result_process(task_id, None, task.FAILED, str(e), usage_start)
         return
 
     task_results: results.Results | None
@@ -252,53 +343,353 @@ async def _task_process(task_id: int, task_type: str, task_args: list[str] | dic
         error_details = traceback.format_exc()
         log.error(f"Task {task_id} failed processing: {error_details}")
         error = str(e)
-    await _task_result_process(task_id, task_results, status, error)
+    await _task_result_process(task_id, task_results, status, error, usage_start)
 
 
 async def _task_result_process(
-    task_id: int, task_results: results.Results | None, status: sql.TaskStatus, error: str | None = None
+    task_id: int,
+    task_results: results.Results | None,
+    status: sql.TaskStatus,
+    error: str | None = None,
+    usage_start: TaskUsage | None = None,
 ) -> None:
     """Process and store task results in the database."""
+    # Once the outcome is committed the task is no longer active, which the heartbeat must not take as a requeue
+    _tasks_finishing.add(task_id)
+    usage_end: TaskUsage | None = None
+    if (usage_start is not None) and (task_id not in _usage_overlapped):
+        usage_end = await asyncio.to_thread(_usage_snapshot, archives.pool_pids())
+    dependants_released = False
     async with db.session() as data:
         async with data.begin():
             # Find the task by ID
             task_obj = await data.task(id=task_id).get()
             if task_obj:
+                # The task may have been requeued or terminated by the manager
+                if (task_obj.status != task.ACTIVE) or (task_obj.pid != os.getpid()):
+                    log.warning(f"Task {task_id} is no longer held by this worker, discarding its result")
+                    return
+
                 # Update task properties
                 task_obj.status = status
                 task_obj.completed = datetime.datetime.now(datetime.UTC)
+                task_obj.lease_expires = None
                 task_obj.result = task_results
+                if usage_start is not None:
+                    _usage_record(task_obj, usage_start, usage_end)
 
                 if (status == task.FAILED) and error:
                     task_obj.error = error
 
+                if status == task.FAILED:
+                    await _task_dependants_fail(data, task_id)
+                elif status == task.COMPLETED:
+                    dependants_released = await data.task(depends_on=task_id, status=task.QUEUED).get() is not None
+
+    # Dependants of a completed task are now claimable, so idle workers need not wait for their next poll
+    if dependants_released:
+        wakeup.notify()
+
+
+async def _task_run(task_id: int, task_type: str, task_args: list[str] | dict[str, Any], asf_uid: str) -> None:
+    """Run a claimed task in its own logging context."""
+    log.add_context(task_id=task_id, task_type=task_type, asf_uid=asf_uid)
+    # Usage is measured for the whole worker process, so it is only attributable to a task which runs alone
+    alone = not _usage_running
+    if not alone:
+        _usage_overlapped.update({*_usage_running, task_id})
+    _usage_running.add(task_id)
+    try:
+        # Reading the counters from /proc is blocking file IO, so it is done outside the event loop
+        if alone:
+            # The peak is shared by the whole process, so it must not be reset while another task is measuring it
+            await asyncio.to_thread(_usage_peak_rss_reset)
+        usage_start = await asyncio.to_thread(_usage_snapshot, archives.pool_pids())
+        await _task_process(task_id, task_type, task_args, asf_uid, usage_start)
+    except Exception:
+        log.exception(f"Error running task {task_id} ({task_type})")
+    finally:
+        _tasks_finishing.discard(task_id)
+        _usage_running.discard(task_id)
+        _usage_overlapped.discard(task_id)
+
+
+async def _tasks_claim(
+    plan: list[tuple[list[sql.TaskType] | None, int]], limit: int, lease_seconds: int
+) -> list[ClaimedTask]:
+    """Claim up to limit tasks following a claim plan."""
+    claimed: list[ClaimedTask] = []
+    for task_types, class_free in plan:
+        count = min(class_free, limit - len(claimed))
+        if count < 1:
+            break
+        claimed.extend(await _tasks_next_claim(count, task_types, lease_seconds))
+    return claimed
+
+
+async def _tasks_lease_renew(lease_seconds: int) -> set[int]:
+    """Extend the leases of all tasks held by this worker, returning the IDs of the tasks still held."""
+    lease_expires = datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=lease_seconds)
+    async with db.session() as data:
+        async with data.begin():
+            update_stmt = (
+                sqlmodel.update(sql.Task)
+                .where(sqlmodel.and_(sql.Task.pid == os.getpid(), sql.Task.status == task.ACTIVE))
+                .values(lease_expires=lease_expires)
+                .returning(sql.validate_instrumented_attribute(sql.Task.id))
+            )
+            result = await data.execute(update_stmt)
+            return set(result.scalars().all())
+
+
+async def _tasks_next_claim(
+    limit: int, task_types: Collection[sql.TaskType] | None, lease_seconds: int
+) -> list[ClaimedTask]:
+    """
+    Attempt to claim up to limit unclaimed tasks, by priority and then fairly across projects.
+    If task_types is given, only tasks of those types are considered.
+    Returns a list of (task_id, task_type, task_args, asf_uid), empty if no tasks are available.
+    """
+    via = sql.validate_instrumented_attribute
+    async with db.session() as data:
+        async with data.begin():
+            # Get the IDs of the oldest queued tasks
+            now = datetime.datetime.now(datetime.UTC)
+            conditions = [
+                sql.Task.status == task.QUEUED,
+                sqlmodel.or_(
+                    via(sql.Task.scheduled).is_(None),
+                    via(sql.Task.scheduled) <= now,
+                ),
+            ]
+            if task_types is not None:
+                conditions.append(via(sql.Task.task_type).in_(task_types))
+            # Only claim tasks whose prerequisite, if any, has completed
+            conditions.append(sql.task_prerequisite_completed())
+            # Within each priority class, rank the tasks of each project by age
+            # Ordering by that rank takes tasks from each project in turn, so large revisions do not starve others
+            ranked_tasks = (
+                sqlmodel.select(
+                    via(sql.Task.id).label("id"),
+                    via(sql.Task.priority).label("priority"),
+                    via(sql.Task.added).label("added"),
+                    sqlalchemy.func.row_number()
+                    .over(
+                        partition_by=(via(sql.Task.priority), via(sql.Task.project_name)),
+                        order_by=via(sql.Task.added).asc(),
+                    )
+                    .label("project_rank"),
+                )
+                .where(sqlmodel.and_(*conditions))
+                .subquery()
+            )
+            oldest_queued_tasks = (
+                sqlmodel.select(ranked_tasks.c.id)
+                .order_by(ranked_tasks.c.priority.asc(), ranked_tasks.c.project_rank.asc(), ranked_tasks.c.added.asc())
+                .limit(limit)
+            )
+
+            # Use an UPDATE with a WHERE clause to atomically claim the tasks
+            # This ensures that only one worker can claim a specific task
+            lease_expires = now + datetime.timedelta(seconds=lease_seconds)
+            update_stmt = (
+                sqlmodel.update(sql.Task)
+                .where(sqlmodel.and_(via(sql.Task.id).in_(oldest_queued_tasks), sql.Task.status == task.QUEUED))
+                .values(status=task.ACTIVE, started=now, pid=os.getpid(), lease_expires=lease_expires)
+                .returning(
+                    via(sql.Task.id),
+                    via(sql.Task.task_type),
+                    via(sql.Task.task_args),
+                    via(sql.Task.asf_uid),
+                )
+            )
+
+            result = await data.execute(update_stmt)
+            claimed_tasks: list[ClaimedTask] = []
+            for task_id, task_type, task_args, asf_uid in result.all():
+                log.info(f"Claimed task {task_id} ({task_type}) with args {task_args}")
+                claimed_tasks.append((task_id, task_type, task_args, asf_uid))
+            return claimed_tasks
+
+
+def _usage_peak_rss() -> int:
+    """Return the peak resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # This is the peak over the lifetime of the process, in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _usage_peak_rss_reset() -> None:
+    """Reset the peak resident set size of this process, so that it can be measured per task."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _usage_process_cpu_seconds(pid: int) -> float:
+    """Return the CPU time of a process, which need not be a child of this process, or 0 if it has exited."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return 0.0
+    # The command name may contain spaces, so the fields are counted from the parenthesis which closes it
+    fields = stat.rpartition(")")[2].split()
+    utime, stime = int(fields[11]), int(fields[12])
+    return (utime + stime) / os.sysconf("SC_CLK_TCK")
+
+
+def _usage_record(task_obj: sql.Task, usage_start: TaskUsage, usage_end: TaskUsage | None) -> None:
+    """Record how long a task was queued, and the usage of its worker while it ran, if no other task ran with it."""
+    if task_obj.started is not None:
+        queued_since = task_obj.added
+        if (task_obj.scheduled is not None) and (task_obj.scheduled > queued_since):
+            queued_since = task_obj.scheduled
+        task_obj.queue_wait_seconds = max(0.0, (task_obj.started - queued_since).total_seconds())
+    task_obj.usage_overlapped = usage_end is None
+    if usage_end is None:
+        # The counters of the worker include the usage of the other tasks, so none of it is recorded
+        return
+    task_obj.cpu_user_seconds = usage_end.cpu_user_seconds - usage_start.cpu_user_seconds
+    task_obj.cpu_system_seconds = usage_end.cpu_system_seconds - usage_start.cpu_system_seconds
+    # A pool process which was replaced during the task takes its CPU time with it
+    task_obj.child_cpu_seconds = max(0.0, usage_end.child_cpu_seconds - usage_start.child_cpu_seconds)
+    task_obj.peak_rss_bytes = usage_end.peak_rss_bytes
+    task_obj.read_bytes = usage_end.read_bytes - usage_start.read_bytes
+    task_obj.written_bytes = usage_end.written_bytes - usage_start.written_bytes
+
+
+def _usage_snapshot(pool_pids: list[int]) -> TaskUsage:
+    """Measure the cumulative resource usage of this process, its subprocesses, and the given pool processes."""
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    # Subprocesses are only counted once they have been reaped, which the processes of the archive pool never are
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    pool_cpu_seconds = sum(_usage_process_cpu_seconds(pid) for pid in pool_pids)
+    # These count the bytes passed to read and write calls, whether or not they reached the disk
+    io_counters: dict[str, int] = {}
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                io_counters[key] = int(value)
+    except OSError:
+        pass
+    return TaskUsage(
+        cpu_user_seconds=self_usage.ru_utime,
+        cpu_system_seconds=self_usage.ru_stime,
+        child_cpu_seconds=children_usage.ru_utime + children_usage.ru_stime + pool_cpu_seconds,
+        peak_rss_bytes=_usage_peak_rss(),
+        read_bytes=io_counters.get("rchar", 0),
+        written_bytes=io_counters.get("wchar", 0),
+    )
+
+
+async def _worker_heartbeat_run(running: dict[asyncio.Task[None], TaskClass], lease_seconds: int) -> None:
+    """Periodically renew the leases of running tasks so that the manager does not requeue them."""
+    while True:
+        await asyncio.sleep(lease_seconds / 4)
+        if not running:
+            continue
+        try:
+            held_ids = await _tasks_lease_renew(lease_seconds)
+        except Exception:
+            log.exception("Error renewing task leases")
+            continue
+        # A task that is no longer held has been superseded or requeued, so its result would be discarded
+        for running_task in list(running):
+            task_id = int(running_task.get_name())
+            # A task which is recording its outcome is no longer held once that has been committed
+            finishing = task_id in _tasks_finishing
+            if (task_id not in held_ids) and (not finishing) and (not running_task.done()):
+                log.info(f"Cancelling task {task_id}, which is no longer held by this worker")
+                running_task.cancel()
+
 
 async def _worker_loop_run() -> None:
     """Main worker loop."""
-    processed = 0
+    import atr.config as config
+
+    conf = config.get()
+    concurrency = max(1, conf.WORKER_TASK_CONCURRENCY)
+    limits: dict[TaskClass, int] = {
+        "cpu": max(1, conf.WORKER_CPU_TASK_CONCURRENCY),
+        "subprocess": max(1, conf.WORKER_SUBPROCESS_TASK_CONCURRENCY),
+    }
+    batch_size = max(1, conf.WORKER_CLAIM_BATCH_SIZE)
+    lease_seconds = conf.WORKER_LEASE_SECONDS
+    # With a wakeup socket, polling the queue is only a slow fallback
+    # It is still needed to pick up scheduled tasks once they become due
+    wakeup_socket = wakeup.listen()
+    poll_interval = conf.WORKER_POLL_INTERVAL_SECONDS
+    running: dict[asyncio.Task[None], TaskClass] = {}
+    heartbeat_task = asyncio.create_task(_worker_heartbeat_run(running, lease_seconds))
+    claimed = 0
     max_to_process = 10
-    while True:
-        log.clear_context()
-        try:
-            log.add_context(worker_pid=os.getpid())
-            task = await _task_next_claim()
-            if task:
-                task_id, task_type, task_args, asf_uid = task
-                log.add_context(task_id=task_id, task_type=task_type, asf_uid=asf_uid)
-                await _task_process(task_id, task_type, task_args, asf_uid)
-                processed += 1
-                # Only process max_to_process tasks and then exit
+    try:
+        while True:
+            log.clear_context()
+            try:
+                log.add_context(worker_pid=os.getpid())
+                # Only claim max_to_process tasks and then exit once they have finished
                 # This prevents memory leaks from accumulating
                 # Another worker will be started automatically when one exits
-                if processed >= max_to_process:
+                can_claim = (claimed < max_to_process) and (len(running) < concurrency)
+                if can_claim:
+                    limit = min(batch_size, concurrency - len(running), max_to_process - claimed)
+                    plan = _task_claim_plan(running.values(), limits, limit)
+                    claimed_tasks = await _tasks_claim(plan, limit, lease_seconds)
+                    for task_id, task_type, task_args, asf_uid in claimed_tasks:
+                        running_task = asyncio.create_task(
+                            _task_run(task_id, task_type, task_args, asf_uid), name=str(task_id)
+                        )
+                        running[running_task] = _task_class(task_type)
+                    claimed += len(claimed_tasks)
+                    if claimed_tasks:
+                        continue
+
+                if (not running) and (claimed >= max_to_process):
                     break
-            else:
-                # No tasks available, wait 100ms before checking again
-                await asyncio.sleep(0.1)
-        except Exception:
-            # TODO: Should probably be more robust about this
-            log.exception("Worker loop error")
-            await asyncio.sleep(1)
+
+                # Wait for a running task to finish, or for new tasks to be queued
+                await _worker_loop_wait(running, wakeup_socket if can_claim else None, poll_interval)
+            except Exception:
+                # TODO: Should probably be more robust about this
+                log.exception("Worker loop error")
+                await asyncio.sleep(1)
+    finally:
+        heartbeat_task.cancel()
+        if wakeup_socket is not None:
+            wakeup_socket.close()
+            wakeup.remove(os.getpid())
+
+
+async def _worker_loop_wait(
+    running: dict[asyncio.Task[None], TaskClass], wakeup_socket: socket.socket | None, poll_interval: float
+) -> None:
+    """Wait until a running task finishes or a wakeup is received, then forget finished tasks."""
+    waiters: set[asyncio.Future[None]] = set(running)
+    wakeup_task = None
+    if wakeup_socket is not None:
+        wakeup_task = asyncio.create_task(wakeup.wait(wakeup_socket))
+        waiters.add(wakeup_task)
+    # Without a wakeup socket, fall back to checking again every 100ms
+    timeout = poll_interval if (wakeup_task is not None) else 0.1
+    if waiters:
+        await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    else:
+        await asyncio.sleep(timeout)
+    if wakeup_task is not None:
+        wakeup_task.cancel()
+    for finished_task in [t for t in running if t.done()]:
+        del running[finished_task]
 
 
 def _worker_resources_limit_set() -> None:
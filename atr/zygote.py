@@ -0,0 +1,92 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""zygote.py - Fork server which starts task worker processes for ATR"""
+
+import contextlib
+import datetime
+import gc
+import os
+import signal
+import socket
+import sys
+
+# Import everything that a worker needs before forking, so that workers start without import costs
+# Nothing here may start threads or open database connections, because those do not survive a fork
+import atr.archives as archives
+import atr.worker as worker
+
+
+def main(socket_path: str) -> None:
+    """Serve requests to fork a worker on a Unix socket, replying with the PID of each worker."""
+    signal.signal(signal.SIGCHLD, _children_reap)
+    # Keep the preloaded objects out of the garbage collector so that pages stay shared with workers
+    gc.freeze()
+
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+
+    while True:
+        connection, _address = server.accept()
+        with connection:
+            request = connection.recv(64)
+            if request.strip() != b"spawn":
+                continue
+            pid = os.fork()
+            if pid == 0:
+                server.close()
+                connection.close()
+                _child_run()
+            connection.sendall(f"{pid}\n".encode())
+
+
+def _child_run() -> None:
+    """Run a worker in a freshly forked child, and never return."""
+    exit_code = 0
+    try:
+        os.setsid()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        gc.unfreeze()
+        worker.main()
+    except Exception as e:
+        exit_code = 1
+        os.makedirs("logs", exist_ok=True)
+        with open("logs/atr-worker-error.log", "a") as f:
+            f.write(f"{datetime.datetime.now(datetime.UTC)}: {e}\n")
+            f.flush()
+    finally:
+        # The exit handlers which would stop the process pool of the worker are skipped, so stop it here
+        with contextlib.suppress(Exception):
+            archives.pool_shutdown()
+        # Do not unwind into the zygote loop or run its exit handlers
+        os._exit(exit_code)
+
+
+def _children_reap(signum: int, frame: object) -> None:
+    """Reap exited workers, so that the manager sees them as no longer running."""
+    with contextlib.suppress(ChildProcessError):
+        while True:
+            pid, _status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
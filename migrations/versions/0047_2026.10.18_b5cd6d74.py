@@ -0,0 +1,75 @@
+"""superseded tasks
+
+Revision ID: 0047_2026.10.18_b5cd6d74
+Revises: 0046_2026.10.18_4f593e24
+Create Date: 2026-10-18 02:48:35.990233+00:00
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# Revision identifiers, used by Alembic
+revision: str = "0047_2026.10.18_b5cd6d74"
+down_revision: str | None = "0046_2026.10.18_4f593e24"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+_STATUS_TRANSITIONS_OLD = """
+            (
+                -- Initial state is always valid
+                status = 'QUEUED'
+                -- QUEUED -> ACTIVE requires setting started time and pid
+                OR (status = 'ACTIVE' AND started IS NOT NULL AND pid IS NOT NULL)
+                -- ACTIVE -> COMPLETED requires setting completed time and result
+                OR (status = 'COMPLETED' AND completed IS NOT NULL AND result IS NOT NULL)
+                -- ACTIVE -> FAILED requires setting completed time and error (result optional)
+                OR (status = 'FAILED' AND completed IS NOT NULL AND error IS NOT NULL)
+            )
+            """
+
+_STATUS_TRANSITIONS_NEW = """
+            (
+                -- Initial state is always valid
+                status = 'QUEUED'
+                -- QUEUED -> ACTIVE requires setting started time and pid
+                OR (status = 'ACTIVE' AND started IS NOT NULL AND pid IS NOT NULL)
+                -- ACTIVE -> COMPLETED requires setting completed time and result
+                OR (status = 'COMPLETED' AND completed IS NOT NULL AND result IS NOT NULL)
+                -- ACTIVE -> FAILED requires setting completed time and error (result optional)
+                OR (status = 'FAILED' AND completed IS NOT NULL AND error IS NOT NULL)
+                -- QUEUED or ACTIVE -> SUPERSEDED requires setting completed time and error
+                OR (status = 'SUPERSEDED' AND completed IS NOT NULL AND error IS NOT NULL)
+            )
+            """
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("task", schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f("ck_task_valid_task_status_transitions"), type_="check")
+        batch_op.alter_column(
+            "status",
+            existing_type=sa.VARCHAR(length=9),
+            type_=sa.Enum("QUEUED", "ACTIVE", "COMPLETED", "FAILED", "SUPERSEDED", name="taskstatus"),
+            existing_nullable=False,
+        )
+        batch_op.create_check_constraint(
+            batch_op.f("ck_task_valid_task_status_transitions"), sa.text(_STATUS_TRANSITIONS_NEW)
+        )
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM task WHERE status = 'SUPERSEDED'")
+    with op.batch_alter_table("task", schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f("ck_task_valid_task_status_transitions"), type_="check")
+        batch_op.alter_column(
+            "status",
+            existing_type=sa.Enum("QUEUED", "ACTIVE", "COMPLETED", "FAILED", "SUPERSEDED", name="taskstatus"),
+            type_=sa.VARCHAR(length=9),
+            existing_nullable=False,
+        )
+        batch_op.create_check_constraint(
+            batch_op.f("ck_task_valid_task_status_transitions"), sa.text(_STATUS_TRANSITIONS_OLD)
+        )
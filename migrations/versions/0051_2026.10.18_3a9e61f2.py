@@ -0,0 +1,36 @@
+"""fail legacy sbom generation tasks
+
+Revision ID: 0051_2026.10.18_3a9e61f2
+Revises: 0050_2026.10.18_8c1d42a7
+Create Date: 2026-10-18 11:04:17.532106+00:00
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# Revision identifiers, used by Alembic
+revision: str = "0051_2026.10.18_3a9e61f2"
+down_revision: str | None = "0050_2026.10.18_8c1d42a7"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # SBOM generation tasks queued before this wrote into the interim directory of a revision
+    # That directory is removed once the web handler finishes, so these tasks can no longer run
+    # They also lack the fields of the new arguments, so fail them instead of letting the worker do so
+    op.execute("""
+        UPDATE task
+        SET status = 'FAILED',
+            completed = CURRENT_TIMESTAMP,
+            error = 'SBOM generation task was queued by an earlier version and cannot be run'
+        WHERE task_type = 'SBOM_GENERATE_CYCLONEDX'
+            AND status IN ('QUEUED', 'ACTIVE')
+            AND json_extract(task_args, '$.project_name') IS NULL
+    """)
+
+
+def downgrade() -> None:
+    # The interim directories are gone, so the failed tasks could not run after a downgrade either
+    pass
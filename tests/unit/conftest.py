@@ -0,0 +1,54 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import pathlib
+from collections.abc import AsyncGenerator
+
+import pytest
+import sqlalchemy.ext.asyncio
+import sqlmodel
+
+import atr.config as config
+import atr.db as db
+
+
+@pytest.fixture
+async def database(monkeypatch: pytest.MonkeyPatch) -> AsyncGenerator[None]:
+    # An in-memory database with every table, used through db.session as the application uses it
+    engine = sqlalchemy.ext.asyncio.create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(sqlmodel.SQLModel.metadata.create_all)
+    sessionmaker = sqlalchemy.ext.asyncio.async_sessionmaker(bind=engine, class_=db.Session, expire_on_commit=False)
+    monkeypatch.setattr(db, "_global_atr_sessionmaker", sessionmaker)
+    yield
+    await engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    # Anything written to the state directory, such as manifests and gzip indexes, goes to a temporary directory
+    conf = config.get()
+    default_state_dir = conf.STATE_DIR
+    path = tmp_path / "state"
+    path.mkdir()
+    for name in dir(conf):
+        value = getattr(conf, name)
+        if (not name.isupper()) or (not isinstance(value, str)):
+            continue
+        if (value == default_state_dir) or value.startswith(default_state_dir + "/"):
+            monkeypatch.setattr(conf, name, str(path) + value.removeprefix(default_state_dir))
+    return path
@@ -0,0 +1,213 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import os
+import pathlib
+import zipfile
+from collections.abc import Generator
+from typing import Self
+
+import pytest
+
+import atr.archives as archives
+import atr.config as config
+import atr.tarzip as tarzip
+import atr.tasks.checks.license as license_checks
+import atr.tasks.checks.zipformat as zipformat
+
+_HEADER = b"""# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+
+
+class _MockVisitor:
+    metadata_only = False
+
+    def __init__(self, limit: int, read_all: bool = False) -> None:
+        self.limit = limit
+        self.read_all = read_all
+        self.visited: list[tuple[str, bytes | None]] = []
+        self.errors: list[Exception | None] = []
+
+    def content_limit(self, member: tarzip.MemberInfo) -> int:
+        return self.limit
+
+    def finish(self, error: Exception | None) -> None:
+        self.errors.append(error)
+
+    def merge(self, shard: Self) -> None:
+        self.visited.extend(shard.visited)
+
+    def visit(self, member: tarzip.MemberInfo, content: bytes | None) -> None:
+        self.visited.append((member.name, content))
+
+
+@pytest.fixture
+def parallel(monkeypatch: pytest.MonkeyPatch) -> Generator[None]:
+    monkeypatch.setattr(config.get(), "ZIP_PARALLEL_PROCESSES", 2)
+    monkeypatch.setattr(config.get(), "ZIP_PARALLEL_MIN_MEMBERS", 10)
+    yield
+    for pool in archives._POOLS.values():
+        pool.shutdown()
+    archives._POOLS.clear()
+
+
+def test_scan_finishes_visitors_with_member_limit_error(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    zip_path = _make_zip(tmp_path / "sample-1.0.zip")
+    original_open = tarzip.open_archive
+
+    def limited_open(path: str, *args, **kwargs):
+        return original_open(path, max_members=2)
+
+    monkeypatch.setattr(tarzip, "open_archive", limited_open)
+    visitor = _MockVisitor(0)
+    headers = license_checks.HeadersVisitor(zip_path.name, [], "none")
+    archives.scan(str(zip_path), [visitor, headers])
+
+    # Each visitor is finished once, with the error which ended the scan
+    assert [name for name, _ in visitor.visited] == ["sample-1.0/", "sample-1.0/LICENSE"]
+    assert (len(visitor.errors) == 1) and isinstance(visitor.errors[0], tarzip.ArchiveMemberLimitExceededError)
+    header_results = list(headers.results())
+    assert (len(header_results) == 1) and header_results[0].message.startswith("Archive has too many members")
+
+
+def test_scan_passes_each_visitor_the_content_it_requested(tmp_path: pathlib.Path):
+    zip_path = _make_zip(tmp_path / "sample-1.0.zip")
+    prefix = _MockVisitor(8)
+    whole = _MockVisitor(archives.SCAN_CONTENT_ALL)
+    metadata = _MockVisitor(0)
+    archives.scan(str(zip_path), [prefix, whole, metadata])
+
+    with zipfile.ZipFile(zip_path) as zf:
+        expected = [(info.filename, None if info.is_dir() else zf.read(info)) for info in zf.infolist()]
+    # The visitors share one pass over the archive, and each sees every member with the content it asked for
+    assert whole.visited == expected
+    assert prefix.visited == [(name, content and content[:8]) for name, content in expected]
+    assert metadata.visited == [(name, None) for name, _ in expected]
+    assert prefix.errors == whole.errors == metadata.errors == [None]
+
+
+def test_scan_read_all_verifies_members_which_no_visitor_reads(tmp_path: pathlib.Path):
+    zip_path = _make_zip(tmp_path / "sample-1.0.zip")
+    data = bytearray(zip_path.read_bytes())
+    position = data.index(b"file 25\n")
+    data[position] ^= 0xFF
+    zip_path.write_bytes(bytes(data))
+
+    unverified = _MockVisitor(0)
+    archives.scan(str(zip_path), [unverified])
+    assert unverified.errors == [None]
+
+    # A visitor which needs integrity has every member read to its end, even without content
+    verified = _MockVisitor(0, read_all=True)
+    archives.scan(str(zip_path), [verified])
+    assert (len(verified.errors) == 1) and ("Bad CRC-32" in str(verified.errors[0]))
+    assert all(content is None for _, content in verified.visited)
+
+
+def test_zip_extract_parallel(tmp_path: pathlib.Path, parallel: None):
+    zip_path = _make_zip(tmp_path / "sample-1.0.zip")
+    extract_dir = tmp_path / "extracted"
+
+    total, paths = archives.extract(str(zip_path), str(extract_dir), 10**6, 1024, track_files={"LICENSE"})
+
+    assert os.getpid() in archives._POOLS
+    assert paths == ["sample-1.0/LICENSE"]
+    with zipfile.ZipFile(zip_path) as zf:
+        files = [info for info in zf.infolist() if not info.is_dir()]
+        assert total == sum(info.file_size for info in files)
+        for info in files:
+            assert (extract_dir / info.filename).read_bytes() == zf.read(info)
+
+
+def test_zip_extract_parallel_enforces_total_size(tmp_path: pathlib.Path, parallel: None):
+    zip_path = _make_zip(tmp_path / "sample-1.0.zip")
+    with zipfile.ZipFile(zip_path) as zf:
+        largest = max(info.file_size for info in zf.infolist())
+
+    with pytest.raises(archives.ExtractionError, match="maximum size limit"):
+        archives.extract(str(zip_path), str(tmp_path / "extracted"), largest * 2, 1024)
+
+
+def test_zip_scan_parallel_matches_sequential(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch, parallel: None):
+    zip_path = _make_zip(tmp_path / "sample-1.0.zip")
+
+    monkeypatch.setattr(config.get(), "ZIP_PARALLEL_MIN_MEMBERS", 1000)
+    sequential = _scan_results(zip_path)
+    assert os.getpid() not in archives._POOLS
+    monkeypatch.setattr(config.get(), "ZIP_PARALLEL_MIN_MEMBERS", 10)
+    assert _scan_results(zip_path) == sequential
+    assert os.getpid() in archives._POOLS
+    assert sequential[0] == {"member_count": 31}
+
+
+def test_zip_scan_parallel_merges_shards_in_member_order(tmp_path: pathlib.Path, parallel: None):
+    zip_path = _make_zip(tmp_path / "sample-1.0.zip")
+    visitor = _MockVisitor(archives.SCAN_CONTENT_ALL)
+    archives.scan(str(zip_path), [visitor])
+
+    assert os.getpid() in archives._POOLS
+    with zipfile.ZipFile(zip_path) as zf:
+        assert visitor.visited == [(info.filename, None if info.is_dir() else zf.read(info)) for info in zf.infolist()]
+    # The visitor in this process only merges the shards, and is finished once
+    assert visitor.errors == [None]
+
+
+def test_zip_scan_parallel_reports_bad_crc(tmp_path: pathlib.Path, parallel: None):
+    zip_path = _make_zip(tmp_path / "sample-1.0.zip")
+    data = bytearray(zip_path.read_bytes())
+    position = data.index(b"file 25\n")
+    data[position] ^= 0xFF
+    zip_path.write_bytes(bytes(data))
+
+    visitor = zipformat.IntegrityVisitor()
+    archives.scan(str(zip_path), [visitor])
+
+    assert os.getpid() in archives._POOLS
+    assert "Bad CRC-32" in visitor.result()["error"]
+
+
+def _make_zip(path: pathlib.Path) -> pathlib.Path:
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("sample-1.0/", "")
+        zf.writestr("sample-1.0/LICENSE", "Apache License\n")
+        for i in range(29):
+            header = _HEADER if (i % 3) else b""
+            zf.writestr(f"sample-1.0/src/file{i}.py", header + (f"file {i}\n" * (i + 1)).encode())
+    return path
+
+
+def _scan_results(zip_path: pathlib.Path) -> tuple[dict, dict, list]:
+    integrity = zipformat.IntegrityVisitor()
+    structure = zipformat.StructureVisitor("sample-1.0")
+    headers = license_checks.HeadersVisitor(zip_path.name, [], "none")
+    archives.scan(str(zip_path), [integrity, structure, headers])
+    return integrity.result(), structure.result(), [result.model_dump() for result in headers.results()]
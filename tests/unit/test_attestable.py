@@ -0,0 +1,79 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import os
+import pathlib
+
+import pytest
+
+import atr.attestable as attestable
+import atr.hashes as hashes
+import atr.util as util
+
+
+async def test_index_of_revision(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(util, "get_attestable_dir", lambda: tmp_path / "attestable")
+    monkeypatch.setattr(util, "get_unfinished_dir", lambda: tmp_path / "unfinished")
+    revision_dir = tmp_path / "unfinished" / "example" / "1.0" / "00001"
+    (revision_dir / "docs").mkdir(parents=True)
+    for rel_path in ["apache-example-1.0.tar.gz", "docs/apache-example-1.0.tar.gz", "apache-example-1.0.zip"]:
+        (revision_dir / rel_path).write_bytes(rel_path.rsplit(".", 1)[-1].encode())
+    await attestable.write(revision_dir, "example", "1.0", "00001", "user", None)
+
+    index = attestable.index("example", "1.0", "00001")
+    assert index is not None
+    assert attestable.index("example", "1.0", "00001") is index
+    assert attestable.index("example", "1.0", "00002") is None
+    tar_hash = index.hash("apache-example-1.0.tar.gz")
+    assert tar_hash == f"blake3:{hashes.digest(revision_dir / 'apache-example-1.0.tar.gz', 'blake3')}"
+    assert index.hash("docs/apache-example-1.0.tar.gz") == tar_hash
+
+    # The hash of a file of a revision is read from the index instead of the file
+    zip_path = revision_dir / "apache-example-1.0.zip"
+    assert attestable.file_blake3(zip_path) == util.unwrap(index.hash("apache-example-1.0.zip")).removeprefix("blake3:")
+    index.paths["apache-example-1.0.zip"] = "blake3:indexed"
+    index.sizes["blake3:indexed"] = zip_path.stat().st_size
+    assert attestable.file_blake3(zip_path) == "indexed"
+    other_path = tmp_path / "apache-example-1.0.zip"
+    other_path.write_bytes(zip_path.read_bytes())
+    assert attestable.file_blake3(other_path) == hashes.digest(zip_path, "blake3")
+
+
+async def test_write_hashes_only_new_files(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(util, "get_attestable_dir", lambda: tmp_path / "attestable")
+    monkeypatch.setattr(util, "get_unfinished_dir", lambda: tmp_path / "unfinished")
+    parent_dir = tmp_path / "unfinished" / "example" / "1.0" / "00001"
+    parent_dir.mkdir(parents=True)
+    (parent_dir / "apache-example-1.0.tar.gz").write_bytes(b"source")
+    (parent_dir / "apache-example-1.0.zip").write_bytes(b"binary")
+    await attestable.write(parent_dir, "example", "1.0", "00001", "user", None)
+
+    # Like a new revision, which hard links the files of its parent that it does not change
+    revision_dir = parent_dir.with_name("00002")
+    revision_dir.mkdir()
+    os.link(parent_dir / "apache-example-1.0.tar.gz", revision_dir / "apache-example-1.0-source.tar.gz")
+    (revision_dir / "apache-example-1.0.zip").write_bytes(b"changed")
+    hashed: list[str] = []
+    digest = hashes.digest
+    monkeypatch.setattr(hashes, "digest", lambda path, algorithm: hashed.append(str(path)) or digest(path, algorithm))
+    await attestable.write(revision_dir, "example", "1.0", "00002", "user", "00001")
+
+    assert hashed == [str(revision_dir / "apache-example-1.0.zip")]
+    parent = util.unwrap(attestable.index("example", "1.0", "00001"))
+    index = util.unwrap(attestable.index("example", "1.0", "00002"))
+    assert index.hash("apache-example-1.0-source.tar.gz") == parent.hash("apache-example-1.0.tar.gz")
+    assert index.hash("apache-example-1.0.zip") == f"blake3:{digest(revision_dir / 'apache-example-1.0.zip', 'blake3')}"
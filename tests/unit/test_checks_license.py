@@ -15,8 +15,11 @@
 # specific language governing permissions and limitations
 # under the License.
 
+import io
 import pathlib
+import zipfile
 
+import atr.tarzip as tarzip
 import atr.tasks.checks.license as license
 
 TEST_ARCHIVE = pathlib.Path(__file__).parent.parent / "e2e" / "test_files" / "apache-test-0.2.tar.gz"
@@ -59,3 +62,20 @@ def test_headers_check_includes_excludes_source_policy():
     artifact_results = [r for r in results if isinstance(r, license.ArtifactResult)]
     final_result = artifact_results[-1]
     assert final_result.data["excludes_source"] == "policy"
+
+
+def test_headers_visitor_decides_whether_to_ignore_each_member_it_visits():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("apache-test-0.2/main.py", "print()\n")
+        zf.writestr("apache-test-0.2/main.java", "class Main {}\n")
+        ignored, checked = [tarzip.ZipMember(info) for info in zf.infolist()]
+    visitor = license.HeadersVisitor("apache-test-0.2.tar.gz", ["*.py"], "policy")
+    assert visitor.content_limit(ignored) == 0
+    assert visitor.content_limit(checked) == license.HEADERS_CONTENT_LIMIT
+
+    # The decision does not depend on content_limit having been called for the same member just before
+    visitor.visit(checked, b"class Main {}\n")
+    visitor.visit(ignored, b"print()\n")
+    assert [result.path for result in visitor.member_results] == ["apache-test-0.2/main.java"]
+    assert visitor.artifact_data.files_checked == 1
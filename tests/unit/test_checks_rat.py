@@ -107,6 +107,30 @@ def test_excludes_policy_uses_atr_rat_excludes(rat_available: tuple[bool, bool])
     assert rat._RAT_EXCLUDES_FILENAME not in result.command
 
 
+def test_parse_output_counts_all_and_reports_some(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(rat, "_MAX_REPORTED_FILES", 2)
+    resources = [
+        '<resource name="/base/LICENSE" type="NOTICE"/>',
+        '<resource name="/base/a.py" type="STANDARD"><license approval="true" name="Apache License 2.0"/></resource>',
+        '<resource name="/base/b.py" type="STANDARD"/>',
+        *(
+            f'<resource name="/base/c{i}.py" type="STANDARD"><license approval="false" name="GPL"/></resource>'
+            for i in range(3)
+        ),
+        '<resource name="/base/d.py" type="STANDARD"><license approval="false" name="Unknown license"/></resource>',
+    ]
+    xml_file = tmp_path / "rat-report.xml"
+    xml_file.write_text(f"<rat-report>{''.join(resources)}</rat-report>")
+
+    result = rat._synchronous_extract_parse_output_core(str(xml_file), "/base")
+
+    assert (result.total_files, result.approved_licenses) == (7, 2)
+    assert (result.unapproved_licenses, result.unknown_licenses) == (3, 2)
+    assert [entry.name for entry in result.unapproved_files] == ["c0.py", "c1.py"]
+    assert [entry.name for entry in result.unknown_license_files] == ["b.py", "d.py"]
+    assert not result.valid
+
+
 def test_sanitise_command_replaces_absolute_paths():
     command = [
         "java",
@@ -125,6 +149,18 @@ def test_sanitise_command_replaces_absolute_paths():
     assert result[6] == ".rat-excludes"
 
 
+def test_service_arguments_are_absolute():
+    command = rat._build_rat_command("/opt/tools/apache-rat-0.17.jar", "/work/report.xml", ".rat-excludes", False)
+    arguments = rat._service_arguments(command, "/tree/root")
+    assert arguments[0] == "--output-style"
+    assert "-jar" not in arguments
+    assert arguments[-2:] == ["--", "/tree/root"]
+    idx = arguments.index("--input-exclude-file")
+    assert arguments[idx + 1] == "/tree/root/.rat-excludes"
+    # Exclusion patterns stay relative to the scan root
+    assert ".rat-excludes" in arguments
+
+
 def _skip_if_unavailable(rat_available: tuple[bool, bool]) -> None:
     java_ok, jar_ok = rat_available
     if not java_ok:
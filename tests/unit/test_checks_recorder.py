@@ -0,0 +1,246 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import asyncio
+import dataclasses
+import pathlib
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import pytest
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+import sqlmodel
+
+import atr.config as config
+import atr.db as db
+import atr.models.sql as sql
+import atr.tasks as tasks
+import atr.tasks.checks as checks
+import atr.tasks.checks.hashing as hashing
+import atr.util as util
+
+_checked: list[str] = []
+
+
+@pytest.fixture
+async def database(monkeypatch: pytest.MonkeyPatch) -> AsyncGenerator[None]:
+    engine = sqlalchemy.ext.asyncio.create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(sqlmodel.SQLModel.metadata.create_all, tables=[sql.CheckResult.__table__])
+    sessionmaker = sqlalchemy.ext.asyncio.async_sessionmaker(bind=engine, class_=db.Session, expire_on_commit=False)
+    monkeypatch.setattr(db, "_global_atr_sessionmaker", sessionmaker)
+    monkeypatch.setattr(config.get(), "CHECK_RESULT_BATCH_SIZE", 3)
+    yield
+    await engine.dispose()
+
+
+async def test_buffered_results_are_written_in_batches_and_on_exit(database: None):
+    async with checks.buffered():
+        recorder = await _recorder()
+        for i in range(4):
+            await recorder.failure("Missing header", None, member_rel_path=f"file{i}.py")
+        # Only the first full batch has been written
+        assert await _count() == 3
+        await recorder.success("Checked", {})
+        assert await _count() == 3
+    assert await _count() == 5
+    assert recorder.member_problems == {sql.CheckResultStatus.FAILURE: 4}
+
+
+async def test_buffered_results_are_written_when_the_task_fails(database: None):
+    with pytest.raises(RuntimeError):
+        async with checks.buffered():
+            recorder = await _recorder()
+            await recorder.warning("Partial", None)
+            raise RuntimeError("Check failed")
+    assert await _count() == 1
+
+    with pytest.raises(asyncio.CancelledError):
+        async with checks.buffered():
+            recorder = await _recorder("example.zip")
+            await recorder.warning("Superseded", None)
+            raise asyncio.CancelledError
+    assert await _count() == 1
+
+
+async def test_cached_results_are_copied_to_a_renamed_file(
+    database: None, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(util, "get_unfinished_dir", lambda: tmp_path)
+    _checked.clear()
+    await _run_counted(tmp_path, "00001", "apache-example-1.0.tar.gz")
+    assert _checked == ["apache-example-1.0.tar.gz"]
+
+    # A renamed file with the same content is not checked again
+    await _run_counted(tmp_path, "00002", "apache-example-1.0-source.tar.gz")
+    assert _checked == ["apache-example-1.0.tar.gz"]
+    assert await _paths("00002") == [
+        ("apache-example-1.0-source.tar.gz", "a.py"),
+        ("apache-example-1.0-source.tar.gz", None),
+    ]
+
+    # A change of an argument or of the version of the checker is a cache miss
+    await _run_counted(tmp_path, "00003", "apache-example-1.0.tar.gz", {"mode": "strict"})
+    cacheable = checks._cacheable[checks.function_key(_counted_check)]
+    monkeypatch.setitem(
+        checks._cacheable, checks.function_key(_counted_check), dataclasses.replace(cacheable, version=2)
+    )
+    await _run_counted(tmp_path, "00004", "apache-example-1.0.tar.gz")
+    assert _checked == ["apache-example-1.0.tar.gz"] * 3
+
+
+async def test_cached_results_exclude_checks_which_failed(
+    database: None, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(util, "get_unfinished_dir", lambda: tmp_path)
+    _checked.clear()
+    with pytest.raises(RuntimeError):
+        async with checks.buffered():
+            await _run_counted(tmp_path, "00001", "apache-example-1.0.tar.gz", {"fail": True})
+    # The result recorded before the check failed is kept, but is not reused
+    assert await _paths("00001") == [("apache-example-1.0.tar.gz", "a.py")]
+    await _run_counted(tmp_path, "00002", "apache-example-1.0.tar.gz", {"fail": True})
+    assert _checked == ["apache-example-1.0.tar.gz"] * 2
+    assert await _paths("00002") == [("apache-example-1.0.tar.gz", "a.py"), ("apache-example-1.0.tar.gz", None)]
+
+
+def test_dedup_key_follows_the_cache_declaration(monkeypatch: pytest.MonkeyPatch):
+    project = sql.Project(name="example")
+    check_task = sql.Task(
+        status=sql.TaskStatus.QUEUED,
+        task_type=sql.TaskType.HASHING_CHECK,
+        task_args={},
+        asf_uid="user",
+        primary_rel_path="apache-example-1.0.tar.gz.sha512",
+    )
+    path_hashes = {"apache-example-1.0.tar.gz.sha512": "blake3:hash", "apache-example-1.0.tar.gz": "blake3:artifact"}
+    dedup_key = tasks._dedup_key(check_task, path_hashes, project)
+    assert dedup_key is not None
+
+    # The artifact which a hash file names is an input of the check
+    changed_hashes = {**path_hashes, "apache-example-1.0.tar.gz": "blake3:other"}
+    assert tasks._dedup_key(check_task, changed_hashes, project) not in {None, dedup_key}
+    assert tasks._dedup_key(check_task, {"apache-example-1.0.tar.gz.sha512": "blake3:hash"}, project) is None
+
+    # Increasing the version of the checker changes the identity of the check
+    cacheable = util.unwrap(checks.cacheable(checks.function_key(hashing.check)))
+    monkeypatch.setitem(
+        checks._cacheable, checks.function_key(hashing.check), dataclasses.replace(cacheable, version=2)
+    )
+    assert tasks._dedup_key(check_task, path_hashes, project) not in {None, dedup_key}
+
+
+async def test_results_are_carried_forward_for_unchanged_files(database: None):
+    for path in ["apache-example-1.0.tar.gz", "apache-example-1.0.zip"]:
+        recorder = await _recorder(path)
+        await recorder.failure("Missing header", None, member_rel_path="a.py")
+        await recorder.success("Checked", {})
+
+    copied = await checks.results_carry_forward(
+        sql.release_name("example", "1.0"),
+        "00001",
+        "00002",
+        [("apache-example-1.0.zip", "test.checker"), ("apache-example-1.0.zip", "other.checker")],
+    )
+    assert copied == 2
+    assert await _paths("00002") == [("apache-example-1.0.zip", "a.py"), ("apache-example-1.0.zip", None)]
+
+
+async def test_results_are_copied_between_identical_checks(database: None):
+    for path in ["apache-example-1.0.tar.gz", "apache-example-1.0.zip"]:
+        recorder = await _recorder(path)
+        await recorder.failure("Missing header", None, member_rel_path="a.py")
+        await recorder.success("Checked", {})
+
+    def check_task(revision_number: str, primary_rel_path: str) -> sql.Task:
+        return sql.Task(
+            task_type=sql.TaskType.LICENSE_HEADERS,
+            task_args={},
+            asf_uid="user",
+            project_name="example",
+            version_name="1.0",
+            revision_number=revision_number,
+            primary_rel_path=primary_rel_path,
+        )
+
+    # The results of every identical check are copied in one statement, under the path of each target
+    copied = await checks.results_copy(
+        [
+            (check_task("00001", "apache-example-1.0.zip"), check_task("00002", "renamed.zip"), ["test.checker"]),
+            (check_task("00001", "apache-example-1.0.zip"), check_task("00002", "copy.zip"), ["test.checker"]),
+            (check_task("00001", "apache-example-1.0.tar.gz"), check_task("00002", "other.tar.gz"), ["other.checker"]),
+        ]
+    )
+    assert copied == 4
+    assert sorted(await _paths("00002"), key=str) == sorted(
+        [("renamed.zip", "a.py"), ("renamed.zip", None), ("copy.zip", "a.py"), ("copy.zip", None)], key=str
+    )
+
+
+async def test_unbuffered_results_are_written_immediately(database: None):
+    recorder = await _recorder()
+    await recorder.success("Checked", {})
+    assert await _count() == 1
+
+
+async def _count() -> int:
+    async with db.session() as session:
+        result = await session.execute(sqlmodel.select(sqlalchemy.func.count()).select_from(sql.CheckResult))
+        return result.scalar_one()
+
+
+@checks.cached(version=1, arguments=("mode",))
+async def _counted_check(args: checks.FunctionArguments) -> None:
+    recorder = await args.recorder()
+    _checked.append(args.primary_rel_path or "")
+    await recorder.failure("Missing header", None, member_rel_path="a.py")
+    # Only the first check of a test fails when asked to
+    if args.extra_args.get("fail") and (len(_checked) == 1):
+        raise RuntimeError("Check failed")
+    await recorder.success("Checked", {})
+
+
+async def _paths(revision_number: str) -> list[tuple[str | None, str | None]]:
+    async with db.session() as session:
+        stmt = (
+            sqlmodel.select(sql.CheckResult.primary_rel_path, sql.CheckResult.member_rel_path)
+            .where(sql.CheckResult.revision_number == revision_number)
+            .order_by(sql.validate_instrumented_attribute(sql.CheckResult.id))
+        )
+        return [tuple(row) for row in (await session.execute(stmt)).all()]
+
+
+async def _recorder(primary_rel_path: str = "example.tar.gz") -> checks.Recorder:
+    return await checks.Recorder.create("test.checker", "example", "1.0", "00001", primary_rel_path=primary_rel_path)
+
+
+async def _run_counted(
+    unfinished_dir: pathlib.Path, revision_number: str, primary_rel_path: str, extra_args: dict[str, Any] | None = None
+) -> None:
+    revision_dir = unfinished_dir / "example" / "1.0" / revision_number
+    revision_dir.mkdir(parents=True)
+    (revision_dir / primary_rel_path).write_bytes(b"example")
+
+    async def recorder() -> checks.Recorder:
+        return await checks.Recorder.create(_counted_check, "example", "1.0", revision_number, primary_rel_path)
+
+    await _counted_check(
+        checks.FunctionArguments(
+            recorder, "user", "example", "1.0", revision_number, primary_rel_path, extra_args or {}
+        )
+    )
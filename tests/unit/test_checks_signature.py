@@ -0,0 +1,63 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import pathlib
+import shutil
+
+import gnupg
+import pytest
+
+import atr.tasks.checks.signature as signature
+import atr.util as util
+
+pytestmark = pytest.mark.skipif(shutil.which("gpg") is None, reason="gpg not available")
+
+
+def test_verify_signatures_matches_single_verification(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(util, "get_keyrings_dir", lambda: tmp_path / "keyrings")
+    home = tmp_path / "signer"
+    home.mkdir(mode=0o700)
+    gpg = gnupg.GPG(gnupghome=str(home))
+    key_input = gpg.gen_key_input(
+        key_type="EDDSA", key_curve="ed25519", name_email="release@example.org", no_protection=True
+    )
+    fingerprint = gpg.gen_key(key_input).fingerprint
+    public_keys = [(fingerprint, gpg.export_keys(fingerprint))]
+    apache_uid_map = {fingerprint.lower(): True}
+
+    signature_paths: list[tuple[str, str]] = []
+    for name in ["apache-example-1.0.tar.gz", "apache-example-1.0.zip"]:
+        artifact = tmp_path / name
+        artifact.write_bytes(name.encode())
+        with open(artifact, "rb") as f:
+            gpg.sign_file(f, detach=True, output=f"{artifact}.asc")
+        signature_paths.append((f"{artifact}.asc", str(artifact)))
+    # The signature of the second artifact does not match the content of the first
+    signature_paths.append((signature_paths[1][0], signature_paths[0][1]))
+    signature_paths.append((str(tmp_path / "missing.asc"), signature_paths[0][1]))
+
+    results_data = signature._check_core_logic_verify_signatures(
+        signature_paths, "example", public_keys, apache_uid_map
+    )
+
+    single = signature._check_core_logic_verify_signature(
+        signature_paths[0][0], signature_paths[0][1], "example", public_keys, apache_uid_map
+    )
+    assert results_data[0] == single
+    assert isinstance(results_data[1], dict) and results_data[1]["verified"]
+    assert isinstance(results_data[2], dict) and (results_data[2]["error"] == "No valid signature found")
+    assert isinstance(results_data[3], FileNotFoundError)
@@ -0,0 +1,118 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import concurrent.futures
+import pathlib
+import stat
+import time
+import zipfile
+
+import pytest
+
+import atr.archives as archives
+import atr.attestable as attestable
+import atr.config as config
+import atr.extracts as extracts
+import atr.util as util
+
+
+def test_extracted_evicts_only_entries_not_in_use(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    first = _make_zip(tmp_path / "first.zip", "first")
+    second = _make_zip(tmp_path / "second.zip", "second")
+    third = _make_zip(tmp_path / "third.zip", "third")
+    # Each entry is larger than the cache, so every entry which is not in use is evicted
+    monkeypatch.setattr(config.get(), "EXTRACTS_MAX_BYTES", 1)
+
+    with extracts.extracted(str(first), 10**6, 1024) as first_tree:
+        # Entries are evicted when another is added, and both are in use then
+        with extracts.extracted(str(second), 10**6, 1024):
+            assert _entries() == {_key(first), _key(second)}
+        # The first entry is still in use when the third is added, so only the second is evicted
+        with extracts.extracted(str(third), 10**6, 1024):
+            assert _entries() == {_key(first), _key(third)}
+        assert (first_tree / "first.txt").read_text() == "first"
+
+    # Once nothing uses the entries, adding another evicts them all
+    with extracts.extracted(str(second), 10**6, 1024):
+        assert _entries() == {_key(second)}
+
+
+def test_extracted_extracts_once_for_concurrent_callers(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    archive_path = _make_zip(tmp_path / "sample.zip", "content")
+    extract = archives.extract
+    calls: list[str] = []
+
+    def slow_extract(*args, **kwargs):
+        calls.append(args[0])
+        # The other callers arrive while the archive is being extracted
+        time.sleep(0.2)
+        return extract(*args, **kwargs)
+
+    def read(_index: int) -> str:
+        with extracts.extracted(str(archive_path), 10**6, 1024) as tree_dir:
+            return (tree_dir / "content.txt").read_text()
+
+    monkeypatch.setattr(archives, "extract", slow_extract)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        contents = list(executor.map(read, range(4)))
+
+    assert calls == [str(archive_path)]
+    assert contents == ["content"] * 4
+
+
+def test_extracted_rebuilds_after_an_interrupted_build(tmp_path: pathlib.Path):
+    archive_path = _make_zip(tmp_path / "sample.zip", "content")
+    cache_dir = util.get_extracts_dir()
+    # A process which stopped while extracting leaves its staging directory behind
+    staging_tree = cache_dir / (extracts._STAGING_PREFIX + _key(archive_path)) / extracts._TREE_DIRNAME
+    staging_tree.mkdir(parents=True)
+    (staging_tree / "partial.txt").write_text("partial")
+
+    with extracts.extracted(str(archive_path), 10**6, 1024) as tree_dir:
+        assert sorted(path.name for path in tree_dir.iterdir()) == ["content.txt"]
+    assert not staging_tree.parent.exists()
+
+
+def test_extracted_tree_is_read_only_and_size_limited(tmp_path: pathlib.Path):
+    archive_path = _make_zip(tmp_path / "sample.zip", "content")
+
+    with extracts.extracted(str(archive_path), 10**6, 1024) as tree_dir:
+        assert stat.S_IMODE((tree_dir / "content.txt").stat().st_mode) == 0o444
+        assert stat.S_IMODE(tree_dir.stat().st_mode) == 0o555
+
+    # A cached entry is still checked against the size limit of each caller
+    with pytest.raises(archives.ExtractionError, match="maximum size limit"):
+        with extracts.extracted(str(archive_path), 1, 1024):
+            pass
+
+
+def _entries() -> set[str]:
+    return {
+        path.name
+        for path in util.get_extracts_dir().iterdir()
+        if (not path.name.startswith(".")) and (not path.name.endswith(extracts._LOCK_SUFFIX))
+    }
+
+
+def _key(archive_path: pathlib.Path) -> str:
+    return attestable.file_blake3(str(archive_path))
+
+
+def _make_zip(path: pathlib.Path, name: str) -> pathlib.Path:
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr(f"{name}.txt", name)
+    return path
@@ -0,0 +1,113 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import gzip
+import hashlib
+import io
+import pathlib
+import tarfile
+
+import pytest
+
+import atr.gzindex as gzindex
+import atr.tarzip as tarzip
+import atr.util as util
+
+pytestmark = pytest.mark.skipif(not gzindex.available(), reason="The zlib library is not available")
+
+
+@pytest.fixture
+def manifests_dir(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    path = tmp_path / "manifests"
+    monkeypatch.setattr(util, "get_manifests_dir", lambda: path)
+    # Use small spans so that small files have many seek points
+    monkeypatch.setattr(gzindex, "_SPAN", 64 * 1024)
+    return path
+
+
+def test_indexed_gzip_file_multiple_members(tmp_path: pathlib.Path, manifests_dir: pathlib.Path):
+    content = _content(1024 * 1024)
+    gzip_path = tmp_path / "sample.gz"
+    gzip_path.write_bytes(gzip.compress(content[:300_000]) + gzip.compress(content[300_000:]) + (b"\x00" * 16))
+
+    for _attempt in range(2):
+        with gzindex.IndexedGzipFile(str(gzip_path)) as f:
+            assert f.read() == content
+            f.seek(299_990)
+            assert f.read(20) == content[299_990:300_010]
+
+
+def test_indexed_gzip_file_random_access(tmp_path: pathlib.Path, manifests_dir: pathlib.Path):
+    content = _content(1024 * 1024)
+    gzip_path = tmp_path / "sample.gz"
+    gzip_path.write_bytes(gzip.compress(content))
+    # These positions are out of order, so that the reader seeks backwards
+    positions = [((i * 389_071) % (len(content) - 100_000)) for i in range(1, 21)]
+
+    # Without an index, seeking backwards resumes from the seek points recorded so far
+    with gzindex.IndexedGzipFile(str(gzip_path)) as f:
+        for position in positions:
+            f.seek(position)
+            assert f.read(100_000) == content[position : position + 100_000]
+        # Only a complete inflation from the start, which checks the CRC, stores the index
+        f.seek(0)
+        assert f.read() == content
+    assert len(list(manifests_dir.glob("*.gzindex"))) == 1
+
+    # With an index, spans are inflated independently
+    with gzindex.IndexedGzipFile(str(gzip_path)) as f:
+        for position in positions:
+            f.seek(position)
+            assert f.read(100_000) == content[position : position + 100_000]
+        f.seek(0)
+        assert f.read() == content
+
+
+def test_indexed_gzip_file_truncated(tmp_path: pathlib.Path, manifests_dir: pathlib.Path):
+    gzip_path = tmp_path / "sample.gz"
+    compressed = gzip.compress(_content(1024 * 1024))
+    gzip_path.write_bytes(compressed[: len(compressed) // 2])
+
+    with gzindex.IndexedGzipFile(str(gzip_path)) as f:
+        with pytest.raises(EOFError):
+            f.read()
+    assert not list(manifests_dir.glob("*.gzindex"))
+
+
+def test_open_archive_builds_and_uses_index(tmp_path: pathlib.Path, manifests_dir: pathlib.Path):
+    archive_path = tmp_path / "sample.tar.gz"
+    contents = {f"sample/{i}.txt": _content(50_000 + i) for i in range(20)}
+    with tarfile.open(archive_path, "w:gz") as tf:
+        for name, data in contents.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+
+    for _attempt in range(2):
+        read: dict[str, bytes] = {}
+        with tarzip.open_archive(str(archive_path)) as archive:
+            for member in archive:
+                if (fileobj := archive.extractfile(member)) is not None:
+                    read[member.name] = fileobj.read()
+        assert read == contents
+        assert len(list(manifests_dir.glob("*.gzindex"))) == 1
+
+
+def _content(size: int) -> bytes:
+    words = [hashlib.sha256(str(i).encode()).hexdigest()[: 2 + (i % 9)].encode() for i in range(256)]
+    indexes = hashlib.shake_128(str(size).encode()).digest(size // 4)
+    return b" ".join(words[index] for index in indexes)[:size]
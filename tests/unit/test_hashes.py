@@ -0,0 +1,63 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import os
+import pathlib
+from typing import Any
+
+import blake3
+import pytest
+
+import atr.hashes as hashes
+
+
+def test_digests_are_read_once_until_the_file_changes(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    reads: list[set[str]] = []
+    read = hashes._read
+
+    def counting_read(f: Any, algorithms: set[str]) -> dict[str, str]:
+        reads.append(algorithms)
+        return read(f, algorithms)
+
+    monkeypatch.setattr(hashes, "_read", counting_read)
+    path = tmp_path / "apache-example-1.0.tar.gz"
+    content = b"example" * (hashes._CHUNK_SIZE // 3)
+    path.write_bytes(content)
+
+    assert hashes.digests(path, ["sha512", "sha3_256"]) == {
+        "sha512": hashlib.sha512(content).hexdigest(),
+        "sha3_256": hashlib.sha3_256(content).hexdigest(),
+    }
+    # BLAKE3 was computed in the same read
+    assert hashes.digest(path, "blake3") == blake3.blake3(content).hexdigest()
+    assert reads == [{"blake3", "sha512", "sha3_256"}]
+
+    assert hashes.digest(path, "sha256") == hashlib.sha256(content).hexdigest()
+    assert reads[-1] == {"blake3", "sha256"}
+
+    path.write_bytes(b"changed")
+    os.utime(path, ns=(0, 0))
+    assert hashes.digest(path, "sha512") == hashlib.sha512(b"changed").hexdigest()
+    assert len(reads) == 3
+
+
+def test_unsupported_algorithm(tmp_path: pathlib.Path):
+    path = tmp_path / "file"
+    path.write_bytes(b"")
+    with pytest.raises(ValueError, match="md5"):
+        hashes.digest(path, "md5")
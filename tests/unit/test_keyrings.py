@@ -0,0 +1,71 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import os
+import pathlib
+import shutil
+import time
+
+import gnupg
+import pytest
+
+import atr.keyrings as keyrings
+import atr.util as util
+
+pytestmark = pytest.mark.skipif(shutil.which("gpg") is None, reason="gpg not available")
+
+
+@pytest.fixture
+def keyrings_dir(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    path = tmp_path / "keyrings"
+    monkeypatch.setattr(util, "get_keyrings_dir", lambda: path)
+    return path
+
+
+def test_keyring_is_shared_until_keys_change(tmp_path: pathlib.Path, keyrings_dir: pathlib.Path):
+    signer, key = _signing_key(tmp_path / "signer")
+    artifact = tmp_path / "apache-example-1.0.tar.gz"
+    artifact.write_bytes(b"example")
+    signature = tmp_path / "apache-example-1.0.tar.gz.asc"
+    with open(artifact, "rb") as f:
+        signer.sign_file(f, detach=True, output=str(signature))
+
+    first = keyrings.keyring("example", [key])
+    assert keyrings.keyring("example", [key]) == first
+    with open(signature, "rb") as f:
+        verified = keyrings.gpg(first).verify_file(f, str(artifact))
+    assert verified.valid
+    assert verified.pubkey_fingerprint.lower() == key[0].lower()
+    assert not (os.stat(first / "pubring.kbx").st_mode & 0o222)
+
+    # A stale keyring of the committee is removed when its keys change
+    old = time.time() - 2 * keyrings._STALE_SECONDS
+    os.utime(first, (old, old))
+    _other_signer, other_key = _signing_key(tmp_path / "other")
+    second = keyrings.keyring("example", [key, other_key])
+    assert second != first
+    assert sorted(path.name for path in keyrings_dir.iterdir()) == [second.name]
+
+
+def _signing_key(home: pathlib.Path) -> tuple[gnupg.GPG, tuple[str, str]]:
+    home.mkdir(mode=0o700)
+    gpg = gnupg.GPG(gnupghome=str(home))
+    key_input = gpg.gen_key_input(
+        key_type="EDDSA", key_curve="ed25519", name_email="release@example.org", no_protection=True
+    )
+    fingerprint = gpg.gen_key(key_input).fingerprint
+    return gpg, (fingerprint, gpg.export_keys(fingerprint))
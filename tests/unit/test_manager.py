@@ -0,0 +1,120 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import datetime
+import os
+
+import pytest
+
+import atr.db as db
+import atr.manager as manager
+import atr.models.sql as sql
+
+_LONG_AGO = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+
+
+def test_host_overloaded(monkeypatch: pytest.MonkeyPatch):
+    worker_manager = manager.WorkerManager(scale_up_max_load_per_cpu=1.5, zygote=False)
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(os, "getloadavg", lambda: (6.5, 0.0, 0.0))
+    assert worker_manager._host_overloaded()
+    monkeypatch.setattr(os, "getloadavg", lambda: (5.5, 0.0, 0.0))
+    assert not worker_manager._host_overloaded()
+
+    def unavailable() -> tuple[float, float, float]:
+        raise OSError("Load average is unavailable")
+
+    monkeypatch.setattr(os, "getloadavg", unavailable)
+    assert not worker_manager._host_overloaded()
+
+
+async def test_scale_down_keeps_the_minimum_pool(database: None, monkeypatch: pytest.MonkeyPatch):
+    worker_manager = manager.WorkerManager(min_workers=2, max_workers=4, zygote=False)
+    for pid in [101, 102]:
+        worker_manager.workers[pid] = manager.WorkerProcess(None, _LONG_AGO, forked_pid=pid)
+    killed = _kill_record(monkeypatch)
+    await worker_manager._scale_down(datetime.datetime.now(datetime.UTC))
+    assert killed == []
+
+
+async def test_scale_down_retires_the_longest_idle_worker_holding_no_task(
+    database: None, monkeypatch: pytest.MonkeyPatch
+):
+    worker_manager = manager.WorkerManager(min_workers=1, max_workers=4, scale_down_idle_seconds=60, zygote=False)
+    now = datetime.datetime.now(datetime.UTC)
+    for pid, last_busy in [(101, _LONG_AGO), (102, _LONG_AGO + datetime.timedelta(hours=1)), (103, now)]:
+        worker_manager.workers[pid] = manager.WorkerProcess(None, last_busy, forked_pid=pid)
+    killed = _kill_record(monkeypatch)
+
+    # The longest idle worker claimed a task after it was last seen to be idle
+    async with db.session() as data:
+        data.add(
+            sql.Task(
+                status=sql.TaskStatus.ACTIVE,
+                task_type=sql.TaskType.MESSAGE_SEND,
+                task_args={},
+                asf_uid="user",
+                started=now,
+                pid=101,
+            )
+        )
+        await data.commit()
+
+    await worker_manager._scale_down(now)
+    assert killed == [102]
+    assert sorted(worker_manager.workers) == [101, 103]
+    assert worker_manager.workers[101].last_busy == now
+
+    # Neither remaining worker has been idle for long enough
+    await worker_manager._scale_down(now)
+    assert killed == [102]
+
+
+async def test_scale_up_spawns_workers_for_the_backlog(monkeypatch: pytest.MonkeyPatch):
+    worker_manager = manager.WorkerManager(min_workers=1, max_workers=4, scale_up_queued_per_worker=2, zygote=False)
+    worker_manager.workers[100] = manager.WorkerProcess(None, _LONG_AGO, forked_pid=100)
+
+    async def spawn_worker() -> None:
+        pid = 100 + len(worker_manager.workers)
+        worker_manager.workers[pid] = manager.WorkerProcess(None, _LONG_AGO, forked_pid=pid)
+
+    monkeypatch.setattr(worker_manager, "spawn_worker", spawn_worker)
+    monkeypatch.setattr(worker_manager, "_host_overloaded", lambda: True)
+    await worker_manager._scale_up(5, 0.0)
+    assert len(worker_manager.workers) == 1
+
+    # Five queued tasks want three workers
+    monkeypatch.setattr(worker_manager, "_host_overloaded", lambda: False)
+    await worker_manager._scale_up(5, 0.0)
+    assert len(worker_manager.workers) == 3
+
+    # The pool does not grow beyond its maximum size
+    await worker_manager._scale_up(100, 0.0)
+    assert len(worker_manager.workers) == 4
+    await worker_manager._scale_up(100, 0.0)
+    assert len(worker_manager.workers) == 4
+
+    # An old task adds a worker even when there are few queued tasks
+    worker_manager.workers = {100: worker_manager.workers[100]}
+    await worker_manager._scale_up(1, 60.0)
+    assert len(worker_manager.workers) == 2
+
+
+def _kill_record(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    killed: list[int] = []
+    monkeypatch.setattr(os, "kill", lambda pid, _signal: killed.append(pid))
+    return killed
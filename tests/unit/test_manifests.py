@@ -0,0 +1,97 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import io
+import pathlib
+import tarfile
+import zipfile
+
+import pytest
+
+import atr.manifests as manifests
+import atr.tarzip as tarzip
+import atr.tasks.checks.targz as targz
+import atr.tasks.checks.zipformat as zipformat
+import atr.util as util
+
+
+@pytest.fixture
+def manifests_dir(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    path = tmp_path / "manifests"
+    monkeypatch.setattr(util, "get_manifests_dir", lambda: path)
+    return path
+
+
+def test_entries_roundtrip_tar(tmp_path: pathlib.Path, manifests_dir: pathlib.Path):
+    archive_path = tmp_path / "sample-1.0.tar.gz"
+    with tarfile.open(archive_path, "w:gz") as tf:
+        _add_tar_file(tf, "sample-1.0/b.txt", b"bee", 0o640)
+        _add_tar_file(tf, "sample-1.0/a.txt", b"a", 0o644)
+        link = tarfile.TarInfo("sample-1.0/link")
+        link.type = tarfile.SYMTYPE
+        link.linkname = "a.txt"
+        tf.addfile(link)
+
+    scanned = manifests.entries(str(archive_path))
+    assert len(list(manifests_dir.glob("*.manifest"))) == 1
+
+    loaded = manifests.entries(str(archive_path))
+    assert loaded == scanned
+    assert [entry.name for entry in loaded] == ["sample-1.0/b.txt", "sample-1.0/a.txt", "sample-1.0/link"]
+    assert loaded[0].isfile() and (loaded[0].size == 3) and (loaded[0].mode == 0o640)
+    assert loaded[2].issym() and (loaded[2].linkname == "a.txt")
+    assert manifests.listing(str(archive_path)) == ["sample-1.0/a.txt", "sample-1.0/b.txt", "sample-1.0/link"]
+
+
+def test_entries_unreadable_archive_has_no_manifest(tmp_path: pathlib.Path, manifests_dir: pathlib.Path):
+    archive_path = tmp_path / "sample.tar.gz"
+    with tarfile.open(archive_path, "w:gz") as tf:
+        _add_tar_file(tf, "sample/a.txt", b"a" * 4096, 0o644)
+    archive_path.write_bytes(archive_path.read_bytes()[:40])
+
+    with pytest.raises(EOFError):
+        manifests.entries(str(archive_path))
+    assert not list(manifests_dir.glob("*.manifest"))
+
+
+def test_scan_uses_manifest_without_opening_archive(
+    tmp_path: pathlib.Path, manifests_dir: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    tar_path = tmp_path / "sample-1.0.tar.gz"
+    with tarfile.open(tar_path, "w:gz") as tf:
+        _add_tar_file(tf, "sample-1.0/a.txt", b"a", 0o644)
+    zip_path = tmp_path / "sample-1.0.zip"
+    with zipfile.ZipFile(zip_path, "w") as zf:
+        zf.writestr("sample-1.0/a.txt", "a")
+        zf.writestr("sample-1.0/b/c.txt", "c")
+    manifests.entries(str(tar_path))
+    manifests.entries(str(zip_path))
+
+    def unavailable_open(path: str, *args, **kwargs):
+        raise AssertionError("The archive should not be opened")
+
+    monkeypatch.setattr(tarzip, "open_archive", unavailable_open)
+
+    assert targz.root_directory(str(tar_path)) == "sample-1.0"
+    assert zipformat._structure_check_core_logic(str(zip_path)) == {"root_dir": "sample-1.0"}
+
+
+def _add_tar_file(tf: tarfile.TarFile, name: str, data: bytes, mode: int) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    tf.addfile(info, io.BytesIO(data))
@@ -0,0 +1,110 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import pathlib
+import sys
+import textwrap
+import threading
+from collections.abc import Generator
+
+import pytest
+
+import atr.config as config
+import atr.ratservice as ratservice
+
+# Speaks the protocol of RatService.java, writing the output file instead of running Apache RAT
+_FAKE_JVM = textwrap.dedent(
+    """
+    import struct
+    import sys
+    import time
+
+    def read(size):
+        data = sys.stdin.buffer.read(size)
+        if len(data) < size:
+            sys.exit(0)
+        return data
+
+    def write(status, message):
+        encoded = message.encode()
+        sys.stdout.buffer.write(struct.pack(">ii", status, len(encoded)) + encoded)
+        sys.stdout.buffer.flush()
+
+    while True:
+        (count,) = struct.unpack(">i", read(4))
+        arguments = []
+        for _ in range(count):
+            (length,) = struct.unpack(">i", read(4))
+            arguments.append(read(length).decode())
+        if "crash" in arguments:
+            sys.exit(1)
+        if "sleep" in arguments:
+            time.sleep(30)
+        if "fail" in arguments:
+            write(1, "Report failed")
+            continue
+        if "--output-file" in arguments:
+            with open(arguments[arguments.index("--output-file") + 1], "w") as f:
+                f.write("<rat-report/>")
+        write(0, "")
+    """
+)
+
+
+@pytest.fixture
+def service(tmp_path: pathlib.Path) -> Generator[ratservice.Service]:
+    script = tmp_path / "fake_jvm.py"
+    script.write_text(_FAKE_JVM)
+    service = ratservice.Service([sys.executable, str(script)], 1)
+    yield service
+    service.stop()
+
+
+def test_failed_jvm_is_restarted(service: ratservice.Service):
+    assert service.handle({"arguments": ["crash"], "timeout": 10})["status"] == "failure"
+    assert not service.jvms[0].alive()
+
+    assert service.handle({"arguments": ["ok"], "timeout": 10}) == {"status": "ok"}
+    assert service.jvms[0].alive()
+
+
+def test_report_through_socket(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch, service: ratservice.Service):
+    socket_path = tmp_path / "rat.sock"
+    monkeypatch.setattr(config.get(), "APACHE_RAT_SERVICE_SOCKET", str(socket_path))
+    with ratservice.Server(str(socket_path), service) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            output = tmp_path / "report.xml"
+            ratservice.report(["--output-file", str(output), "--", str(tmp_path)], 10)
+            assert output.read_text() == "<rat-report/>"
+            assert ratservice.health() is None
+
+            with pytest.raises(ratservice.ReportError, match="Report failed"):
+                ratservice.report(["fail"], 10)
+        finally:
+            server.shutdown()
+            thread.join()
+
+
+def test_report_timeout_stops_jvm(service: ratservice.Service):
+    service.handle({"arguments": ["ok"], "timeout": 10})
+    process = service.jvms[0].process
+
+    assert service.handle({"arguments": ["sleep"], "timeout": 0.5})["status"] == "timeout"
+    assert (process is not None) and (process.poll() is not None)
+    assert service.health() is None
@@ -0,0 +1,150 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import datetime
+
+import pytest
+
+import atr.config as config
+import atr.db as db
+import atr.models.results as results
+import atr.models.sql as sql
+import atr.tasks as tasks
+
+
+async def test_checks_supersede_cancels_active_checks_when_enabled(database: None, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(config.get(), "WORKER_CANCEL_SUPERSEDED", True)
+    task_ids = await _tasks_add(
+        _check_task("00001", sql.TaskStatus.QUEUED),
+        _check_task("00001", sql.TaskStatus.ACTIVE),
+    )
+
+    async with db.session() as data:
+        await tasks._checks_supersede(data, "project", "1.0", "00002", [])
+        await data.commit()
+
+    superseded = await _tasks_get(task_ids)
+    assert [task.status for task in superseded] == [sql.TaskStatus.SUPERSEDED, sql.TaskStatus.SUPERSEDED]
+    # The worker holding the active check loses it when it next renews its lease
+    assert superseded[1].lease_expires is None
+
+
+async def test_checks_supersede_marks_queued_checks_of_earlier_revisions(database: None):
+    task_ids = await _tasks_add(
+        _check_task("00001", sql.TaskStatus.QUEUED),
+        _check_task("00001", sql.TaskStatus.ACTIVE),
+        _check_task("00001", sql.TaskStatus.QUEUED, version_name="2.0"),
+        _check_task("00001", sql.TaskStatus.QUEUED, task_type=sql.TaskType.SBOM_GENERATE_CYCLONEDX),
+        _check_task("00002", sql.TaskStatus.QUEUED),
+    )
+
+    async with db.session() as data:
+        await tasks._checks_supersede(data, "project", "1.0", "00002", [])
+        await data.commit()
+
+    superseded = await _tasks_get(task_ids)
+    # Only the queued check of an earlier revision of the same release is superseded
+    # Active checks keep running unless workers are configured to cancel them
+    assert [task.status for task in superseded] == [
+        sql.TaskStatus.SUPERSEDED,
+        sql.TaskStatus.ACTIVE,
+        sql.TaskStatus.QUEUED,
+        sql.TaskStatus.QUEUED,
+        sql.TaskStatus.QUEUED,
+    ]
+    assert superseded[0].error == "Superseded by revision 00002"
+    assert superseded[0].completed is not None
+
+
+async def test_checks_supersede_spares_prerequisites_of_new_checks(database: None):
+    prerequisite_id, other_id = await _tasks_add(
+        _check_task("00001", sql.TaskStatus.QUEUED),
+        _check_task("00001", sql.TaskStatus.QUEUED),
+    )
+    new_check = _check_task("00002", sql.TaskStatus.QUEUED)
+    new_check.depends_on = prerequisite_id
+
+    async with db.session() as data:
+        await tasks._checks_supersede(data, "project", "1.0", "00002", [new_check])
+        await data.commit()
+
+    prerequisite, other = await _tasks_get([prerequisite_id, other_id])
+    assert prerequisite.status == sql.TaskStatus.QUEUED
+    assert other.status == sql.TaskStatus.SUPERSEDED
+
+
+async def test_duplicates_find_prefers_newest_completed_check(database: None):
+    await _tasks_add(
+        _check_task("00001", sql.TaskStatus.COMPLETED, version_name="0.9", dedup_key="key"),
+        _check_task("00002", sql.TaskStatus.COMPLETED, version_name="0.9", dedup_key="key"),
+        _check_task("00001", sql.TaskStatus.QUEUED, dedup_key="key"),
+        _check_task("00001", sql.TaskStatus.QUEUED, dedup_key="queued"),
+        _check_task("00002", sql.TaskStatus.QUEUED, dedup_key="queued"),
+        _check_task("00001", sql.TaskStatus.QUEUED, version_name="0.9", dedup_key="elsewhere"),
+    )
+    new_checks = [_check_task("00003", sql.TaskStatus.QUEUED, dedup_key=key) for key in ["key", "queued", "elsewhere"]]
+
+    async with db.session() as data:
+        duplicates = await tasks._duplicates_find(data, "project", "1.0", new_checks)
+
+    # Unfinished checks of other releases are never waited on, and of this release the earliest is doing the work
+    assert {key: (task.version_name, task.revision_number) for key, task in duplicates.items()} == {
+        "key": ("0.9", "00002"),
+        "queued": ("1.0", "00001"),
+    }
+
+
+def _check_task(
+    revision_number: str,
+    status: sql.TaskStatus,
+    task_type: sql.TaskType = sql.TaskType.HASHING_CHECK,
+    version_name: str = "1.0",
+    dedup_key: str | None = None,
+) -> sql.Task:
+    task = sql.Task(
+        status=status,
+        task_type=task_type,
+        task_args={},
+        asf_uid="user",
+        project_name="project",
+        version_name=version_name,
+        revision_number=revision_number,
+        primary_rel_path="artifact.tar.gz",
+        dedup_key=dedup_key,
+    )
+    if status == sql.TaskStatus.ACTIVE:
+        task.started = datetime.datetime.now(datetime.UTC)
+        task.pid = 1
+        task.lease_expires = task.started + datetime.timedelta(minutes=1)
+    elif status == sql.TaskStatus.COMPLETED:
+        task.completed = datetime.datetime.now(datetime.UTC)
+        task.result = results.HashingCheck(
+            kind="hashing_check", hash_algorithm="sha512", hash_value="0", hash_file_path="artifact.tar.gz.sha512"
+        )
+    return task
+
+
+async def _tasks_add(*new_tasks: sql.Task) -> list[int]:
+    async with db.session() as data:
+        data.add_all(new_tasks)
+        await data.commit()
+        return [task.id for task in new_tasks if (task.id is not None)]
+
+
+async def _tasks_get(task_ids: list[int]) -> list[sql.Task]:
+    async with db.session() as data:
+        return [await data.task(id=task_id).demand(RuntimeError("Task not found")) for task_id in task_ids]
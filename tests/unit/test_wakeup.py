@@ -0,0 +1,90 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import asyncio
+import socket
+from collections.abc import Generator
+
+import pytest
+
+import atr.db as db
+import atr.models.sql as sql
+import atr.util as util
+import atr.wakeup as wakeup
+import atr.worker as worker
+
+
+@pytest.fixture
+def listening() -> Generator[socket.socket]:
+    wakeup.prepare()
+    sock = util.unwrap(wakeup.listen())
+    yield sock
+    sock.close()
+
+
+async def test_committed_queued_task_notifies_workers(database: None, monkeypatch: pytest.MonkeyPatch):
+    notified: list[bool] = []
+    monkeypatch.setattr(wakeup, "notify", lambda: notified.append(True))
+    async with db.session() as data:
+        data.add(_task(sql.TaskStatus.QUEUED))
+        await data.commit()
+    assert notified == [True]
+
+    # Only tasks which a worker could claim wake the workers
+    async with db.session() as data:
+        data.add(_task(sql.TaskStatus.FAILED))
+        await data.commit()
+    assert notified == [True]
+
+
+async def test_rolled_back_queued_task_does_not_notify_workers(database: None, monkeypatch: pytest.MonkeyPatch):
+    notified: list[bool] = []
+    monkeypatch.setattr(wakeup, "notify", lambda: notified.append(True))
+    async with db.session() as data:
+        data.add(_task(sql.TaskStatus.QUEUED))
+        await data.flush()
+        await data.rollback()
+        # A later commit of the same session has nothing new for the workers
+        await data.commit()
+    assert notified == []
+
+
+async def test_wait_returns_when_notified(listening: socket.socket):
+    waiting = asyncio.create_task(wakeup.wait(listening))
+    await asyncio.sleep(0)
+    assert not waiting.done()
+    wakeup.notify()
+    wakeup.notify()
+    await asyncio.wait_for(waiting, timeout=5)
+    # Pending wakeups are drained, so the next wait does not return at once
+    with pytest.raises(TimeoutError):
+        await asyncio.wait_for(wakeup.wait(listening), timeout=0.05)
+
+
+async def test_worker_wait_returns_on_timeout_without_wakeup(listening: socket.socket):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await worker._worker_loop_wait({}, listening, 0.05)
+    assert 0.05 <= (loop.time() - started) < 5
+
+
+def _task(status: sql.TaskStatus) -> sql.Task:
+    task = sql.Task(status=status, task_type=sql.TaskType.MESSAGE_SEND, task_args={}, asf_uid="user")
+    if status == sql.TaskStatus.FAILED:
+        task.completed = task.added
+        task.error = "Failed"
+    return task
@@ -0,0 +1,326 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import asyncio
+import datetime
+import os
+from typing import Any
+
+import pytest
+import sqlmodel
+
+import atr.config as config
+import atr.db as db
+import atr.models.results as results
+import atr.models.sql as sql
+import atr.tasks as tasks
+import atr.tasks.checks as checks
+import atr.worker as worker
+
+_attempts: list[asyncio.Event] = []
+
+
+async def test_execute_check_task_reuse_depends_on_the_release_not_the_results(database: None):
+    added = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+    async with db.session() as data:
+        # An identical check which completed without recording any results
+        prerequisite = _queued_task("project", added)
+        prerequisite.status = sql.TaskStatus.COMPLETED
+        prerequisite.completed = added
+        prerequisite.result = results.SBOMGenerateCycloneDX(kind="sbom_generate_cyclonedx", msg="Generated")
+        prerequisite.version_name = "1.0"
+        prerequisite.dedup_key = "key"
+        data.add(prerequisite)
+        await data.flush()
+        dependant = _queued_task("project", added)
+        dependant.version_name = "1.0"
+        dependant.dedup_key = "key"
+        dependant.depends_on = prerequisite.id
+        data.add(dependant)
+        await data.commit()
+
+        task_type = sql.TaskType.LICENSE_FILES.value
+        assert await worker._execute_check_task_reuse(data, dependant, task_type) is None
+        data.add(
+            sql.Release(
+                name=sql.release_name("project", "1.0"),
+                phase=sql.ReleasePhase.RELEASE_CANDIDATE_DRAFT,
+                created=added,
+                project_name="project",
+                version="1.0",
+            )
+        )
+        await data.commit()
+        reused = await worker._execute_check_task_reuse(data, dependant, task_type)
+        assert (reused is not None) and (reused.id == prerequisite.id)
+
+
+async def test_heartbeat_does_not_cancel_a_task_recording_its_outcome(monkeypatch: pytest.MonkeyPatch):
+    finishing = asyncio.Event()
+    release = asyncio.Event()
+
+    async def lease_renew(_lease_seconds: int) -> set[int]:
+        # The outcome of the task has been committed, so it is no longer active
+        return set()
+
+    async def finish() -> None:
+        worker._tasks_finishing.add(1)
+        finishing.set()
+        await release.wait()
+
+    monkeypatch.setattr(worker, "_tasks_lease_renew", lease_renew)
+    running_task = asyncio.create_task(finish(), name="1")
+    await finishing.wait()
+    heartbeat = asyncio.create_task(worker._worker_heartbeat_run({running_task: "cpu"}, 0))
+    await asyncio.sleep(0.01)
+    heartbeat.cancel()
+    assert not running_task.cancelled()
+    release.set()
+    await running_task
+    worker._tasks_finishing.discard(1)
+
+
+async def test_requeued_check_task_does_not_duplicate_results(database: None, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(config.get(), "CHECK_RESULT_BATCH_SIZE", 1)
+    monkeypatch.setattr(tasks, "resolve", lambda _task_type: _interrupted_check)
+    _attempts[:] = [asyncio.Event(), asyncio.Event()]
+    async with db.session() as data:
+        data.add(
+            sql.Task(
+                task_type=sql.TaskType.LICENSE_FILES,
+                task_args={},
+                asf_uid="user",
+                project_name="example",
+                version_name="1.0",
+                revision_number="00001",
+                primary_rel_path="apache-example-1.0.tar.gz",
+            )
+        )
+        await data.commit()
+
+    # The first attempt writes one member result, then stops when its lease is lost
+    ((task_id, task_type, task_args, asf_uid),) = await worker._tasks_next_claim(1, None, 60)
+    first = asyncio.create_task(worker._task_process(task_id, task_type, task_args, asf_uid))
+    await _attempts[0].wait()
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    async with db.session() as data:
+        await data.execute(
+            sqlmodel.update(sql.Task).values(status=sql.TaskStatus.QUEUED, started=None, pid=None, lease_expires=None)
+        )
+        await data.commit()
+
+    ((task_id, task_type, task_args, asf_uid),) = await worker._tasks_next_claim(1, None, 60)
+    _attempts[1].set()
+    await worker._task_process(task_id, task_type, task_args, asf_uid)
+    async with db.session() as data:
+        check_results = await data.check_result(revision_number="00001").all()
+        task_obj = await data.task(id=task_id).demand(RuntimeError("Task not found"))
+    assert task_obj.status == sql.TaskStatus.COMPLETED
+    assert sorted((result.member_rel_path or "") for result in check_results) == ["", "a.py"]
+
+
+def test_task_claim_plan_any_type_when_no_class_limit_binds():
+    limits: dict[worker.TaskClass, int] = {"cpu": 2, "subprocess": 4}
+    assert worker._task_claim_plan(["subprocess"], limits, 2) == [(None, 2)]
+
+
+def test_task_claim_plan_empty_when_all_full():
+    limits: dict[worker.TaskClass, int] = {"cpu": 1, "subprocess": 1}
+    assert worker._task_claim_plan(["cpu", "subprocess"], limits, 1) == []
+
+
+def test_task_claim_plan_excludes_full_class():
+    limits: dict[worker.TaskClass, int] = {"cpu": 1, "subprocess": 2}
+    plan = worker._task_claim_plan(["cpu"], limits, 2)
+    assert len(plan) == 1
+    task_types, count = plan[0]
+    assert task_types is not None
+    assert sql.TaskType.RAT_CHECK in task_types
+    assert sql.TaskType.LICENSE_HEADERS not in task_types
+    assert count == 2
+
+
+def test_task_claim_plan_limits_each_class():
+    limits: dict[worker.TaskClass, int] = {"cpu": 1, "subprocess": 3}
+    plan = worker._task_claim_plan([], limits, 3)
+    assert [count for _task_types, count in plan] == [1, 3]
+
+
+async def test_task_dependants_fail_transitively(database: None):
+    added = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+    async with db.session() as data:
+        prerequisite = _queued_task("project", added)
+        unrelated = _queued_task("project", added)
+        data.add_all([prerequisite, unrelated])
+        await data.flush()
+        dependant = _queued_task("project", added)
+        dependant.depends_on = prerequisite.id
+        data.add(dependant)
+        await data.flush()
+        transitive = _queued_task("project", added)
+        transitive.depends_on = dependant.id
+        data.add(transitive)
+        await data.commit()
+        task_ids = [prerequisite.id, dependant.id, transitive.id, unrelated.id]
+
+    async with db.session() as data:
+        await worker._task_dependants_fail(data, task_ids[0])
+        await data.commit()
+
+    async with db.session() as data:
+        statuses = [(await data.task(id=task_id).demand(RuntimeError("Task not found"))).status for task_id in task_ids]
+    # Failing the prerequisite itself is left to the caller
+    assert statuses == [
+        sql.TaskStatus.QUEUED,
+        sql.TaskStatus.FAILED,
+        sql.TaskStatus.FAILED,
+        sql.TaskStatus.QUEUED,
+    ]
+
+
+async def test_task_usage_of_concurrent_tasks_is_marked_overlapped(monkeypatch: pytest.MonkeyPatch):
+    resets: list[int] = []
+    overlapped: dict[int, bool] = {}
+    release = asyncio.Event()
+
+    async def task_process(task_id: int, *_args: Any) -> None:
+        if task_id == 1:
+            await release.wait()
+        overlapped[task_id] = task_id in worker._usage_overlapped
+
+    monkeypatch.setattr(worker, "_task_process", task_process)
+    monkeypatch.setattr(worker, "_usage_peak_rss_reset", lambda: resets.append(len(worker._usage_running)))
+    first = asyncio.create_task(worker._task_run(1, "test", {}, "user"))
+    await asyncio.sleep(0)
+    await worker._task_run(2, "test", {}, "user")
+    release.set()
+    await first
+    await worker._task_run(3, "test", {}, "user")
+
+    assert overlapped == {1: True, 2: True, 3: False}
+    # The peak is only reset by tasks which start alone
+    assert resets == [1, 1]
+    assert (not worker._usage_running) and (not worker._usage_overlapped)
+
+
+async def test_tasks_next_claim_takes_tasks_of_each_project_in_turn(database: None):
+    added = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+    async with db.session() as data:
+        # A large revision of one project is queued before a single check of another
+        for i in range(10):
+            data.add(_queued_task("large", added + datetime.timedelta(seconds=i)))
+        data.add(_queued_task("small", added + datetime.timedelta(minutes=1)))
+        data.add(_queued_task("other", added + datetime.timedelta(minutes=2), sql.TaskPriority.BULK))
+        await data.commit()
+
+    claimed = await worker._tasks_next_claim(2, None, 60)
+    async with db.session() as data:
+        claimed_tasks = [await data.task(id=task_id).demand(RuntimeError("Task not found")) for task_id, *_ in claimed]
+    assert sorted(task.project_name or "" for task in claimed_tasks) == ["large", "small"]
+    assert min(task.added for task in claimed_tasks) == added
+
+
+async def test_tasks_next_claim_waits_for_prerequisite_to_complete(database: None):
+    added = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+    async with db.session() as data:
+        prerequisite = _queued_task("project", added)
+        data.add(prerequisite)
+        await data.flush()
+        dependant = _queued_task("project", added)
+        dependant.depends_on = prerequisite.id
+        data.add(dependant)
+        await data.commit()
+        prerequisite_id, dependant_id = prerequisite.id, dependant.id
+
+    # Neither a queued nor an active prerequisite releases its dependant
+    assert [task_id for task_id, *_ in await worker._tasks_next_claim(10, None, 60)] == [prerequisite_id]
+    assert await worker._tasks_next_claim(10, None, 60) == []
+
+    async with db.session() as data:
+        prerequisite = await data.task(id=prerequisite_id).demand(RuntimeError("Task not found"))
+        prerequisite.status = sql.TaskStatus.COMPLETED
+        prerequisite.completed = datetime.datetime.now(datetime.UTC)
+        prerequisite.result = results.SBOMGenerateCycloneDX(kind="sbom_generate_cyclonedx", msg="Generated")
+        await data.commit()
+
+    assert [task_id for task_id, *_ in await worker._tasks_next_claim(10, None, 60)] == [dependant_id]
+
+
+def test_usage_is_only_recorded_for_tasks_which_ran_alone():
+    started = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+    usage_start = worker.TaskUsage(
+        cpu_user_seconds=1.0,
+        cpu_system_seconds=1.0,
+        child_cpu_seconds=5.0,
+        peak_rss_bytes=100,
+        read_bytes=10,
+        written_bytes=10,
+    )
+    usage_end = worker.TaskUsage(
+        cpu_user_seconds=3.0,
+        cpu_system_seconds=2.0,
+        child_cpu_seconds=4.0,
+        peak_rss_bytes=200,
+        read_bytes=30,
+        written_bytes=15,
+    )
+
+    alone = _queued_task("project", started - datetime.timedelta(seconds=5))
+    alone.started = started
+    worker._usage_record(alone, usage_start, usage_end)
+    assert (alone.queue_wait_seconds, alone.usage_overlapped) == (5.0, False)
+    assert (alone.cpu_user_seconds, alone.cpu_system_seconds, alone.peak_rss_bytes) == (2.0, 1.0, 200)
+    assert (alone.read_bytes, alone.written_bytes) == (20, 5)
+    # The CPU time of a pool process which exited during the task is not taken away from it
+    assert alone.child_cpu_seconds == 0.0
+
+    # Only the queue wait of a task which ran with others is its own
+    overlapped = _queued_task("project", started - datetime.timedelta(seconds=5))
+    overlapped.started = started
+    worker._usage_record(overlapped, usage_start, None)
+    assert (overlapped.queue_wait_seconds, overlapped.usage_overlapped) == (5.0, True)
+    assert (overlapped.cpu_user_seconds, overlapped.child_cpu_seconds, overlapped.peak_rss_bytes) == (None, None, None)
+
+
+def test_usage_process_cpu_seconds_reads_any_process():
+    assert worker._usage_process_cpu_seconds(os.getpid()) > 0
+    # Process IDs on Linux are at most 2**22, so this one does not exist
+    assert worker._usage_process_cpu_seconds(2**22 + 1) == 0.0
+
+
+async def _interrupted_check(args: checks.FunctionArguments) -> None:
+    recorder = await args.recorder()
+    await recorder.failure("Missing header", None, member_rel_path="a.py")
+    _attempts[0].set()
+    # Only a second attempt gets further than this
+    await _attempts[1].wait()
+    await recorder.success("Checked", {})
+
+
+def _queued_task(
+    project_name: str, added: datetime.datetime, priority: sql.TaskPriority = sql.TaskPriority.INTERACTIVE
+) -> sql.Task:
+    return sql.Task(
+        task_type=sql.TaskType.LICENSE_FILES,
+        task_args={},
+        asf_uid="user",
+        priority=priority,
+        added=added,
+        project_name=project_name,
+    )
@@ -0,0 +1,162 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import asyncio
+import os
+import pathlib
+import signal
+import socket
+import time
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+
+import atr.archives as archives
+import atr.manager as manager
+import atr.worker as worker
+import atr.zygote as zygote
+
+# Other tests may have started threads in this process, but the forked children here do not use any locks
+pytestmark = pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+
+
+def test_child_run_exits_with_worker_outcome(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    shutdowns = tmp_path / "shutdowns"
+    monkeypatch.setattr(archives, "pool_shutdown", lambda: shutdowns.open("a").write("shutdown\n"))
+
+    monkeypatch.setattr(worker, "main", lambda: None)
+    assert _forked_exit_code(zygote._child_run) == 0
+
+    def failing_main() -> None:
+        raise RuntimeError("Worker failed")
+
+    monkeypatch.setattr(worker, "main", failing_main)
+    assert _forked_exit_code(zygote._child_run) == 1
+    assert "Worker failed" in (tmp_path / "logs" / "atr-worker-error.log").read_text()
+    # The process pool of the worker is stopped whether or not the worker failed
+    assert shutdowns.read_text() == "shutdown\n" * 2
+
+
+def test_children_reap_collects_exited_workers():
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    _wait_until(lambda: _is_zombie(pid))
+    zygote._children_reap(signal.SIGCHLD, None)
+    with pytest.raises(ChildProcessError):
+        os.waitpid(pid, os.WNOHANG)
+
+
+async def test_manager_starts_an_interpreter_when_the_zygote_has_died(monkeypatch: pytest.MonkeyPatch):
+    worker_manager = manager.WorkerManager(zygote=True)
+    # The zygote has exited, and it cannot be started again
+    worker_manager.zygote_process = _MockProcess()
+    started: list[str] = []
+
+    async def zygote_start() -> bool:
+        started.append("zygote")
+        return False
+
+    async def create_subprocess_exec(*args: Any, **_kwargs: Any) -> _MockProcess:
+        started.append(os.path.basename(args[1]))
+        return _MockProcess(pid=4321)
+
+    monkeypatch.setattr(worker_manager, "zygote_start", zygote_start)
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", create_subprocess_exec)
+    await worker_manager.spawn_worker()
+    assert started == ["zygote", "worker.py"]
+    assert list(worker_manager.workers) == [4321]
+
+
+def test_zygote_spawns_and_reaps_workers(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(worker, "main", lambda: time.sleep(0.2))
+    socket_path = str(tmp_path / "zygote.sock")
+    zygote_pid = os.fork()
+    if zygote_pid == 0:
+        try:
+            zygote.main(socket_path)
+        finally:
+            os._exit(1)
+    try:
+        _wait_until(lambda: _accepting(socket_path))
+        pids = [_spawn(socket_path) for _ in range(2)]
+        assert len(set(pids)) == 2
+        # Each worker runs in its own session, as a child of the zygote
+        for pid in pids:
+            _wait_until(lambda pid=pid: (not _exists(pid)) or (os.getsid(pid) == pid))
+        # Exited workers are reaped by the zygote, rather than left as zombies
+        for pid in pids:
+            _wait_until(lambda pid=pid: not _exists(pid))
+    finally:
+        os.kill(zygote_pid, signal.SIGKILL)
+        os.waitpid(zygote_pid, 0)
+
+
+class _MockProcess:
+    def __init__(self, pid: int = 1234) -> None:
+        self.pid = pid
+        self.returncode = 0
+
+
+def _accepting(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+    return True
+
+
+def _exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def _forked_exit_code(run: Callable[[], None]) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run()
+        finally:
+            os._exit(2)
+    _pid, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+
+def _is_zombie(pid: int) -> bool:
+    with open(f"/proc/{pid}/stat") as f:
+        return f.read().rsplit(")", 1)[1].split()[0] == "Z"
+
+
+def _spawn(socket_path: str) -> int:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(b"spawn\n")
+        return int(client.makefile().readline())
+
+
+def _wait_until(condition: Callable[[], bool]) -> None:
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)